@@ -0,0 +1,48 @@
+"""
+文件名：auth.py
+功能：各Flask模块共用的登录与管理员校验
+主要内容：
+    - 登录校验装饰器（兼容旧版本session）
+    - 管理员校验装饰器（请求头X-Admin-Token与ADMIN_TOKEN比对）
+"""
+import hmac
+from dotenv import load_dotenv
+import os
+from flask import jsonify, request, session
+from backend.services.sign_in_service import get_user_key
+
+load_dotenv()
+# 管理员接口（诊断、统计、附件清理等）的令牌，未配置时这些接口不可用
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def login_required(f):
+    """
+    登录校验装饰器，未登录则返回401
+    """
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            return jsonify({'success': False, 'error': '请先登录'}), 401
+        if 'username' not in session:
+            # 旧版本session中user_id存的是用户名，转换为整数用户键
+            user_key = get_user_key(session['user_id'])
+            if user_key is None:
+                session.clear()
+                return jsonify({'success': False, 'error': '请先登录'}), 401
+            session['username'] = session['user_id']
+            session['user_id'] = user_key
+        return f(*args, **kwargs)
+    decorated_function.__name__ = f.__name__
+    return decorated_function
+
+def admin_required(f):
+    """
+    管理员校验装饰器：未配置ADMIN_TOKEN时返回404，令牌不符时返回403
+    """
+    def decorated_function(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({'success': False, 'error': '管理员接口未开启'}), 404
+        if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+            return jsonify({'success': False, 'error': '无权限'}), 403
+        return f(*args, **kwargs)
+    decorated_function.__name__ = f.__name__
+    return decorated_function
@@ -0,0 +1,86 @@
+"""
+文件名：bench_roadmap.py
+功能：Roadmap读取基准测试，验证get_roadmap的耗时不随主节点数量线性增长
+主要内容：
+    - 在临时数据库中生成不同规模的主节点/分支节点
+    - 对比逐主节点查询（N+1）与单次遍历建树的耗时
+用法：python backend/benchmarks/bench_roadmap.py [--mains 10,50,200,1000] [--branches 3] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# 必须在导入service前设置数据库路径
+os.environ["DATABASE_URL"] = os.path.join(tempfile.mkdtemp(prefix='levelup_bench_'), 'bench.db')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.services.db_service import get_conn  # noqa: E402
+from backend.services.migration_service import run_migrations  # noqa: E402
+from backend.services.roadmap_service import get_roadmap  # noqa: E402
+
+# 基准数据使用的用户ID（users.id）
+BENCH_UID = 1
+
+def seed(user_id, target_id, mains, branches_per_main):
+    """
+    生成一个目标的主节点和分支节点
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    c.executemany(
+        "INSERT INTO roadmap_main_nodes (user_id, uid, target_id, title, status, remark, node_order) VALUES (?, ?, ?, ?, 'todo', '', ?)",
+        [(user_id, user_id, target_id, f'main-{i}', i) for i in range(mains)])
+    c.execute('SELECT id FROM roadmap_main_nodes WHERE uid=? AND target_id=?', (user_id, target_id))
+    main_ids = [row[0] for row in c.fetchall()]
+    c.executemany(
+        "INSERT INTO roadmap_branch_nodes (main_id, user_id, uid, target_id, title, status, remark) VALUES (?, ?, ?, ?, ?, 'todo', '')",
+        [(main_id, user_id, user_id, target_id, f'branch-{main_id}-{j}') for main_id in main_ids for j in range(branches_per_main)])
+    conn.commit()
+    conn.close()
+
+def n_plus_one_roadmap(user_id, target_id):
+    """
+    旧实现：每个主节点单独查询一次分支节点，仅作对照
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute('SELECT * FROM roadmap_main_nodes WHERE uid=? AND target_id=? ORDER BY node_order ASC', (user_id, target_id))
+    result = []
+    for main in c.fetchall():
+        c.execute('SELECT * FROM roadmap_branch_nodes WHERE main_id=? AND target_id=?', (main[0], target_id))
+        branches = c.fetchall()
+        result.append({'id': main[0], 'children': [{'id': b[0]} for b in branches]})
+    conn.close()
+    return result
+
+def timeit(fn, repeat):
+    """
+    返回多次调用的平均耗时（毫秒）
+    """
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description='Roadmap读取基准测试')
+    parser.add_argument('--mains', default='10,50,200,1000')
+    parser.add_argument('--branches', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    run_migrations()
+    print(f"{'mains':>8} {'branches':>9} {'n+1 (ms)':>10} {'single-pass (ms)':>17}")
+    for target_id, mains in enumerate(int(x) for x in args.mains.split(',')):
+        target_id = str(target_id + 1)
+        seed(BENCH_UID, target_id, mains, args.branches)
+        old = timeit(lambda: n_plus_one_roadmap(BENCH_UID, target_id), args.repeat)
+        # 绕过读缓存，测量实际查询
+        new = timeit(lambda: get_roadmap.uncached(BENCH_UID, target_id), args.repeat)
+        print(f"{mains:>8} {mains * args.branches:>9} {old:>10.2f} {new:>17.2f}")
+
+if __name__ == '__main__':
+    main()
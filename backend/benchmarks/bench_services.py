@@ -0,0 +1,403 @@
+"""
+文件名：bench_services.py
+功能：service层基准测试，逐个测量target/roadmap/file/todo/sign_in各service公开函数的耗时
+主要内容：
+    - 按规模（1k/100k/1m行）生成用户、学习目标、roadmap节点、笔记、待办的合成数据
+    - 对每个公开函数多次调用，统计平均值、p50、p95等（默认关闭读缓存，测量实际查询）
+    - 列出尚未覆盖的公开函数，新增函数时提醒补充基准
+    - 结果输出为JSON，可与保存的基准结果对比，p50变慢超过阈值时以非0状态退出
+用法：python backend/benchmarks/bench_services.py [--scale 1k|100k|1m] [--repeat 50] [--only 关键词]
+      [--db 数据库路径] [--output results.json] [--baseline baseline.json] [--threshold 0.2] [--with-cache]
+"""
+import argparse
+import inspect
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+SCALES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+# 低于该差值（毫秒）的变化视为噪声，不算回归
+NOISE_FLOOR_MS = 0.05
+BENCH_PASSWORD = 'bench-password'
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='service层基准测试')
+    parser.add_argument('--scale', choices=SCALES, default='1k', help='笔记、分支节点、待办各约多少行')
+    parser.add_argument('--repeat', type=int, default=50, help='每个函数的调用次数')
+    parser.add_argument('--only', default='', help='只运行名称包含该关键词的基准')
+    parser.add_argument('--db', help='数据库路径；已按相同规模生成过数据时直接复用，默认使用临时目录')
+    parser.add_argument('--output', help='结果JSON的输出路径')
+    parser.add_argument('--baseline', help='对比的基准结果JSON')
+    parser.add_argument('--threshold', type=float, default=0.2, help='p50变慢超过该比例视为回归')
+    parser.add_argument('--with-cache', action='store_true', help='保留service读缓存（默认关闭，测量实际查询）')
+    return parser.parse_args()
+
+ARGS = parse_args() if __name__ == '__main__' else None
+
+# 必须在导入service前设置数据库路径和缓存开关
+if ARGS is not None:
+    os.environ["DATABASE_URL"] = ARGS.db or os.path.join(tempfile.mkdtemp(prefix='levelup_bench_'), 'bench.db')
+    if not ARGS.with_cache:
+        os.environ["SERVICE_CACHE_SIZE"] = "0"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.services import target_service, roadmap_service, file_service, todo_service, sign_in_service  # noqa: E402
+from backend.services.db_service import get_conn  # noqa: E402
+from backend.services.migration_service import run_migrations, USER_KEYS_BACKFILLED  # noqa: E402
+from backend.services.delta_service import content_hash  # noqa: E402
+from backend.services.compression_service import pack  # noqa: E402
+from backend.services.search_service import index_note_body  # noqa: E402
+from backend.services.roadmap_service import ORDER_GAP  # noqa: E402
+
+BENCH_MODULES = [target_service, roadmap_service, file_service, todo_service, sign_in_service]
+# 每个用户的笔记文件夹数
+FOLDERS_PER_USER = 20
+# 生成数据的记录键
+SEED_META_KEY = 'bench_seed_rows'
+# 写操作使用另一个用户的数据，复用数据库多次运行时读操作测量的数据量保持不变
+READ_UID, WRITE_UID = 1, 2
+WRITE_PREFIXES = ('add_', 'update_', 'delete_', 'move_', 'patch_')
+
+def _note_content(n):
+    # 每50篇有一篇超过压缩阈值的长笔记
+    repeat = 400 if n % 50 == 0 else 8
+    return f"# note {n}\n" + f"line {n} lorem ipsum dolor sit amet\n" * repeat
+
+def username(uid):
+    return f'bench-user-{uid}'
+
+def seed(rows):
+    """
+    生成合成数据（显式指定ID，按用户取模分配归属）
+    参数：rows - 笔记、分支节点、待办各自的行数
+    返回：各表行数
+    """
+    users = max(10, rows // 1000)
+    targets = max(users, rows // 50)
+    mains = targets * 10
+    folders = users * FOLDERS_PER_USER
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def target_owner(t):
+        return (t - 1) % users + 1
+
+    def main_target(m):
+        return (m - 1) % targets + 1
+
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute('BEGIN')
+    c.executemany('INSERT INTO users (id, username, password) VALUES (?, ?, ?)',
+                  ((u, username(u), BENCH_PASSWORD) for u in range(1, users + 1)))
+    c.executemany('''
+        INSERT INTO targets (id, title, progress, tags, update_time, user_id, uid) VALUES (?, ?, 0, ?, ?, '', ?)
+    ''', ((t, f'target {t}', 'bench,tag', now[:10], target_owner(t)) for t in range(1, targets + 1)))
+    c.executemany('''
+        INSERT INTO roadmap_main_nodes (id, user_id, uid, target_id, title, status, remark, created_at, updated_at, node_order)
+        VALUES (?, '', ?, ?, ?, 'todo', '', ?, ?, ?)
+    ''', ((m, target_owner(main_target(m)), str(main_target(m)), f'main node {m}',
+           now, now, ((m - 1) // targets + 1) * ORDER_GAP) for m in range(1, mains + 1)))
+    c.executemany('''
+        INSERT INTO roadmap_branch_nodes (id, main_id, user_id, uid, target_id, title, status, remark, created_at, updated_at)
+        VALUES (?, ?, '', ?, ?, ?, ?, '', ?, ?)
+    ''', ((b, str((b - 1) % mains + 1), target_owner(main_target((b - 1) % mains + 1)),
+           str(main_target((b - 1) % mains + 1)), f'branch node {b}', 'done' if b % 3 == 0 else 'todo', now, now) for b in range(1, rows + 1)))
+    c.executemany('''
+        INSERT INTO files (id, name, content, parent_id, is_dir, tags, user_id, uid, created_at, updated_at)
+        VALUES (?, ?, '', NULL, 1, '', '', ?, ?, ?)
+    ''', ((f, f'folder {f}', (f - 1) % users + 1, now, now) for f in range(1, folders + 1)))
+
+    compressed = []
+
+    def note_row(n):
+        owner = (n - 1) % users + 1
+        folder = owner + users * (((n - 1) // users) % FOLDERS_PER_USER)
+        # 每隔一篇关联到该用户的一个主节点（用户u的主节点ID为 u + users*k）
+        main = owner + users * (n % (mains // users))
+        tags = json.dumps({"mainId": str(main), "userId": username(owner)}) if n % 2 == 0 else ''
+        content, content_z, content_size = pack(_note_content(n))
+        if content_z is not None:
+            compressed.append((n, content_z))
+        return (folders + n, f'note {n}.md', content, content_z, content_size, folder, tags, owner, now, now)
+
+    c.executemany('''
+        INSERT INTO files (id, name, content, content_z, content_size, parent_id, is_dir, tags, user_id, uid,
+                           created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, 0, ?, '', ?, ?, ?)
+    ''', (note_row(n) for n in range(1, rows + 1)))
+    # 压缩存储的笔记由写入方补写全文索引正文
+    for n, content_z in compressed:
+        index_note_body(c, folders + n, _note_content(n), content_z)
+    c.executemany("INSERT INTO todos (id, user_id, uid, text, completed, created_at) VALUES (?, '', ?, ?, ?, ?)",
+                  ((t, (t - 1) % users + 1, f'todo {t}', t % 2, now) for t in range(1, rows + 1)))
+    c.execute('INSERT OR REPLACE INTO schema_meta (key, value) VALUES (?, ?)', (USER_KEYS_BACKFILLED, '1'))
+    c.execute('INSERT OR REPLACE INTO schema_meta (key, value) VALUES (?, ?)', (SEED_META_KEY, str(rows)))
+    conn.commit()
+    conn.close()
+    return {"users": users, "targets": targets, "main_nodes": mains, "branch_nodes": rows,
+            "folders": folders, "notes": rows, "todos": rows}
+
+def seeded_rows():
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute('SELECT value FROM schema_meta WHERE key = ?', (SEED_META_KEY,))
+    row = c.fetchone()
+    conn.close()
+    return int(row[0]) if row else None
+
+def make_context(uid, run):
+    """
+    选取基准使用的用户及其名下的各类对象ID
+    参数：uid - 用户ID, run - 本次运行新建对象的名称后缀（复用数据库时避免重名）
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    ctx = {"uid": uid, "username": username(uid), "run": run}
+    c.execute('SELECT id FROM targets WHERE uid = ? ORDER BY id LIMIT 1', (uid,))
+    ctx["target_id"] = str(c.fetchone()[0])
+    c.execute('SELECT id FROM roadmap_main_nodes WHERE uid = ? AND target_id = ? ORDER BY node_order LIMIT 2',
+              (uid, ctx["target_id"]))
+    ctx["main_id"], ctx["other_main_id"] = [row[0] for row in c.fetchall()]
+    c.execute('SELECT id FROM roadmap_branch_nodes WHERE uid = ? ORDER BY id LIMIT 1', (uid,))
+    ctx["branch_id"] = c.fetchone()[0]
+    c.execute('SELECT id FROM files WHERE uid = ? AND is_dir = 1 ORDER BY id LIMIT 1', (uid,))
+    ctx["folder_id"] = c.fetchone()[0]
+    c.execute('SELECT id FROM files WHERE uid = ? AND is_dir = 0 ORDER BY id LIMIT 1', (uid,))
+    ctx["file_id"] = c.fetchone()[0]
+    c.execute('SELECT id FROM todos WHERE uid = ? ORDER BY id LIMIT 1', (uid,))
+    ctx["todo_id"] = c.fetchone()[0]
+    conn.close()
+    return ctx
+
+def _ids(sql, params, n):
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute(sql + ' ORDER BY id DESC LIMIT ?', (*params, n))
+    ids = [row[0] for row in c.fetchall()]
+    conn.close()
+    return ids
+
+# ---- 需要预先创建对象的写操作（创建不计时） ----
+
+def _new_targets(ctx, n):
+    title = f"bench-del-{ctx['run']}"
+    for _ in range(n):
+        target_service.add_target(title, 0, [], ctx["uid"])
+    return _ids('SELECT id FROM targets WHERE uid = ? AND title = ?', (ctx["uid"], title), n)
+
+def _new_main_nodes(ctx, n):
+    title = f"bench-del-{ctx['run']}"
+    for _ in range(n):
+        roadmap_service.add_main_node(ctx["uid"], ctx["target_id"], title)
+    return _ids('SELECT id FROM roadmap_main_nodes WHERE uid = ? AND title = ?', (ctx["uid"], title), n)
+
+def _new_branch_nodes(ctx, n):
+    title = f"bench-del-{ctx['run']}"
+    for _ in range(n):
+        roadmap_service.add_branch_node(ctx["main_id"], ctx["target_id"], title, ctx["uid"])
+    return _ids('SELECT id FROM roadmap_branch_nodes WHERE uid = ? AND title = ?', (ctx["uid"], title), n)
+
+def _new_files(ctx, n):
+    return [file_service.add_file(f"bench-del-{ctx['run']}-{i}", 'to be deleted', '', ctx["uid"])[0][0]
+            for i in range(n)]
+
+def _new_todos(ctx, n):
+    text = f"bench-del-{ctx['run']}"
+    for _ in range(n):
+        todo_service.add_todo(ctx["uid"], text)
+    return _ids('SELECT id FROM todos WHERE uid = ? AND text = ?', (ctx["uid"], text), n)
+
+def _new_note(ctx, n):
+    # 每次运行使用新笔记，修订历史不随运行次数累积
+    ctx["edit"] = ctx.get("edit", 0) + 1
+    return file_service.add_file(f"bench-edit-{ctx['run']}-{ctx['edit']}", _note_content(1), '', ctx["uid"])[0][0]
+
+def _scratch_user(ctx, n):
+    ctx["scratch"] = ctx.get("scratch", 0) + 1
+    name = f"bench-scratch-{ctx['run']}-{ctx['scratch']}"
+    sign_in_service.add_user(name, 'pw-0')
+    return sign_in_service.get_user_key(name)
+
+def _patch_args(ctx, i, prepared):
+    """
+    每次基于当前内容构造替换首字符的补丁
+    """
+    content = file_service.get_file_content(prepared)[2] or ''
+    return (prepared, content_hash(content), [[0, 1, 'AB'[i % 2]]], ctx["uid"])
+
+def bench_specs():
+    """
+    基准定义：函数名 -> (函数, 参数函数(ctx, i, prepared), 预先准备函数(ctx, n)或None)
+    参数函数在每次调用前执行且不计时
+    """
+    t, r, f, d, s = target_service, roadmap_service, file_service, todo_service, sign_in_service
+    return {
+        # target_service
+        'target_service.add_target': (t.add_target, lambda ctx, i, p: (f"bench-{ctx['run']}-{i}", 0, ['bench'], ctx["uid"]), None),
+        'target_service.get_targets': (t.get_targets, lambda ctx, i, p: (ctx["uid"],), None),
+        'target_service.get_targets_page': (t.get_targets_page, lambda ctx, i, p: (ctx["uid"], 100, None), None),
+        'target_service.get_targets_with_progress': (t.get_targets_with_progress, lambda ctx, i, p: (ctx["uid"],), None),
+        'target_service.update_target': (t.update_target, lambda ctx, i, p: (int(ctx["target_id"]), f'target {i}', i % 100, ['bench'], ctx["uid"]), None),
+        'target_service.delete_target': (t.delete_target, lambda ctx, i, p: (p[i], ctx["uid"]), _new_targets),
+        'target_service.search_targets': (t.search_targets, lambda ctx, i, p: ('target 1', ctx["uid"]), None),
+        'target_service.search_targets_page': (t.search_targets_page, lambda ctx, i, p: ('target 1', ctx["uid"], 100, None), None),
+        # roadmap_service
+        'roadmap_service.get_roadmap': (r.get_roadmap, lambda ctx, i, p: (ctx["uid"], ctx["target_id"]), None),
+        'roadmap_service.get_roadmap_with_title': (r.get_roadmap_with_title, lambda ctx, i, p: (ctx["uid"], ctx["target_id"]), None),
+        'roadmap_service.get_roadmap_progress': (r.get_roadmap_progress, lambda ctx, i, p: (ctx["uid"], ctx["target_id"]), None),
+        'roadmap_service.get_targets_progress': (r.get_targets_progress, lambda ctx, i, p: (ctx["uid"],), None),
+        'roadmap_service.add_main_node': (r.add_main_node, lambda ctx, i, p: (ctx["uid"], ctx["target_id"], f'bench main {i}'), None),
+        'roadmap_service.add_main_node_at': (r.add_main_node_at, lambda ctx, i, p: (ctx["uid"], ctx["target_id"], f'bench main at {i}', ctx["main_id"]), None),
+        'roadmap_service.move_main_node': (r.move_main_node, lambda ctx, i, p: ((ctx["main_id"], ctx["other_main_id"])[i % 2], ctx["uid"], ctx["target_id"], (ctx["other_main_id"], ctx["main_id"])[i % 2]), None),
+        'roadmap_service.add_branch_node': (r.add_branch_node, lambda ctx, i, p: (ctx["main_id"], ctx["target_id"], f'bench branch {i}', ctx["uid"]), None),
+        'roadmap_service.update_main_node': (r.update_main_node, lambda ctx, i, p: (ctx["main_id"], f'main {i}', 'todo', '', ctx["target_id"], ctx["uid"]), None),
+        'roadmap_service.update_branch_node': (r.update_branch_node, lambda ctx, i, p: (ctx["branch_id"], f'branch {i}', ('todo', 'done')[i % 2], '', ctx["target_id"], ctx["uid"]), None),
+        'roadmap_service.delete_main_node': (r.delete_main_node, lambda ctx, i, p: (p[i], ctx["target_id"], ctx["uid"]), _new_main_nodes),
+        'roadmap_service.delete_branch_node': (r.delete_branch_node, lambda ctx, i, p: (p[i], ctx["target_id"], ctx["uid"]), _new_branch_nodes),
+        'roadmap_service.search_roadmap_nodes': (r.search_roadmap_nodes, lambda ctx, i, p: ('node 1', ctx["uid"], 100, None), None),
+        # file_service
+        'file_service.get_files': (f.get_files, lambda ctx, i, p: (ctx["uid"],), None),
+        'file_service.get_files_page': (f.get_files_page, lambda ctx, i, p: (ctx["uid"], 100, None), None),
+        'file_service.search_file_names': (f.search_file_names, lambda ctx, i, p: (ctx["uid"], 'note 1', 100, None), None),
+        'file_service.get_recent_files': (f.get_recent_files, lambda ctx, i, p: (ctx["uid"], 10), None),
+        'file_service.get_files_by_node': (f.get_files_by_node, lambda ctx, i, p: (ctx["uid"], ctx["main_id"]), None),
+        'file_service.add_file': (f.add_file, lambda ctx, i, p: (f"bench-{ctx['run']}-{i}", _note_content(i), '', ctx["uid"], ctx["folder_id"]), None),
+        'file_service.get_file_content': (f.get_file_content, lambda ctx, i, p: (ctx["file_id"],), None),
+        'file_service.update_file': (f.update_file, lambda ctx, i, p: (p, None, _note_content(i), None, ctx["uid"]), _new_note),
+        'file_service.patch_file': (f.patch_file, _patch_args, _new_note),
+        'file_service.delete_file': (f.delete_file, lambda ctx, i, p: (p[i], ctx["uid"]), _new_files),
+        # todo_service
+        'todo_service.get_todos': (d.get_todos, lambda ctx, i, p: (ctx["uid"], False), None),
+        'todo_service.get_todos_page': (d.get_todos_page, lambda ctx, i, p: (ctx["uid"], True, 100, None), None),
+        'todo_service.add_todo': (d.add_todo, lambda ctx, i, p: (ctx["uid"], f'bench todo {i}'), None),
+        'todo_service.update_todo': (d.update_todo, lambda ctx, i, p: (ctx["todo_id"], i % 2, ctx["uid"]), None),
+        'todo_service.delete_todo': (d.delete_todo, lambda ctx, i, p: (p[i], ctx["uid"]), _new_todos),
+        # sign_in_service
+        'sign_in_service.add_user': (s.add_user, lambda ctx, i, p: (f"bench-new-{ctx['run']}-{i}", 'pw'), None),
+        'sign_in_service.verify_user': (s.verify_user, lambda ctx, i, p: (ctx["username"], BENCH_PASSWORD), None),
+        'sign_in_service.get_user_key': (s.get_user_key, lambda ctx, i, p: (ctx["username"],), None),
+        'sign_in_service.update_username': (s.update_username, lambda ctx, i, p: (p, f"bench-renamed-{ctx['run']}-{i}"), _scratch_user),
+        'sign_in_service.update_password': (s.update_password, lambda ctx, i, p: (p, f'pw-{i}', f'pw-{i + 1}'), _scratch_user),
+    }
+
+def unbenchmarked(specs):
+    """
+    列出各service中尚无基准的公开函数
+    """
+    missing = []
+    for module in BENCH_MODULES:
+        short = module.__name__.rsplit('.', 1)[-1]
+        for name, func in inspect.getmembers(module, inspect.isfunction):
+            if not name.startswith('_') and func.__module__ == module.__name__ and f'{short}.{name}' not in specs:
+                missing.append(f'{short}.{name}')
+    return missing
+
+def run_bench(func, make_args, prepare, ctx, repeat):
+    """
+    测量一个函数：先调用一次预热，再计时repeat次
+    返回：耗时统计（毫秒）
+    """
+    prepared = prepare(ctx, repeat + 1) if prepare else None
+    func(*make_args(ctx, repeat, prepared))
+    samples = []
+    for i in range(repeat):
+        args = make_args(ctx, i, prepared)
+        start = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "calls": repeat,
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p50_ms": round(samples[len(samples) // 2], 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "min_ms": round(samples[0], 4),
+        "max_ms": round(samples[-1], 4),
+    }
+
+def compare(results, baseline, threshold):
+    """
+    与基准结果对比p50
+    返回：(回归列表, 改进列表)，每项为(名称, 基准p50, 当前p50, 比值)
+    """
+    regressions, improvements = [], []
+    for name, current in results["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        before, after = base["p50_ms"], current["p50_ms"]
+        ratio = after / before if before else float('inf')
+        if after - before > NOISE_FLOOR_MS and ratio > 1 + threshold:
+            regressions.append((name, before, after, ratio))
+        elif before - after > NOISE_FLOOR_MS and ratio < 1 - threshold:
+            improvements.append((name, before, after, ratio))
+    return regressions, improvements
+
+def main():
+    args = ARGS
+    run_migrations()
+    rows = SCALES[args.scale]
+    if seeded_rows() == rows:
+        counts = None
+        print(f"复用已生成的数据：{os.environ['DATABASE_URL']}")
+    elif seeded_rows() is None:
+        start = time.perf_counter()
+        counts = seed(rows)
+        print(f"生成数据 {counts}，耗时 {time.perf_counter() - start:.1f}s")
+    else:
+        sys.exit(f"数据库已按其他规模生成过数据：{os.environ['DATABASE_URL']}")
+    run = datetime.now().strftime('%Y%m%d%H%M%S%f')
+    read_ctx, write_ctx = make_context(READ_UID, run), make_context(WRITE_UID, run)
+    specs = bench_specs()
+    results = {
+        "meta": {
+            "scale": args.scale,
+            "rows": rows,
+            "seed": counts,
+            "repeat": args.repeat,
+            "cache": args.with_cache,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "created_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        "results": {},
+        "unbenchmarked": unbenchmarked(specs),
+    }
+    print(f"{'benchmark':<45} {'mean':>9} {'p50':>9} {'p95':>9}  (ms)")
+    for name, (func, make_args, prepare) in specs.items():
+        if args.only and args.only not in name:
+            continue
+        ctx = write_ctx if name.split('.', 1)[1].startswith(WRITE_PREFIXES) else read_ctx
+        stats = run_bench(func, make_args, prepare, ctx, args.repeat)
+        results["results"][name] = stats
+        print(f"{name:<45} {stats['mean_ms']:>9.3f} {stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f}")
+    if results["unbenchmarked"]:
+        print(f"以下公开函数没有基准，请在bench_specs中补充：{', '.join(results['unbenchmarked'])}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("scale") != args.scale:
+            print(f"注意：基准结果的规模为 {baseline.get('meta', {}).get('scale')}，与本次不同")
+        regressions, improvements = compare(results, baseline, args.threshold)
+        for name, before, after, ratio in improvements:
+            print(f"[改进] {name}: {before:.3f}ms -> {after:.3f}ms (x{ratio:.2f})")
+        for name, before, after, ratio in regressions:
+            print(f"[回归] {name}: {before:.3f}ms -> {after:.3f}ms (x{ratio:.2f})")
+        if regressions:
+            sys.exit(1)
+        print("未发现性能回归")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+文件名：data_app.py
+功能：提供用户数据导入导出的Flask路由接口
+主要内容：
+    - 全部数据的流式导出（NDJSON / zip）
+    - markdown笔记库（zip包）的批量导入，流式返回进度与报告
+"""
+import json
+import os
+import tempfile
+import zipfile
+from datetime import datetime
+from flask import Blueprint, request, jsonify, session, Response
+from backend.auth import login_required
+from backend.services.export_service import stream_ndjson, stream_zip
+from backend.services.import_service import import_notes, iter_zip_entries, CONFLICT_POLICIES
+from backend.md_app import parse_parent_id
+
+data_app = Blueprint('data_app', __name__)
+
+# 导出格式 -> (生成函数, MIME, 扩展名)
+EXPORT_FORMATS = {
+    'ndjson': (stream_ndjson, 'application/x-ndjson', 'ndjson'),
+    'zip': (stream_zip, 'application/zip', 'zip'),
+}
+
+# API: 导出全部数据
+@data_app.route('/api/export', methods=['GET'])
+@login_required
+def export_route():
+    """
+    流式导出用户的学习目标、roadmap节点、笔记与待办（边查询边输出，内存占用与数据量无关）
+    需登录，导出会话中当前用户的数据
+    参数：format（ndjson/zip，默认ndjson）
+    返回：附件下载
+    """
+    user_id, username = session['user_id'], session['username']
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"success": False, "error": "format只能是ndjson或zip"}), 400
+    generate, mimetype, ext = EXPORT_FORMATS[fmt]
+    filename = f"levelup-export-{user_id}-{datetime.now().strftime('%Y%m%d%H%M%S')}.{ext}"
+    response = Response(generate(user_id, username), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    # 关闭反向代理的缓冲，数据生成后立即发往客户端
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# API: 批量导入笔记库
+@data_app.route('/api/import', methods=['POST'])
+@login_required
+def import_route():
+    """
+    导入zip包中的markdown笔记（multipart/form-data），保留目录结构，分块批量写入；需登录，导入到会话中的当前用户
+    参数：file（zip包）, parent_id（可选，导入到的文件夹，默认根目录）,
+          on_conflict（可选，skip/rename，默认skip）
+    返回：NDJSON流，每块写入后一行进度{type: "progress", done, total}，最后一行为报告{type: "report", ...}
+    """
+    user_id = session['user_id']
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({"success": False, "error": "缺少file"}), 400
+    on_conflict = request.form.get('on_conflict', 'skip')
+    if on_conflict not in CONFLICT_POLICIES:
+        return jsonify({"success": False, "error": "on_conflict只能是skip或rename"}), 400
+    try:
+        parent_id = parse_parent_id(request.form.get('parent_id'))
+    except ValueError:
+        return jsonify({"success": False, "error": "parent_id无效"}), 400
+    # 上传内容先落盘，zip需要随机读取目录区
+    fd, tmp_path = tempfile.mkstemp(prefix='levelup-import-', suffix='.zip')
+    with os.fdopen(fd, 'wb') as tmp:
+        upload.save(tmp)
+    if not zipfile.is_zipfile(tmp_path):
+        os.remove(tmp_path)
+        return jsonify({"success": False, "error": "只支持zip格式的笔记包"}), 400
+
+    def generate():
+        try:
+            with zipfile.ZipFile(tmp_path) as zf:
+                for event in import_notes(user_id, iter_zip_entries(zf), parent_id, on_conflict):
+                    yield json.dumps(event, ensure_ascii=False) + '\n'
+        finally:
+            os.remove(tmp_path)
+
+    response = Response(generate(), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
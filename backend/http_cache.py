@@ -0,0 +1,58 @@
+"""
+文件名：http_cache.py
+功能：GET接口的响应辅助函数：条件请求（ETag / If-None-Match / 304）与分页响应头
+主要内容：
+    - 按请求查询参数区分ETag（不同分页、不同目标的响应不共用校验值）
+    - 判断客户端缓存是否仍然有效
+    - 为响应设置ETag与缓存策略
+    - 列表响应被分页截断时设置X-Next-Cursor响应头
+"""
+import hashlib
+from urllib.parse import urlencode
+from flask import request, make_response
+
+# 响应按用户区分，只允许浏览器缓存，且每次使用前必须向服务器确认
+CACHE_CONTROL = 'private, no-cache'
+
+def request_etag(etag):
+    """
+    在数据版本ETag后附加本次请求查询参数的摘要，响应内容随参数（limit、cursor、target_id等）变化
+    参数：etag - 由数据版本号生成的ETag
+    返回：ETag字符串（不含引号）
+    """
+    args = sorted(request.args.items(multi=True))
+    if not args:
+        return etag
+    return etag + '-' + hashlib.sha1(urlencode(args).encode()).hexdigest()[:12]
+
+def not_modified(etag):
+    """
+    客户端携带的If-None-Match与当前ETag一致时返回304响应
+    参数：etag - 当前ETag
+    返回：304响应对象，缓存已失效时返回None
+    """
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = make_response('', 304)
+    return with_etag(response, etag)
+
+def with_etag(response, etag):
+    """
+    为响应设置ETag与Cache-Control
+    参数：response - 响应对象, etag - ETag
+    返回：响应对象
+    """
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response
+
+def with_next_cursor(response, next_cursor):
+    """
+    列表被分页截断时通过响应头X-Next-Cursor传递下一页游标（所有分页列表接口一致，
+    不读取响应体中next_cursor字段的旧客户端也能据此发现结果不完整）
+    参数：response - 响应对象, next_cursor - 下一页游标（None表示已是最后一页）
+    返回：响应对象
+    """
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
@@ -0,0 +1,72 @@
+"""
+文件名：import_vault.py
+功能：命令行批量导入markdown笔记库（Obsidian/Typora的文件夹或zip包）
+主要内容：
+    - 解析参数，调用import_service分块导入，并显示进度
+    - 输出导入结果统计，可将逐文件的冲突/错误报告写入JSON文件
+用法：python backend/import_vault.py <目录或zip包> --user 用户名 [--parent-id 文件夹ID] [--on-conflict skip|rename] [--report report.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import zipfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.migration_service import run_migrations  # noqa: E402
+from backend.services.sign_in_service import get_user_key  # noqa: E402
+from backend.services.import_service import import_notes, iter_zip_entries, iter_dir_entries, CONFLICT_POLICIES  # noqa: E402
+
+def run(user_id, entries, args):
+    """
+    执行导入并显示进度
+    返回：最终报告
+    """
+    start = time.perf_counter()
+    report = None
+    for event in import_notes(user_id, entries, args.parent_id, args.on_conflict):
+        if event["type"] == "progress":
+            print(f"\r已处理 {event['done']}/{event['total']}", end='', flush=True)
+        else:
+            report = event
+    print()
+    report["seconds"] = round(time.perf_counter() - start, 2)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description='批量导入markdown笔记库')
+    parser.add_argument('path', help='笔记库目录或zip包')
+    parser.add_argument('--user', required=True, help='导入到的用户名')
+    parser.add_argument('--parent-id', type=int, default=None, help='导入到的文件夹ID，默认根目录')
+    parser.add_argument('--on-conflict', choices=CONFLICT_POLICIES, default='skip', help='同名文件的处理方式')
+    parser.add_argument('--report', help='逐文件报告的输出路径（JSON）')
+    args = parser.parse_args()
+
+    run_migrations()
+    user_id = get_user_key(args.user)
+    if not user_id:
+        sys.exit(f"用户不存在：{args.user}")
+    if os.path.isdir(args.path):
+        report = run(user_id, iter_dir_entries(args.path), args)
+    elif zipfile.is_zipfile(args.path):
+        with zipfile.ZipFile(args.path) as zf:
+            report = run(user_id, iter_zip_entries(zf), args)
+    else:
+        sys.exit(f"不是目录或zip包：{args.path}")
+    if report.get("error"):
+        sys.exit(report["error"])
+    print(f"新建笔记 {report['created']}，新建文件夹 {report['folders']}，重命名 {report['renamed']}，"
+          f"跳过 {report['skipped']}，出错 {report['errors']}，耗时 {report['seconds']}s")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        for item in report["files"][:20]:
+            print(f"  [{item['status']}] {item['path']} {item.get('name') or item.get('reason', '')}")
+        if len(report["files"]) > 20:
+            print(f"  ……共{len(report['files'])}条，使用--report查看完整报告")
+
+if __name__ == '__main__':
+    main()
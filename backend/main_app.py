@@ -4,36 +4,55 @@
 主要内容：
     - 用户注册、登录、登出、登录校验
     - 学习目标的增删改查与搜索
-    - Blueprint注册（roadmap、md、todo子模块）
+    - 首页聚合接口（dashboard）
+    - Blueprint注册（roadmap、md、todo、search、data子模块）
+    - 请求监控与Prometheus指标接口（/metrics）
+    - 管理员诊断接口（需配置ADMIN_TOKEN）
     - favicon路由
 """
-from flask import Flask, request, jsonify, session, send_from_directory
+from flask import Flask, request, jsonify, session, send_from_directory, Response
 from flask_cors import CORS
 import os
 import sys
-import sqlite3
 from dotenv import load_dotenv
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from backend.services.sign_in_service import init_user_db, add_user, verify_user, update_username, update_password
-from backend.services.target_service import init_target_db, add_target, get_targets, update_target, delete_target, search_targets
+from backend.services.sign_in_service import add_user, verify_user, get_user_key, update_username, update_password
+from backend.services.target_service import add_target, get_targets_page, get_targets_with_progress, update_target, delete_target, search_targets_page
+from backend.services.todo_service import get_todos
+from backend.services.file_service import get_recent_files
 from backend.roadmap_app import roadmap_app
 from backend.md_app import md_app
 from backend.todo_app import todo_app
-from backend.services.roadmap_service import init_roadmap_db
-from backend.services.file_service import init_file_db
-from backend.services.todo_service import init_todo_db
+from backend.search_app import search_app
+from backend.data_app import data_app
+from backend.auth import login_required, admin_required
+from backend.services.db_service import get_conn, release_thread_conns, pool_stats
+from backend.services.migration_service import run_migrations, start_background_backfill
+from backend.services.version_service import get_etag
+from backend.services.cache_service import cache_stats
+from backend.services.compression_service import get_compression_stats
+from backend.services.metrics_service import render_metrics
+from backend.services.profiler_service import get_profile_report, reset_profile
+from backend.request_metrics import init_request_metrics
+from backend.services.log_service import get_logger, log_stats
+from backend.services.diagnostics_service import dump_table, table_counts
+from backend.services.pagination_service import parse_page_args
+from backend.http_cache import not_modified, with_etag, request_etag, with_next_cursor
 
 load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", os.urandom(24))
 db_path = os.getenv("DATABASE_URL", "levelup.db")
 debug_mode = os.getenv("FLASK_DEBUG", "False") == "True"
+# 与wsgi.py、start_all.py的就绪检查使用同一端口配置
+PORT = int(os.getenv("LEVELUP_PORT", "5000"))
+logger = get_logger('app')
 
 # 配置CORS
-CORS(app, supports_credentials=True)
+CORS(app, supports_credentials=True, expose_headers=['X-Next-Cursor'])
 
 # 修改session配置
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'  # 改为Lax
@@ -41,30 +60,19 @@ app.config['SESSION_COOKIE_SECURE'] = False    # 开发环境设为False
 app.config['SESSION_COOKIE_HTTPONLY'] = True   # 增加安全性
 # app.config['SESSION_COOKIE_DOMAIN'] = 'localhost'  # 注释掉，避免跨端口 cookie 问题
 
-# 初始化数据库
-init_user_db()
-init_target_db()
-init_roadmap_db()
-init_file_db(db_path)
-init_todo_db(db_path)
+# 初始化数据库：执行版本化迁移（已是最新版本时不执行任何DDL）
+run_migrations(db_path)
+start_background_backfill(db_path)
 
-def ensure_node_order_column():
+# 请求耗时、状态码、响应大小、SQL统计
+init_request_metrics(app)
+
+@app.teardown_request
+def release_db_conn(exc):
     """
-    数据库迁移：确保roadmap_main_nodes表有node_order字段
+    请求结束时归还本线程持有的数据库连接
     """
-    conn = sqlite3.connect(db_path)  # 使用环境变量
-    c = conn.cursor()
-    # 检查字段是否存在
-    c.execute("PRAGMA table_info(roadmap_main_nodes);")
-    columns = [row[1] for row in c.fetchall()]
-    if 'node_order' not in columns:
-        print("[DB MIGRATION] Adding node_order column to roadmap_main_nodes...")
-        c.execute('ALTER TABLE roadmap_main_nodes ADD COLUMN node_order INTEGER DEFAULT 0;')
-        conn.commit()
-        print("[DB MIGRATION] node_order column added.")
-    conn.close()
-
-ensure_node_order_column()
+    release_thread_conns()
 
 # 添加 favicon 路由，避免 404 报错
 @app.route('/favicon.ico')
@@ -74,18 +82,6 @@ def favicon():
     """
     return send_from_directory(os.path.join(app.root_path, 'static'), 'favicon.ico', mimetype='image/vnd.microsoft.icon')
 
-# 登录验证装饰器
-def login_required(f):
-    """
-    登录校验装饰器，未登录则返回401
-    """
-    def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            return jsonify({'success': False, 'error': '请先登录'}), 401
-        return f(*args, **kwargs)
-    decorated_function.__name__ = f.__name__
-    return decorated_function
-
 @app.route('/register', methods=['POST'])
 def register():
     """
@@ -116,13 +112,14 @@ def login():
     data = request.get_json()
     username = data.get('username')
     password = data.get('password')
-    print(f"收到用户名: [{username}], 密码: [{password}]")  # 调试日志
     if not username or not password:
         return jsonify({'success': False, 'error': '用户名和密码不能为空'})
     
     success, message = verify_user(username, password)
+    logger.info('login', extra={"fields": {"username": username, "success": success}})
     if success:
-        session['user_id'] = username
+        session['user_id'] = get_user_key(username)
+        session['username'] = username
         return jsonify({
             'success': True, 
             'message': '登录成功',
@@ -138,6 +135,7 @@ def logout():
     返回：登出结果
     """
     session.pop('user_id', None)
+    session.pop('username', None)
     return jsonify({'success': True, 'message': '退出成功'})
 
 @app.route('/check_login', methods=['GET'])
@@ -149,7 +147,7 @@ def check_login():
     if 'user_id' in session:
         return jsonify({
             'success': True, 
-            'user': {'username': session['user_id']}
+            'user': {'username': session.get('username', session['user_id'])}
         })
     return jsonify({'success': False, 'error': '未登录'})
 
@@ -157,12 +155,21 @@ def check_login():
 @login_required
 def get_user_targets():
     """
-    获取当前用户的所有学习目标
-    返回：目标列表
+    分页获取当前用户的学习目标（支持If-None-Match条件请求）
+    参数：limit（可选）, cursor（可选）, all（可选，为1时返回全部）
+    返回：目标列表（为兼容旧客户端仍为数组），下一页游标在响应头X-Next-Cursor中
     """
     user_id = session['user_id']
-    targets = get_targets(user_id)
-    return jsonify(targets)
+    etag = request_etag(get_etag(user_id, 'targets'))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    try:
+        limit, cursor = parse_page_args(request.args)
+        targets, next_cursor = get_targets_page(user_id, limit, cursor)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return with_etag(with_next_cursor(jsonify(targets), next_cursor), etag)
 
 @app.route('/targets', methods=['POST'])
 @login_required
@@ -231,18 +238,49 @@ def delete_user_target(target_id):
 def search_user_targets():
     """
     搜索学习目标（标题或标签模糊匹配）
-    参数：query
-    返回：目标列表
+    参数：query, limit（可选）, cursor（可选）, all（可选，为1时返回全部）
+    返回：目标列表（数组），下一页游标在响应头X-Next-Cursor中
     """
     user_id = session['user_id']
     query = request.args.get('query', '')
-    
-    if not query:
-        targets = get_targets(user_id)
-    else:
-        targets = search_targets(query, user_id)
-    
-    return jsonify(targets)
+    try:
+        limit, cursor = parse_page_args(request.args)
+        if not query:
+            targets, next_cursor = get_targets_page(user_id, limit, cursor)
+        else:
+            targets, next_cursor = search_targets_page(query, user_id, limit, cursor)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return with_next_cursor(jsonify(targets), next_cursor)
+
+DASHBOARD_FIELDS = ('user', 'targets', 'todos', 'recent_files')
+
+@app.route('/api/dashboard', methods=['GET'])
+@login_required
+def api_dashboard():
+    """
+    首页聚合接口：一次返回用户信息、带进度的学习目标、待办事项、最近编辑的笔记
+    参数：fields（可选，逗号分隔：user,targets,todos,recent_files，默认全部）,
+          todos（可选，all表示包含已完成事项，默认只返回未完成）, files_limit（可选，默认10）
+    返回：各部分数据
+    """
+    user_id = session['user_id']
+    fields = request.args.get('fields')
+    fields = [f for f in fields.split(',') if f in DASHBOARD_FIELDS] if fields else DASHBOARD_FIELDS
+    try:
+        files_limit = min(max(int(request.args.get('files_limit', 10)), 1), 100)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'files_limit必须为整数'}), 400
+    data = {}
+    if 'user' in fields:
+        data['user'] = {'username': session['username']}
+    if 'targets' in fields:
+        data['targets'] = get_targets_with_progress(user_id)
+    if 'todos' in fields:
+        data['todos'] = get_todos(user_id, include_completed=request.args.get('todos') == 'all')
+    if 'recent_files' in fields:
+        data['recent_files'] = get_recent_files(user_id, files_limit)
+    return jsonify({'success': True, 'data': data})
 
 @app.route('/api/user/username', methods=['PUT'])
 @login_required
@@ -252,15 +290,15 @@ def api_update_username():
     参数：new_username
     返回：操作结果
     """
-    old_username = session['user_id']
+    user_id = session['user_id']
     data = request.get_json()
     new_username = data.get('new_username')
     if not new_username:
         return jsonify({'success': False, 'error': '新用户名不能为空'})
-    success, msg = update_username(old_username, new_username)
+    success, msg = update_username(user_id, new_username)
     if success:
         # 更新session
-        session['user_id'] = new_username
+        session['username'] = new_username
         return jsonify({'success': True, 'message': msg, 'new_username': new_username})
     else:
         return jsonify({'success': False, 'error': msg})
@@ -273,23 +311,140 @@ def api_update_password():
     参数：old_password, new_password
     返回：操作结果
     """
-    username = session['user_id']
+    user_id = session['user_id']
     data = request.get_json()
     old_password = data.get('old_password')
     new_password = data.get('new_password')
     if not old_password or not new_password:
         return jsonify({'success': False, 'error': '密码不能为空'})
-    success, msg = update_password(username, old_password, new_password)
+    success, msg = update_password(user_id, old_password, new_password)
     if success:
         return jsonify({'success': True, 'message': msg})
     else:
         return jsonify({'success': False, 'error': msg})
 
+@app.route('/api/health', methods=['GET'])
+def health():
+    """
+    就绪检查：应用已加载且数据库可访问时返回200，供启动脚本和进程管理器探测
+    返回：状态信息
+    """
+    try:
+        conn = get_conn()
+        conn.execute('SELECT 1').fetchone()
+        conn.close()
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    return jsonify({'success': True, 'pid': os.getpid()})
+
+@app.route('/api/db/stats', methods=['GET'])
+@admin_required
+def api_db_stats():
+    """
+    数据库连接池统计（命中、等待、锁重试等）
+    返回：{数据库路径: 统计字典}
+    """
+    return jsonify({'success': True, 'data': pool_stats()})
+
+@app.route('/api/cache/stats', methods=['GET'])
+@admin_required
+def cache_stats_route():
+    """
+    service读缓存统计（命中、版本失效、过期、淘汰等）
+    返回：统计字典
+    """
+    return jsonify({'success': True, 'data': cache_stats()})
+
+@app.route('/api/db/compression', methods=['GET'])
+@admin_required
+def compression_stats_route():
+    """
+    笔记压缩存储统计（压缩篇数、原文字节数、实际存储字节数、全文索引中的原文字节数、节省字节数）
+    参数：user_id（可选，用户名，只统计该用户）
+    返回：统计字典
+    """
+    username = request.args.get('user_id')
+    user_id = get_user_key(username) if username else None
+    if username and not user_id:
+        return jsonify({'success': False, 'error': '用户不存在'}), 404
+    return jsonify({'success': True, 'data': get_compression_stats(user_id)})
+
+@app.route('/api/db/profile', methods=['GET'])
+@admin_required
+def profile_report_route():
+    """
+    SQL性能分析报告：按总耗时排序的语句统计（调用次数、总耗时、p99、行数、全表扫描、执行计划）及最近的N+1查询
+    需以SQL_PROFILE=True启动才会收集数据
+    参数：limit（可选，默认50）
+    返回：报告字典
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 1000)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit必须为整数'}), 400
+    return jsonify({'success': True, 'data': get_profile_report(limit)})
+
+@app.route('/api/db/profile', methods=['DELETE'])
+@admin_required
+def reset_profile_route():
+    """
+    清空SQL性能分析统计
+    返回：操作结果
+    """
+    reset_profile()
+    return jsonify({'success': True})
+
+@app.route('/api/admin/diagnostics', methods=['GET'])
+@admin_required
+def diagnostics_route():
+    """
+    诊断概览：各表行数、日志队列、连接池与读缓存状态
+    返回：状态字典
+    """
+    return jsonify({'success': True, 'data': {
+        'tables': table_counts(),
+        'logging': log_stats(),
+        'db_pool': pool_stats(),
+        'cache': cache_stats(),
+    }})
+
+@app.route('/api/admin/diagnostics/tables/<table>', methods=['GET'])
+@admin_required
+def diagnostics_table_route(table):
+    """
+    分页查看roadmap节点表、文件表的数据（按id排序）
+    参数：table - roadmap_main_nodes/roadmap_branch_nodes/files, user_id（可选，用户名）, limit（可选）, cursor（可选）
+    返回：行列表, next_cursor
+    """
+    username = request.args.get('user_id')
+    user_id = get_user_key(username) if username else None
+    if username and not user_id:
+        return jsonify({'success': False, 'error': '用户不存在'}), 404
+    try:
+        limit, cursor = parse_page_args(request.args)
+        result = dump_table(table, user_id, limit, cursor)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if result is None:
+        return jsonify({'success': False, 'error': '不支持查看该表'}), 404
+    rows, next_cursor = result
+    return with_next_cursor(jsonify({'success': True, 'data': rows, 'next_cursor': next_cursor}), next_cursor)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus指标：按路由的请求数、状态码、延迟/响应大小/SQL语句数直方图、SQL耗时（当前进程）
+    返回：Prometheus文本格式
+    """
+    return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # 注册子模块蓝图
 app.register_blueprint(roadmap_app)
 app.register_blueprint(md_app)
 app.register_blueprint(todo_app)
+app.register_blueprint(search_app)
+app.register_blueprint(data_app)
 
 if __name__ == '__main__':
     # 启动主Flask应用
-    app.run(port=5000, debug=debug_mode)
+    app.run(port=PORT, debug=debug_mode)
@@ -3,17 +3,29 @@
 功能：提供md文件（笔记）相关的Flask路由接口，包括文件的增删改查、搜索、roadmap进度获取等
 主要内容：
     - md文件的RESTful接口
-    - 文件内容获取与保存
+    - 文件内容获取与保存（整篇保存与基于哈希的增量保存）
+    - 目录树按层加载与文件夹的移动、复制、大小统计
+    - 笔记修订历史的列表、历史版本获取与版本对比
+    - 图片附件的上传与按哈希下载
     - 文件搜索与roadmap进度接口
 """
 # app.py 完整修改版本
 
-from flask import Blueprint, render_template, request, jsonify
-import sqlite3
+from flask import Blueprint, render_template, request, jsonify, send_file
 import os
 from flask_cors import CORS
-from backend.services.file_service import get_files, add_file, get_file_content, update_file, delete_file
-from backend.services.roadmap_service import get_roadmap_progress
+from backend.services.file_service import get_files_page, search_file_names, get_files_by_node, add_file, get_file_content, update_file, delete_file, patch_file, PATCH_CONFLICT
+from backend.services.delta_service import content_hash
+from backend.services.revision_service import list_revisions, get_revision, diff_revisions
+from backend.services.attachment_service import store_attachment, get_attachment, collect_garbage
+from backend.services.roadmap_service import get_roadmap_progress, get_targets_progress
+from backend.services.db_service import get_conn
+from backend.services.sign_in_service import get_user_key
+from backend.auth import admin_required
+from backend.services.version_service import get_etag
+from backend.http_cache import not_modified, with_etag, request_etag, with_next_cursor
+from backend.services.pagination_service import parse_page_args
+from backend.services.file_tree_service import list_children, create_folder, move_node, copy_node, get_subtree_size
 from dotenv import load_dotenv
 
 md_app = Blueprint('md_app', __name__)
@@ -40,15 +52,41 @@ def index():
 @md_app.route('/api/files', methods=['GET'])
 def get_files_route():
     """
-    获取指定用户的所有文件列表
-    参数：user_id
-    返回：文件列表
+    分页获取指定用户的文件列表（支持If-None-Match条件请求）
+    参数：user_id, limit（可选）, cursor（可选）, all（可选，为1时返回全部）
+    返回：文件列表, next_cursor
     """
-    user_id = request.args.get('user_id')
+    user_id = get_user_key(request.args.get('user_id'))
     if not user_id:
         return jsonify({"success": False, "error": "缺少user_id"}), 400
     try:
-        files = get_files(user_id)
+        etag = request_etag(get_etag(user_id, 'files'))
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        limit, cursor = parse_page_args(request.args)
+        files, next_cursor = get_files_page(user_id, limit, cursor)
+        return with_etag(with_next_cursor(jsonify({"success": True, "data": files, "next_cursor": next_cursor}), next_cursor), etag)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# API: 获取roadmap节点关联的笔记
+@md_app.route('/api/files/by_node', methods=['GET'])
+def get_files_by_node_route():
+    """
+    获取关联到指定roadmap主节点/分支节点的笔记列表
+    参数：user_id, main_id, branch_id（可选）
+    返回：文件列表
+    """
+    user_id = get_user_key(request.args.get('user_id'))
+    main_id = request.args.get('main_id')
+    branch_id = request.args.get('branch_id')
+    if not user_id or not (main_id or branch_id):
+        return jsonify({"success": False, "error": "缺少user_id或节点ID"}), 400
+    try:
+        files = get_files_by_node(user_id, main_id, branch_id)
         return jsonify({"success": True, "data": files})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -58,18 +96,18 @@ def get_files_route():
 def save_or_create_file():
     """
     新建或保存文件
-    参数：name, content, tags, user_id
+    参数：name, content, tags, user_id, parent_id（可选，所在文件夹）
     返回：文件信息
     """
     data = request.json
     name = data.get('name')
     content = data.get('content', '')
     tags = data.get('tags', '')
-    user_id = data.get('user_id')
+    user_id = get_user_key(data.get('user_id'))
     if not name or not user_id:
         return jsonify({"success": False, "error": "文件名和user_id不能为空"}), 400
     try:
-        file_data, err = add_file(name, content, tags, user_id)
+        file_data, err = add_file(name, content, tags, user_id, parse_parent_id(data.get('parent_id')))
         if err:
             return jsonify({"success": False, "error": err}), 409
         return jsonify({
@@ -84,7 +122,8 @@ def save_or_create_file():
                 "tags": file_data[5],
                 "user_id": file_data[6],
                 "created_at": file_data[7],
-                "updated_at": file_data[8]
+                "updated_at": file_data[8],
+                "hash": content_hash(file_data[2])
             }
         })
     except Exception as e:
@@ -111,7 +150,8 @@ def get_file_content_route(file_id):
                 "content": content or "",
                 "is_dir": bool(is_dir),
                 "parent_id": parent_id,
-                "tags": tags
+                "tags": tags,
+                "hash": content_hash(content)
             }
         })
     except Exception as e:
@@ -130,7 +170,7 @@ def update_file_content_route(file_id):
         name = data.get('name')
         content = data.get('content')
         tags = data.get('tags')
-        user_id = data.get('user_id')
+        user_id = get_user_key(data.get('user_id'))
         if not user_id:
             return jsonify({"success": False, "error": "缺少user_id"}), 400
         if not name and not content and not tags:
@@ -150,21 +190,100 @@ def update_file_content_route(file_id):
                 "tags": file_data[5],
                 "user_id": file_data[6],
                 "created_at": file_data[7],
-                "updated_at": file_data[8]
+                "updated_at": file_data[8],
+                "hash": content_hash(file_data[2])
             }
         })
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+# API: 增量更新文件内容
+@md_app.route('/api/files/<int:file_id>', methods=['PATCH'])
+def patch_file_content_route(file_id):
+    """
+    以补丁增量更新文件内容，基准哈希与服务器内容不一致时返回409
+    参数：file_id, user_id, base_hash, patch（[[start, end, text], ...]）
+    返回：新内容的哈希
+    """
+    data = request.get_json()
+    user_id = get_user_key(data.get('user_id'))
+    base_hash = data.get('base_hash')
+    if not user_id or not base_hash or 'patch' not in data:
+        return jsonify({"success": False, "error": "缺少user_id、base_hash或patch"}), 400
+    try:
+        result, err = patch_file(file_id, base_hash, data['patch'], user_id)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    if err == PATCH_CONFLICT:
+        return jsonify({"success": False, "error": err, "data": result}), 409
+    if err:
+        return jsonify({"success": False, "error": err}), 404
+    return jsonify({"success": True, "message": "文件更新成功", "data": result})
+
+# API: 获取修订列表
+@md_app.route('/api/files/<int:file_id>/revisions', methods=['GET'])
+def list_revisions_route(file_id):
+    """
+    获取笔记的修订列表（从新到旧）
+    参数：file_id, user_id, limit（可选）, cursor（可选）, all（可选）
+    返回：current（当前版本）, 历史版本列表, next_cursor
+    """
+    user_id = get_user_key(request.args.get('user_id'))
+    if not user_id:
+        return jsonify({"success": False, "error": "缺少user_id"}), 400
+    try:
+        limit, cursor = parse_page_args(request.args)
+        result = list_revisions(user_id, file_id, limit, cursor)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    if result is None:
+        return jsonify({"success": False, "error": "文件不存在或无权限"}), 404
+    current, revisions, next_cursor = result
+    return with_next_cursor(jsonify({"success": True, "current": current, "data": revisions, "next_cursor": next_cursor}), next_cursor)
+
+# API: 获取历史版本
+@md_app.route('/api/files/<int:file_id>/revisions/<int:rev>', methods=['GET'])
+def get_revision_route(file_id, rev):
+    """
+    获取笔记的指定版本内容
+    参数：file_id, rev, user_id
+    返回：{rev, name, content, hash, created_at, current}
+    """
+    user_id = get_user_key(request.args.get('user_id'))
+    if not user_id:
+        return jsonify({"success": False, "error": "缺少user_id"}), 400
+    revision = get_revision(user_id, file_id, rev)
+    if revision is None:
+        return jsonify({"success": False, "error": "版本不存在"}), 404
+    return jsonify({"success": True, "data": revision})
+
+# API: 对比两个版本
+@md_app.route('/api/files/<int:file_id>/diff', methods=['GET'])
+def diff_revisions_route(file_id):
+    """
+    对比笔记的两个版本
+    参数：file_id, user_id, from（旧版本号）, to（新版本号，可选，默认当前版本）
+    返回：{from, to, diff（unified diff文本）}
+    """
+    user_id = get_user_key(request.args.get('user_id'))
+    from_rev = request.args.get('from', type=int)
+    to_rev = request.args.get('to', type=int)
+    if not user_id or from_rev is None:
+        return jsonify({"success": False, "error": "缺少user_id或from"}), 400
+    result = diff_revisions(user_id, file_id, from_rev, to_rev)
+    if result is None:
+        return jsonify({"success": False, "error": "版本不存在"}), 404
+    return jsonify({"success": True, "data": result})
+
 # API: 删除文件/目录
 @md_app.route('/api/files/<int:file_id>', methods=['DELETE'])
 def delete_file_route(file_id):
     """
-    删除指定文件
+    删除指定文件（文件夹连同其所有子项）
     参数：file_id, user_id
     返回：操作结果
     """
-    user_id = request.args.get('user_id')
+    user_id = get_user_key(request.args.get('user_id'))
     if not user_id:
         return jsonify({"success": False, "error": "缺少user_id"}), 400
     try:
@@ -186,23 +305,175 @@ def delete_file_route(file_id):
 def search_files():
     """
     搜索指定用户的md文件（按文件名模糊匹配）
-    参数：user_id, q
-    返回：文件列表
+    参数：user_id, q, limit（可选）, cursor（可选）, all（可选，为1时返回全部）
+    返回：文件列表, next_cursor
     """
-    user_id = request.args.get('user_id')
+    user_id = get_user_key(request.args.get('user_id'))
     keyword = request.args.get('q', '')
     if not user_id:
         return jsonify({"success": False, "error": "缺少user_id"}), 400
     try:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        c.execute("SELECT id, name, tags FROM files WHERE user_id=? AND name LIKE ?", (user_id, f'%{keyword}%'))
-        files = [{"id": row[0], "name": row[1], "tags": row[2]} for row in c.fetchall()]
-        conn.close()
-        return jsonify({"success": True, "data": files})
+        limit, cursor = parse_page_args(request.args)
+        files, next_cursor = search_file_names(user_id, keyword, limit, cursor)
+        return with_next_cursor(jsonify({"success": True, "data": files, "next_cursor": next_cursor}), next_cursor)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+def parse_parent_id(value):
+    """
+    解析文件夹ID参数，空值表示根目录
+    """
+    if value in (None, '', 'null', 'root'):
+        return None
+    return int(value)
+
+# API: 按层获取目录树
+@md_app.route('/api/files/tree', methods=['GET'])
+def get_file_tree_route():
+    """
+    获取一个文件夹下的直接子项（文件夹含child_count，用于目录树懒加载）
+    参数：user_id, parent_id（可选，默认根目录）, limit（可选）, cursor（可选）, all（可选）
+    返回：子项列表, next_cursor
+    """
+    user_id = get_user_key(request.args.get('user_id'))
+    if not user_id:
+        return jsonify({"success": False, "error": "缺少user_id"}), 400
+    try:
+        parent_id = parse_parent_id(request.args.get('parent_id'))
+        limit, cursor = parse_page_args(request.args)
+        children, next_cursor = list_children(user_id, parent_id, limit, cursor)
+        return with_next_cursor(jsonify({"success": True, "data": children, "next_cursor": next_cursor}), next_cursor)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+# API: 新建文件夹
+@md_app.route('/api/files/folder', methods=['POST'])
+def create_folder_route():
+    """
+    新建文件夹
+    参数：user_id, name, parent_id（可选）
+    返回：文件夹ID
+    """
+    data = request.get_json()
+    user_id = get_user_key(data.get('user_id'))
+    name = data.get('name')
+    if not user_id or not name:
+        return jsonify({"success": False, "error": "文件夹名和user_id不能为空"}), 400
+    try:
+        folder_id, err = create_folder(user_id, name, parse_parent_id(data.get('parent_id')))
+        if err:
+            return jsonify({"success": False, "error": err}), 409
+        return jsonify({"success": True, "data": {"id": folder_id}})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+# API: 移动文件/文件夹
+@md_app.route('/api/files/<int:file_id>/move', methods=['PUT'])
+def move_file_route(file_id):
+    """
+    移动文件/文件夹到指定文件夹下（文件夹连同子树一起移动）
+    参数：file_id, user_id, parent_id（为空时移到根目录）
+    返回：操作结果
+    """
+    data = request.get_json()
+    user_id = get_user_key(data.get('user_id'))
+    if not user_id:
+        return jsonify({"success": False, "error": "缺少user_id"}), 400
+    try:
+        ok, err = move_node(user_id, file_id, parse_parent_id(data.get('parent_id')))
+        if not ok:
+            return jsonify({"success": False, "error": err}), 409
+        return jsonify({"success": True})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+# API: 复制文件/文件夹
+@md_app.route('/api/files/<int:file_id>/copy', methods=['POST'])
+def copy_file_route(file_id):
+    """
+    复制文件/文件夹到指定文件夹下（文件夹递归复制）
+    参数：file_id, user_id, parent_id（为空时复制到根目录）
+    返回：新文件/文件夹ID
+    """
+    data = request.get_json()
+    user_id = get_user_key(data.get('user_id'))
+    if not user_id:
+        return jsonify({"success": False, "error": "缺少user_id"}), 400
+    try:
+        new_id, err = copy_node(user_id, file_id, parse_parent_id(data.get('parent_id')))
+        if err:
+            return jsonify({"success": False, "error": err}), 409
+        return jsonify({"success": True, "data": {"id": new_id}})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+# API: 统计文件/文件夹大小
+@md_app.route('/api/files/<int:file_id>/size', methods=['GET'])
+def get_file_size_route(file_id):
+    """
+    统计文件/文件夹子树的文件数、文件夹数与内容字节数
+    参数：file_id, user_id
+    返回：{files, folders, bytes}
+    """
+    user_id = get_user_key(request.args.get('user_id'))
+    if not user_id:
+        return jsonify({"success": False, "error": "缺少user_id"}), 400
+    size = get_subtree_size(user_id, file_id)
+    if size is None:
+        return jsonify({"success": False, "error": "文件不存在或无权限"}), 404
+    return jsonify({"success": True, "data": size})
+
+# 附件按内容寻址，同一URL的内容永不改变，允许浏览器和代理长期缓存
+ATTACHMENT_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# API: 上传附件
+@md_app.route('/api/attachments', methods=['POST'])
+def upload_attachment_route():
+    """
+    上传图片附件（multipart/form-data），相同内容只存一份
+    参数：file（图片文件）, user_id
+    返回：{hash, size, mime, url}，笔记中以url引用附件
+    """
+    user_id = get_user_key(request.form.get('user_id'))
+    upload = request.files.get('file')
+    if not user_id or not upload:
+        return jsonify({"success": False, "error": "缺少user_id或file"}), 400
+    attachment, err = store_attachment(upload.stream)
+    if err:
+        return jsonify({"success": False, "error": err}), 400
+    attachment['url'] = f"/api/attachments/{attachment['hash']}"
+    return jsonify({"success": True, "data": attachment})
+
+# API: 下载附件
+@md_app.route('/api/attachments/<blob_hash>', methods=['GET'])
+def get_attachment_route(blob_hash):
+    """
+    按哈希获取附件（支持If-None-Match与Range请求）
+    参数：blob_hash - SHA-256十六进制字符串
+    返回：附件内容
+    """
+    attachment = get_attachment(blob_hash)
+    if not attachment:
+        return jsonify({"success": False, "error": "附件不存在"}), 404
+    response = send_file(attachment['path'], mimetype=attachment['mime'], conditional=True, etag=blob_hash)
+    response.headers['Cache-Control'] = ATTACHMENT_CACHE_CONTROL
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+# API: 清理无引用的附件
+@md_app.route('/api/attachments/gc', methods=['POST'])
+@admin_required
+def collect_attachments_route():
+    """
+    删除没有任何笔记引用且超过保留期的附件（需管理员令牌）
+    返回：{deleted, freed_bytes}
+    """
+    return jsonify({"success": True, "data": collect_garbage()})
+
 # API: 获取roadmap进度
 @md_app.route('/api/roadmap_progress', methods=['GET'])
 def get_roadmap_progress_route():
@@ -211,7 +482,7 @@ def get_roadmap_progress_route():
     参数：user_id, target_id
     返回：progress（0~1）
     """
-    user_id = request.args.get('user_id')
+    user_id = get_user_key(request.args.get('user_id'))
     target_id = request.args.get('target_id')
     if not user_id or not target_id:
         return jsonify({'success': False, 'error': '缺少user_id或target_id'}), 400
@@ -221,6 +492,23 @@ def get_roadmap_progress_route():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# API: 批量获取所有目标的roadmap进度
+@md_app.route('/api/roadmap_progress/batch', methods=['GET'])
+def get_targets_progress_route():
+    """
+    获取指定用户所有目标的roadmap学习进度
+    参数：user_id
+    返回：progress - {target_id: 0~1}
+    """
+    user_id = get_user_key(request.args.get('user_id'))
+    if not user_id:
+        return jsonify({'success': False, 'error': '缺少user_id'}), 400
+    try:
+        progress = get_targets_progress(user_id)
+        return jsonify({'success': True, 'progress': progress})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # 临时添加测试路由
 @md_app.route('/test-db')
 def test_db():
@@ -228,7 +516,7 @@ def test_db():
     测试数据库连接和文件表内容
     """
     try:
-        conn = sqlite3.connect(db_path)
+        conn = get_conn()
         c = conn.cursor()
         c.execute("SELECT id, name, is_dir FROM files")
         files = c.fetchall()
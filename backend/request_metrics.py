@@ -0,0 +1,94 @@
+"""
+文件名：request_metrics.py
+功能：请求级监控中间件，为每个请求记录耗时、状态码、响应大小、SQL语句数与SQL耗时
+主要内容：
+    - before_request/after_request钩子，结果汇总到metrics_service
+    - 流式响应在响应关闭时才记录，耗时、字节数与SQL统计包含生成过程
+    - SQL性能分析开启时，在请求结束后检查N+1查询（见profiler_service）
+    - 每个请求输出一条结构化访问日志（REQUEST_LOG=False可关闭）
+"""
+import time
+from dotenv import load_dotenv
+import os
+from flask import request, g
+from backend.services.db_service import begin_query_stats, end_query_stats
+from backend.services.metrics_service import observe_request
+from backend.services.profiler_service import profiler
+from backend.services.log_service import get_logger
+
+load_dotenv()
+REQUEST_LOG = os.getenv("REQUEST_LOG", "True") == "True"
+logger = get_logger('access')
+
+def _start_request():
+    g.request_start = time.perf_counter()
+    begin_query_stats()
+    profiler.begin_request()
+
+def _record(method, route, path, status, start, size, streamed):
+    """
+    汇总一个请求的监控数据并输出访问日志
+    """
+    seconds = time.perf_counter() - start
+    sql_count, sql_seconds = end_query_stats()
+    profiler.end_request(route)
+    observe_request(method, route, status, seconds, size, sql_count, sql_seconds)
+    if REQUEST_LOG:
+        logger.info('request', extra={"fields": {
+            "method": method,
+            "route": route,
+            "path": path,
+            "status": status,
+            "ms": round(seconds * 1000, 2),
+            "bytes": size,
+            "sql": sql_count,
+            "sql_ms": round(sql_seconds * 1000, 2),
+            "streamed": streamed,
+        }})
+
+def _measure_stream(response, finish):
+    """
+    包装流式响应体：边输出边累计字节数，响应关闭时调用finish(字节数)
+    生成器中执行的SQL发生在after_request之后，因此统计要到响应关闭时才结束
+    """
+    body = response.response
+    sent = [0]
+
+    def generate():
+        try:
+            for chunk in body:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                sent[0] += len(chunk)
+                yield chunk
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+    response.response = generate()
+    response.call_on_close(lambda: finish(sent[0]))
+
+def _finish_request(response):
+    start = g.pop('request_start', None)
+    if start is None:
+        return response
+    # 未匹配到路由（404等）统一归为一类，避免任意路径成为标签
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    args = (request.method, route, request.path, response.status_code, start)
+    if response.is_streamed and not response.direct_passthrough:
+        # 流式生成的响应（导出、导入进度）：耗时、字节数、SQL统计包含生成过程，在响应关闭时记录
+        _measure_stream(response, lambda size: _record(*args, size, True))
+    elif response.is_streamed:
+        # send_file等直接透传的文件：大小取Content-Length，不包装以保留服务器的文件发送优化
+        _record(*args, response.content_length, False)
+    else:
+        _record(*args, response.calculate_content_length(), False)
+    return response
+
+def init_request_metrics(app):
+    """
+    为Flask应用注册请求监控钩子（应在其他before_request钩子之前调用，使耗时包含它们）
+    参数：app - Flask应用
+    """
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
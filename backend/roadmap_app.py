@@ -3,16 +3,21 @@
 功能：提供Roadmap相关的Flask路由接口，包括主/分节点的增删改查、搜索、节点列表等
 主要内容：
     - Roadmap主节点/分支节点的RESTful接口
+    - 主节点移动（排序）接口
     - Roadmap节点搜索接口
     - Roadmap节点列表接口
 """
 from flask import Blueprint, request, jsonify
-import sqlite3
 from backend.services.roadmap_service import (
-    get_roadmap, add_branch_node,
+    get_roadmap_with_title, add_branch_node, move_main_node,
     update_main_node, update_branch_node, delete_main_node, delete_branch_node,
     search_roadmap_nodes  # 新增
 )
+from backend.services.db_service import get_conn
+from backend.services.sign_in_service import get_user_key
+from backend.services.version_service import get_etag
+from backend.http_cache import not_modified, with_etag, request_etag, with_next_cursor
+from backend.services.pagination_service import parse_page_args
 from dotenv import load_dotenv
 import os
 
@@ -24,21 +29,21 @@ db_path = os.getenv("DATABASE_URL", "levelup.db")
 @roadmap_app.route('/roadmap', methods=['GET'])
 def api_get_roadmap():
     """
-    获取指定用户、目标的Roadmap结构，并返回目标名
+    获取指定用户、目标的Roadmap结构，并返回目标名（支持If-None-Match条件请求）
     参数：user_id, target_id
     返回：主节点及分支节点嵌套结构 + 目标名
     """
-    user_id = request.args.get('user_id')
+    user_id = get_user_key(request.args.get('user_id'))
     target_id = request.args.get('target_id', 'testtarget')
-    # 查询目标名
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute('SELECT title FROM targets WHERE id=?', (target_id,))
-    row = c.fetchone()
-    target_title = row[0] if row else '未命名目标'
-    conn.close()
-    roadmap = get_roadmap(user_id, target_id)
-    return jsonify({'roadmap': roadmap, 'target_title': target_title})
+    if not user_id:
+        return jsonify({'success': False, 'error': '缺少user_id'}), 400
+    # 先取版本号再查询：查询期间发生的写入会使下次请求的ETag不一致，不会漏掉更新
+    etag = request_etag(get_etag(user_id, 'roadmap', 'targets'))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    roadmap, target_title = get_roadmap_with_title(user_id, target_id)
+    return with_etag(jsonify({'roadmap': roadmap, 'target_title': target_title}), etag)
 
 @roadmap_app.route('/roadmap/main', methods=['POST'])
 def api_add_main_node():
@@ -48,7 +53,7 @@ def api_add_main_node():
     返回：操作结果
     """
     data = request.get_json()
-    user_id = data.get('user_id')
+    user_id = get_user_key(data.get('user_id'))
     title = data.get('title')
     target_id = data.get('target_id', 'testtarget')
     insert_after_id = data.get('insert_after_id')  # 新增
@@ -66,11 +71,10 @@ def api_add_branch_node():
     返回：操作结果
     """
     data = request.get_json()
-    user_id = data.get('user_id')
+    user_id = get_user_key(data.get('user_id'))
     main_id = data.get('main_id')
     title = data.get('title')
     target_id = data.get('target_id', 'testtarget')
-    print(f"[DEBUG] /roadmap/branch 参数: main_id={main_id}, target_id={target_id}, title={title}, user_id={user_id}")
     if not user_id or not main_id or not title or not target_id:
         return jsonify({'success': False, 'error': 'user_id、分技能点参数不完整'})
     add_branch_node(main_id, target_id, title, user_id)
@@ -84,14 +88,15 @@ def api_update_main_node(node_id):
     返回：操作结果
     """
     data = request.get_json()
-    user_id = data.get('user_id')
+    user_id = get_user_key(data.get('user_id'))
     title = data.get('title')
     status = data.get('status')
     remark = data.get('remark', '')
     target_id = data.get('target_id', 'testtarget')
     if not user_id or not title or not status or not target_id:
         return jsonify({'success': False, 'error': 'user_id、参数不完整'})
-    update_main_node(node_id, title, status, remark, target_id)
+    if not update_main_node(node_id, title, status, remark, target_id, user_id):
+        return jsonify({'success': False, 'error': '技能点不存在'}), 404
     return jsonify({'success': True})
 
 @roadmap_app.route('/roadmap/branch/<int:node_id>', methods=['PUT'])
@@ -102,14 +107,36 @@ def api_update_branch_node(node_id):
     返回：操作结果
     """
     data = request.get_json()
-    user_id = data.get('user_id')
+    user_id = get_user_key(data.get('user_id'))
     title = data.get('title')
     status = data.get('status')
     remark = data.get('remark', '')
     target_id = data.get('target_id', 'testtarget')
     if not user_id or not title or not status or not target_id:
         return jsonify({'success': False, 'error': 'user_id、参数不完整'})
-    update_branch_node(node_id, title, status, remark, target_id)
+    if not update_branch_node(node_id, title, status, remark, target_id, user_id):
+        return jsonify({'success': False, 'error': '分技能点不存在'}), 404
+    return jsonify({'success': True})
+
+@roadmap_app.route('/roadmap/main/<int:node_id>/move', methods=['PUT'])
+def api_move_main_node(node_id):
+    """
+    移动主节点到指定主节点之后
+    参数：node_id, user_id, target_id, after_id（为空时移到最前）
+    返回：操作结果
+    """
+    data = request.get_json()
+    user_id = get_user_key(data.get('user_id'))
+    target_id = data.get('target_id')
+    after_id = data.get('after_id')
+    if not user_id or not target_id:
+        return jsonify({'success': False, 'error': 'user_id、目标ID不能为空'})
+    try:
+        moved = move_main_node(node_id, user_id, target_id, after_id)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if not moved:
+        return jsonify({'success': False, 'error': '技能点不存在'}), 404
     return jsonify({'success': True})
 
 @roadmap_app.route('/roadmap/main/<int:node_id>', methods=['DELETE'])
@@ -119,8 +146,12 @@ def api_delete_main_node(node_id):
     参数：node_id, user_id, target_id
     返回：操作结果
     """
+    user_id = get_user_key(request.args.get('user_id'))
     target_id = request.args.get('target_id', 'testtarget')
-    delete_main_node(node_id, target_id)
+    if not user_id:
+        return jsonify({'success': False, 'error': '缺少user_id'}), 400
+    if not delete_main_node(node_id, target_id, user_id):
+        return jsonify({'success': False, 'error': '技能点不存在'}), 404
     return jsonify({'success': True})
 
 @roadmap_app.route('/roadmap/branch/<int:node_id>', methods=['DELETE'])
@@ -130,37 +161,49 @@ def api_delete_branch_node(node_id):
     参数：node_id, user_id, target_id
     返回：操作结果
     """
+    user_id = get_user_key(request.args.get('user_id'))
     target_id = request.args.get('target_id', 'testtarget')
-    delete_branch_node(node_id, target_id)
+    if not user_id:
+        return jsonify({'success': False, 'error': '缺少user_id'}), 400
+    if not delete_branch_node(node_id, target_id, user_id):
+        return jsonify({'success': False, 'error': '分技能点不存在'}), 404
     return jsonify({'success': True})
 
 @roadmap_app.route('/roadmap/search', methods=['GET'])
 def api_search_roadmap_nodes():
     """
     搜索Roadmap节点（主/分）
-    参数：user_id, q
-    返回：节点列表
+    参数：user_id, q, limit（可选）, cursor（可选）, all（可选，为1时不分页）
+    返回：节点列表, next_cursor
     """
-    user_id = request.args.get('user_id')
+    user_id = get_user_key(request.args.get('user_id'))
     keyword = request.args.get('q', '')
     if not user_id:
         return jsonify({'success': False, 'error': '缺少user_id'}), 400
-    results = search_roadmap_nodes(keyword, user_id)
-    return jsonify({'success': True, 'data': results})
+    try:
+        limit, cursor = parse_page_args(request.args)
+        results, next_cursor = search_roadmap_nodes(keyword, user_id, limit, cursor)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return with_next_cursor(jsonify({'success': True, 'data': results, 'next_cursor': next_cursor}), next_cursor)
 
 @roadmap_app.route('/roadmap/get_main_nodes')
 def get_main_nodes():
     """
-    获取指定目标下的所有主节点列表
-    参数：target_id
+    获取指定目标下该用户的所有主节点列表
+    参数：user_id, target_id
     返回：主节点列表
     """
+    user_id = get_user_key(request.args.get('user_id'))
     target_id = request.args.get('target_id')
+    if not user_id:
+        return jsonify({'success': False, 'error': '缺少user_id'}), 400
     if not target_id:
         return jsonify({'success': False, 'error': '缺少target_id'})
-    conn = sqlite3.connect(db_path)
+    conn = get_conn()
     c = conn.cursor()
-    c.execute('SELECT id, title FROM roadmap_main_nodes WHERE target_id=?', (target_id,))
+    c.execute('SELECT id, title FROM roadmap_main_nodes WHERE uid=? AND target_id=? ORDER BY node_order, id',
+              (user_id, target_id))
     nodes = [{'id': row[0], 'title': row[1]} for row in c.fetchall()]
     conn.close()
     return jsonify({'success': True, 'data': nodes})
@@ -168,16 +211,19 @@ def get_main_nodes():
 @roadmap_app.route('/roadmap/get_branch_nodes')
 def get_branch_nodes():
     """
-    获取指定主节点下的所有分支节点列表
-    参数：main_id
+    获取指定主节点下该用户的所有分支节点列表
+    参数：user_id, main_id
     返回：分支节点列表
     """
+    user_id = get_user_key(request.args.get('user_id'))
     main_id = request.args.get('main_id')
+    if not user_id:
+        return jsonify({'success': False, 'error': '缺少user_id'}), 400
     if not main_id:
         return jsonify({'success': False, 'error': '缺少main_id'})
-    conn = sqlite3.connect(db_path)
+    conn = get_conn()
     c = conn.cursor()
-    c.execute('SELECT id, title FROM roadmap_branch_nodes WHERE main_id=?', (main_id,))
+    c.execute('SELECT id, title FROM roadmap_branch_nodes WHERE uid=? AND main_id=?', (user_id, main_id))
     nodes = [{'id': row[0], 'title': row[1]} for row in c.fetchall()]
     conn.close()
     return jsonify({'success': True, 'data': nodes}) 
\ No newline at end of file
@@ -0,0 +1,38 @@
+"""
+文件名：search_app.py
+功能：提供统一全文检索的Flask路由接口
+主要内容：
+    - 笔记、学习目标、roadmap节点的统一检索接口
+"""
+from flask import Blueprint, request, jsonify
+from backend.services.search_service import search_all
+from backend.services.sign_in_service import get_user_key
+from backend.http_cache import with_next_cursor
+
+search_app = Blueprint('search_app', __name__)
+
+@search_app.route('/api/search', methods=['GET'])
+def api_search():
+    """
+    统一全文检索（bm25排序，返回高亮标题与正文摘要，按实体类型分组）
+    参数：user_id, q, types（可选，逗号分隔：file,target,main,branch）, limit（可选，默认50）,
+          cursor（可选，上一页返回的next_cursor）
+    返回：{file: [...], target: [...], main: [...], branch: [...]}, next_cursor
+    """
+    user_id = get_user_key(request.args.get('user_id'))
+    keyword = request.args.get('q', '')
+    types = request.args.get('types')
+    if not user_id:
+        return jsonify({'success': False, 'error': '缺少user_id'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 200)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit必须为整数'}), 400
+    try:
+        results, next_cursor = search_all(user_id, keyword, types.split(',') if types else None, limit,
+                                          request.args.get('cursor'))
+        return with_next_cursor(jsonify({'success': True, 'data': results, 'next_cursor': next_cursor}), next_cursor)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
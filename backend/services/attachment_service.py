@@ -0,0 +1,186 @@
+"""
+文件名：attachment_service.py
+功能：笔记附件（图片）的内容寻址存储
+主要内容：
+    - 附件按内容的SHA-256存放在磁盘上（ATTACHMENT_DIR/哈希前两位/哈希），相同内容只存一份（跨用户去重）
+    - 笔记内容通过 /api/attachments/<哈希> 引用附件，保存笔记时同步引用关系，
+      引用计数由file_attachments表上的触发器维护
+    - 清理无引用且超过保留期的附件
+"""
+import hashlib
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from backend.services.db_service import get_conn
+
+load_dotenv()
+ATTACHMENT_DIR = os.getenv("ATTACHMENT_DIR", "attachments")
+MAX_ATTACHMENT_BYTES = int(os.getenv("ATTACHMENT_MAX_BYTES", str(20 * 1024 * 1024)))
+# 上传后尚未被笔记引用的附件保留时长，超过后才会被清理
+ORPHAN_GRACE_HOURS = int(os.getenv("ATTACHMENT_ORPHAN_GRACE_HOURS", "24"))
+# 笔记内容中引用附件的写法
+ATTACHMENT_REF_RE = re.compile(r'/api/attachments/([0-9a-f]{64})')
+HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+# 允许的图片类型：(文件头, MIME)；以文件头判断类型，不信任客户端声明
+IMAGE_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+]
+CHUNK_SIZE = 64 * 1024
+
+def _sniff_mime(head):
+    """
+    根据文件头判断图片类型
+    返回：MIME字符串，不是支持的图片类型时返回None
+    """
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    for signature, mime in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    return None
+
+def blob_path(blob_hash):
+    """
+    附件在磁盘上的路径
+    参数：blob_hash - SHA-256十六进制字符串
+    返回：文件路径
+    """
+    return os.path.join(ATTACHMENT_DIR, blob_hash[:2], blob_hash)
+
+def store_attachment(stream):
+    """
+    保存上传的附件：边读边计算哈希写入临时文件，内容已存在时直接复用
+    参数：stream - 可读的二进制流
+    返回：(附件信息{hash, size, mime}, 错误信息)
+    """
+    os.makedirs(ATTACHMENT_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    head = b''
+    fd, tmp_path = tempfile.mkstemp(dir=ATTACHMENT_DIR, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_ATTACHMENT_BYTES:
+                    return None, f"附件不能超过{MAX_ATTACHMENT_BYTES // (1024 * 1024)}MB"
+                if len(head) < 16:
+                    head += chunk[:16 - len(head)]
+                digest.update(chunk)
+                tmp.write(chunk)
+        mime = _sniff_mime(head)
+        if not mime:
+            return None, "只支持PNG、JPEG、GIF、WebP、BMP图片"
+        blob_hash = digest.hexdigest()
+        path = blob_path(blob_hash)
+        conn = get_conn()
+        c = conn.cursor()
+        try:
+            # 在写锁内放置文件并登记，与collect_garbage互斥：已被清理的附件会重新写入文件
+            c.execute('BEGIN IMMEDIATE')
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            # 重复上传已有内容时刷新上传时间，重新开始无引用保留期
+            c.execute('''
+                INSERT INTO attachments (hash, size, mime, refcount, created_at) VALUES (?, ?, ?, 0, ?)
+                ON CONFLICT (hash) DO UPDATE SET created_at = excluded.created_at
+            ''', (blob_hash, size, mime, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return {"hash": blob_hash, "size": size, "mime": mime}, None
+
+def get_attachment(blob_hash):
+    """
+    获取附件信息
+    参数：blob_hash - SHA-256十六进制字符串
+    返回：{hash, size, mime, path（绝对路径）}，不存在时返回None
+    """
+    if not HASH_RE.match(blob_hash):
+        return None
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute('SELECT size, mime FROM attachments WHERE hash = ?', (blob_hash,))
+    row = c.fetchone()
+    conn.close()
+    if not row or not os.path.exists(blob_path(blob_hash)):
+        return None
+    return {"hash": blob_hash, "size": row[0], "mime": row[1], "path": os.path.abspath(blob_path(blob_hash))}
+
+def sync_attachment_refs(c, file_id, content):
+    """
+    按笔记内容同步该笔记引用的附件（调用方负责提交事务）
+    参数：c - 游标, file_id - 文件ID, content - 笔记内容
+    """
+    hashes = set(ATTACHMENT_REF_RE.findall(content or ''))
+    c.execute('SELECT hash FROM file_attachments WHERE file_id = ?', (file_id,))
+    current = {row[0] for row in c.fetchall()}
+    removed = current - hashes
+    added = hashes - current
+    if removed:
+        c.executemany('DELETE FROM file_attachments WHERE file_id = ? AND hash = ?',
+                      [(file_id, blob_hash) for blob_hash in removed])
+    if added:
+        # 只记录已上传的附件
+        c.executemany('INSERT INTO file_attachments (file_id, hash) SELECT ?, hash FROM attachments WHERE hash = ?',
+                      [(file_id, blob_hash) for blob_hash in added])
+
+def copy_attachment_refs(c, src_file_id, dst_file_id):
+    """
+    复制笔记时复制其附件引用（调用方负责提交事务）
+    参数：c - 游标, src_file_id - 原文件ID, dst_file_id - 新文件ID
+    """
+    c.execute('INSERT INTO file_attachments (file_id, hash) SELECT ?, hash FROM file_attachments WHERE file_id = ?',
+              (dst_file_id, src_file_id))
+
+def collect_garbage(grace_hours=ORPHAN_GRACE_HOURS):
+    """
+    删除无笔记引用且上传超过保留期的附件
+    删除记录与把文件改名为墓碑在同一写事务内完成（与store_attachment互斥），提交后才真正删除墓碑文件；
+    提交后重新上传的相同内容会写入新文件，不会复用即将删除的文件
+    参数：grace_hours - 保留期（小时）
+    返回：{deleted, freed_bytes}
+    """
+    cutoff = (datetime.now() - timedelta(hours=grace_hours)).strftime('%Y-%m-%d %H:%M:%S')
+    conn = get_conn()
+    c = conn.cursor()
+    deleted = []
+    tombstones = []
+    try:
+        c.execute('BEGIN IMMEDIATE')
+        c.execute('SELECT hash, size FROM attachments WHERE refcount <= 0 AND created_at < ?', (cutoff,))
+        for blob_hash, size in c.fetchall():
+            c.execute('DELETE FROM attachments WHERE hash = ?', (blob_hash,))
+            path = blob_path(blob_hash)
+            if os.path.exists(path):
+                os.replace(path, path + '.deleted')
+                tombstones.append(path)
+            deleted.append(size)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        # 事务未提交，附件仍有效，恢复文件
+        for path in tombstones:
+            os.replace(path + '.deleted', path)
+        raise
+    finally:
+        conn.close()
+    for path in tombstones:
+        os.remove(path + '.deleted')
+    return {"deleted": len(deleted), "freed_bytes": sum(deleted)}
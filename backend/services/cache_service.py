@@ -0,0 +1,131 @@
+"""
+文件名：cache_service.py
+功能：service读函数的进程内读穿透缓存
+主要内容：
+    - 有容量上限的LRU缓存，按函数和参数区分，带过期时间
+    - 缓存项记录写入时的数据版本号（entity_versions），读取时版本号不一致即失效，
+      其他worker进程的写入同样能被感知
+    - 写函数显式失效本进程内的缓存项
+    - 命中率统计
+"""
+import copy
+import functools
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+import os
+from backend.services.version_service import get_versions
+
+load_dotenv()
+# 缓存项数上限，为0时关闭缓存
+CACHE_SIZE = int(os.getenv("SERVICE_CACHE_SIZE", "512"))
+CACHE_TTL = float(os.getenv("SERVICE_CACHE_TTL", "300"))
+
+class ServiceCache:
+    """
+    LRU缓存：键为(函数名, 参数)，值为(结果, 版本号, 过期时间, 用户ID, 依赖实体)
+    """
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0}
+
+    def get(self, key, versions):
+        """
+        读取缓存项：过期或版本号不一致时删除并返回None
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.stats['misses'] += 1
+                return None
+            value, item_versions, expires_at = item[:3]
+            if expires_at < time.monotonic():
+                del self._items[key]
+                self.stats['expired'] += 1
+                return None
+            if item_versions != versions:
+                del self._items[key]
+                self.stats['stale'] += 1
+                return None
+            self._items.move_to_end(key)
+            self.stats['hits'] += 1
+            return value
+
+    def put(self, key, value, versions, ttl, user_id, entities):
+        with self._lock:
+            self._items[key] = (value, versions, time.monotonic() + ttl, user_id, entities)
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def invalidate(self, user_id=None, entities=None):
+        """
+        删除依赖指定实体的缓存项
+        参数：user_id - 用户ID（None表示所有用户）, entities - 实体名列表（None表示全部）
+        """
+        with self._lock:
+            keys = [
+                key for key, item in self._items.items()
+                if (user_id is None or item[3] == user_id)
+                and (entities is None or set(item[4]) & set(entities))
+            ]
+            for key in keys:
+                del self._items[key]
+            self.stats['invalidations'] += len(keys)
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.stats)
+            data['size'] = self.size
+            data['entries'] = len(self._items)
+        return data
+
+_cache = ServiceCache()
+
+def cached(*entities, ttl=CACHE_TTL):
+    """
+    读穿透缓存装饰器，被装饰函数的第一个参数必须是用户ID（users.id）
+    参数：entities - 函数结果依赖的实体名（targets/roadmap/files/todos）, ttl - 过期秒数
+    用法：
+        @cached('targets')
+        def get_targets(user_id): ...
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(user_id, *args, **kwargs):
+            if _cache.size <= 0 or user_id is None:
+                return func(user_id, *args, **kwargs)
+            key = (name, user_id, args, tuple(sorted(kwargs.items())))
+            # 先取版本号再查询：查询期间的写入会使该缓存项在下次读取时失效
+            versions = tuple(get_versions(user_id, entities).values())
+            value = _cache.get(key, versions)
+            if value is None:
+                value = func(user_id, *args, **kwargs)
+                _cache.put(key, value, versions, ttl, user_id, entities)
+            # 返回副本，调用方修改结果不会影响缓存
+            return copy.deepcopy(value)
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+def invalidate(user_id=None, *entities):
+    """
+    写函数调用：失效本进程内依赖指定实体的缓存项（其他进程通过版本号失效）
+    参数：user_id - 用户ID（None表示所有用户）, entities - 实体名（为空表示全部）
+    """
+    _cache.invalidate(user_id, entities or None)
+
+def cache_stats():
+    """
+    获取缓存统计信息
+    返回：统计字典
+    """
+    return _cache.snapshot()
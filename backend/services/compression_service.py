@@ -0,0 +1,83 @@
+"""
+文件名：compression_service.py
+功能：大篇幅笔记内容的压缩存储
+主要内容：
+    - 超过阈值的笔记以zlib压缩后存入files.content_z，files.content置空，
+      files.content_size记录原文UTF-8字节数
+    - 读写时透明地压缩/解压
+    - 压缩存储的笔记由写入方补写全文索引正文（见search_service.index_note_body）
+    - 压缩节省空间的统计（计入全文索引中的原文）
+"""
+import zlib
+from dotenv import load_dotenv
+import os
+from backend.services.db_service import get_conn
+
+load_dotenv()
+# 原文达到该字节数才压缩，小笔记压缩收益低且增加读写开销
+COMPRESS_THRESHOLD = int(os.getenv("NOTE_COMPRESS_THRESHOLD", "4096"))
+COMPRESS_LEVEL = int(os.getenv("NOTE_COMPRESS_LEVEL", "6"))
+
+def pack(content):
+    """
+    按阈值决定内容的存储形式
+    参数：content - 笔记原文
+    返回：(content, content_z, content_size)，压缩时content为None；不压缩时后两项为None
+    """
+    if content is None:
+        return None, None, None
+    raw = content.encode('utf-8')
+    if len(raw) < COMPRESS_THRESHOLD:
+        return content, None, None
+    blob = zlib.compress(raw, COMPRESS_LEVEL)
+    if len(blob) >= len(raw):
+        return content, None, None
+    return None, blob, len(raw)
+
+def unpack(content, content_z):
+    """
+    还原笔记原文
+    参数：content - files.content, content_z - files.content_z
+    返回：原文（两者都为空时返回content本身）
+    """
+    if content_z is None:
+        return content
+    return zlib.decompress(content_z).decode('utf-8')
+
+def get_compression_stats(user_id=None):
+    """
+    统计笔记压缩存储节省的空间
+    全文索引（search_index.body）为每篇笔记保存一份未压缩的原文，压缩只减少files表中的那一份，
+    ratio按两处合计计算：(stored_bytes + index_bytes) / (raw_bytes + index_bytes)
+    参数：user_id - 用户ID（users.id），None表示全部用户
+    返回：{notes, compressed, raw_bytes, stored_bytes, index_bytes, saved_bytes, ratio, threshold}
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    sql = '''
+        SELECT COUNT(*),
+               COUNT(content_z),
+               COALESCE(SUM(COALESCE(content_size, LENGTH(CAST(content AS BLOB)))), 0),
+               COALESCE(SUM(COALESCE(LENGTH(content_z), LENGTH(CAST(content AS BLOB)))), 0)
+        FROM files WHERE is_dir = 0
+    '''
+    params = []
+    if user_id is not None:
+        sql += ' AND uid = ?'
+        params.append(user_id)
+    c.execute(sql, params)
+    notes, compressed, raw_bytes, stored_bytes = c.fetchone()
+    conn.close()
+    # 索引正文与原文相同
+    index_bytes = raw_bytes
+    total_raw = raw_bytes + index_bytes
+    return {
+        "notes": notes,
+        "compressed": compressed,
+        "raw_bytes": raw_bytes,
+        "stored_bytes": stored_bytes,
+        "index_bytes": index_bytes,
+        "saved_bytes": raw_bytes - stored_bytes,
+        "ratio": round((stored_bytes + index_bytes) / total_raw, 4) if total_raw else 1.0,
+        "threshold": COMPRESS_THRESHOLD,
+    }
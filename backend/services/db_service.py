@@ -0,0 +1,394 @@
+"""
+文件名：db_service.py
+功能：统一的数据访问层，为所有service和蓝图提供带连接池的SQLite连接
+主要内容：
+    - WAL模式 + busy_timeout 的连接初始化
+    - 按数据库路径区分的连接池，同一线程（请求）内复用同一连接，嵌套使用时以保存点隔离各层的提交与回滚
+    - "database is locked" 自动重试
+    - 连接池统计（命中、等待、锁重试）
+    - 按线程（请求）统计SQL语句数与耗时
+    - SQL性能分析开启时使用ProfilingCursor（见profiler_service）
+    - 多进程部署时fork后重建连接池
+"""
+import sqlite3
+import threading
+import queue
+import time
+from dotenv import load_dotenv
+import os
+from backend.services.profiler_service import profiler
+
+load_dotenv()
+db_path = os.getenv("DATABASE_URL", "levelup.db")
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+POOL_WAIT_TIMEOUT = float(os.getenv("DB_POOL_WAIT_TIMEOUT", "30"))
+LOCK_RETRIES = int(os.getenv("DB_LOCK_RETRIES", "3"))
+# 当前线程的SQL统计，begin_query_stats()之后才开始累计
+_query_stats = threading.local()
+
+def _is_locked_error(e):
+    """
+    判断异常是否为数据库锁冲突
+    """
+    return isinstance(e, sqlite3.OperationalError) and 'locked' in str(e)
+
+def begin_query_stats():
+    """
+    开始统计当前线程执行的SQL（每个请求开始时调用）
+    """
+    _query_stats.count = 0
+    _query_stats.seconds = 0.0
+
+def end_query_stats():
+    """
+    结束统计并返回结果
+    返回：(语句数, 总耗时秒数)，耗时为执行语句的时间，不含逐行读取结果；未开始统计时返回(0, 0.0)
+    """
+    stats = (getattr(_query_stats, 'count', 0), getattr(_query_stats, 'seconds', 0.0))
+    _query_stats.__dict__.clear()
+    return stats
+
+def _record_query(start):
+    """
+    累计一条语句的耗时（含锁重试的等待）
+    """
+    if hasattr(_query_stats, 'count'):
+        _query_stats.count += 1
+        _query_stats.seconds += time.perf_counter() - start
+
+class RetryCursor(sqlite3.Cursor):
+    """
+    遇到"database is locked"时自动退避重试的游标
+    仅在语句执行前连接不处于事务中时重试，保证重试不会丢失已写入的数据
+    """
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return self._execute_with_retry(sql, parameters)
+        finally:
+            _record_query(start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_query(start)
+
+    def _execute_with_retry(self, sql, parameters):
+        conn = self.connection
+        attempt = 0
+        while True:
+            in_transaction = conn.in_transaction
+            try:
+                return super().execute(sql, parameters)
+            except sqlite3.OperationalError as e:
+                if not _is_locked_error(e) or in_transaction or attempt >= LOCK_RETRIES:
+                    raise
+                if conn.in_transaction:
+                    conn.rollback()
+                attempt += 1
+                if conn.pool is not None:
+                    conn.pool.count('lock_retries')
+                time.sleep(0.05 * (2 ** attempt))
+
+class ProfilingCursor(RetryCursor):
+    """
+    SQL性能分析用的游标：记录每条语句的耗时、执行计划，以及读取/影响的行数
+    """
+    _profile = None
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        self._profile = profiler.record(self.connection, sql, parameters, time.perf_counter() - start)
+        if self.rowcount > 0:
+            profiler.add_rows(self._profile, self.rowcount)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self._profile = profiler.record(self.connection, sql, (), time.perf_counter() - start, many=True)
+        if self.rowcount > 0:
+            profiler.add_rows(self._profile, self.rowcount)
+        return self
+
+    def _count_rows(self, n):
+        if self._profile is not None and n:
+            profiler.add_rows(self._profile, n)
+
+    def fetchone(self):
+        row = super().fetchone()
+        self._count_rows(row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._count_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._count_rows(len(rows))
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        self._count_rows(1)
+        return row
+
+class PooledConnection(sqlite3.Connection):
+    """
+    连接池中的连接：close() 归还连接池而不是真正关闭
+    同一线程嵌套获取时，若外层已开启事务，本层在保存点上工作：commit()/rollback()只作用于本层，
+    不会提交或回滚外层未完成的事务
+    """
+    pool = None
+    depth = 0
+    # 嵌套层级 -> 保存点名（获取时外层没有进行中的事务的层级不建保存点，按普通事务提交）
+    savepoints = None
+
+    def cursor(self, factory=None):
+        if factory is None:
+            factory = ProfilingCursor if profiler.enabled else RetryCursor
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def commit(self):
+        """
+        提交事务；嵌套获取时若外层已有未提交的事务，只确认本层的修改（释放并重建本层保存点），由外层决定提交或回滚
+        """
+        savepoint = self.savepoints.get(self.depth) if self.savepoints else None
+        if savepoint is None:
+            super().commit()
+            return
+        sqlite3.Connection.execute(self, f'RELEASE {savepoint}')
+        sqlite3.Connection.execute(self, f'SAVEPOINT {savepoint}')
+
+    def rollback(self):
+        """
+        回滚事务；嵌套获取时若外层已有未提交的事务，只回滚到本层的保存点，不影响外层已做的修改
+        """
+        savepoint = self.savepoints.get(self.depth) if self.savepoints else None
+        if savepoint is None:
+            super().rollback()
+            return
+        sqlite3.Connection.execute(self, f'ROLLBACK TO {savepoint}')
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+    def really_close(self):
+        """
+        真正关闭底层连接
+        """
+        sqlite3.Connection.close(self)
+
+class ConnectionPool:
+    """
+    SQLite连接池
+    - 空闲连接放在LIFO队列中，优先复用最近使用过的连接
+    - 同一线程重复获取时返回同一连接（引用计数），一个请求只占用一个连接
+    - 连接数达到上限时阻塞等待其他线程归还
+    """
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'waits': 0,
+            'lock_retries': 0,
+            'created': 0,
+            'in_use': 0,
+        }
+
+    def count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            factory=PooledConnection,
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.savepoints = {}
+        conn.pool = self
+        return conn
+
+    def acquire(self):
+        """
+        获取连接：当前线程已持有连接时直接复用
+        返回：PooledConnection 对象
+        """
+        local = self._local
+        conn = getattr(local, 'conn', None)
+        if conn is not None:
+            conn.depth += 1
+            if conn.in_transaction:
+                savepoint = f'nested_{conn.depth}'
+                sqlite3.Connection.execute(conn, f'SAVEPOINT {savepoint}')
+                conn.savepoints[conn.depth] = savepoint
+            self.count('hits')
+            return conn
+        try:
+            conn = self._idle.get_nowait()
+            self.count('hits')
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+                self.count('misses')
+                self.count('created')
+            else:
+                self.count('waits')
+                try:
+                    conn = self._idle.get(timeout=POOL_WAIT_TIMEOUT)
+                except queue.Empty:
+                    raise sqlite3.OperationalError('连接池已耗尽，等待连接超时')
+        conn.depth = 1
+        local.conn = conn
+        self.count('in_use')
+        return conn
+
+    def release(self, conn, force=False):
+        """
+        归还连接：引用计数归零时回滚未提交的事务并放回空闲队列
+        参数：conn - 连接, force - 是否忽略引用计数直接归还
+        """
+        if conn.depth <= 0:
+            # 重复close，忽略
+            return
+        if not force and conn.depth > 1:
+            savepoint = conn.savepoints.pop(conn.depth, None)
+            if savepoint is not None:
+                # 与顶层归还时回滚未提交的事务一致：丢弃本层未commit()的修改
+                sqlite3.Connection.execute(conn, f'ROLLBACK TO {savepoint}')
+                sqlite3.Connection.execute(conn, f'RELEASE {savepoint}')
+            conn.depth -= 1
+            return
+        conn.depth = 0
+        conn.savepoints.clear()
+        if getattr(self._local, 'conn', None) is conn:
+            self._local.conn = None
+        self.count('in_use', -1)
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.really_close()
+            with self._lock:
+                self._created -= 1
+            return
+        self._idle.put(conn)
+
+    def release_thread_conn(self):
+        """
+        强制归还当前线程持有的连接（请求结束时调用，防止异常路径泄漏连接）
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self.release(conn, force=True)
+
+    def close_all(self):
+        """
+        关闭所有空闲连接
+        """
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.really_close()
+            with self._lock:
+                self._created -= 1
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self.stats)
+            data['size'] = self.size
+            data['open'] = self._created
+            data['idle'] = self._idle.qsize()
+        return data
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _reset_pools_after_fork():
+    """
+    fork后的子进程（如gunicorn预加载后派生的worker）不能继续使用父进程打开的SQLite连接：
+    丢弃继承来的连接池，子进程按需重新建立连接
+    """
+    global _pools_lock
+    # 保留引用，避免被回收时关闭父进程仍在使用的底层连接
+    _inherited_pools.extend(_pools.values())
+    _pools.clear()
+    _pools_lock = threading.Lock()
+
+_inherited_pools = []
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
+def get_pool(path=None):
+    """
+    获取指定数据库路径对应的连接池（不存在则创建）
+    参数：path - 数据库路径，默认使用 DATABASE_URL
+    返回：ConnectionPool 对象
+    """
+    path = path or db_path
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                pool = ConnectionPool(path)
+                _pools[path] = pool
+    return pool
+
+def get_conn(path=None):
+    """
+    获取数据库连接（来自连接池，用完调用close()归还）
+    参数：path - 数据库路径，默认使用 DATABASE_URL
+    返回：PooledConnection 对象
+    """
+    return get_pool(path).acquire()
+
+def release_thread_conns():
+    """
+    归还当前线程在所有连接池中持有的连接，供Flask teardown_request使用
+    """
+    for pool in list(_pools.values()):
+        pool.release_thread_conn()
+
+def pool_stats():
+    """
+    获取所有连接池的统计信息
+    返回：{数据库路径: 统计字典}
+    """
+    return {path: pool.snapshot() for path, pool in list(_pools.items())}
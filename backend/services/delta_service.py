@@ -0,0 +1,66 @@
+"""
+文件名：delta_service.py
+功能：笔记内容的增量（补丁）工具
+主要内容：
+    - 内容哈希，作为增量保存时的基准版本标识
+    - 补丁的生成（按行比较）、校验与应用
+补丁格式：
+    [[start, end, text], ...]，表示把基准内容中 [start, end) 区间替换为 text，
+    偏移量按Unicode字符（码点）计算，各操作按start升序且互不重叠
+"""
+import difflib
+import hashlib
+
+# 单次补丁的最大操作数，超过时客户端应改用整篇保存
+MAX_PATCH_OPS = 1000
+
+def content_hash(content):
+    """
+    计算笔记内容的哈希
+    参数：content - 内容（None视为空字符串）
+    返回：SHA-256十六进制字符串
+    """
+    return hashlib.sha256((content or '').encode('utf-8')).hexdigest()
+
+def make_patch(src, dst):
+    """
+    生成把src变为dst的补丁（按行比较，只记录变化的行）
+    参数：src - 原内容, dst - 目标内容
+    返回：补丁操作列表，apply_patch(src, 补丁) == dst
+    """
+    a = (src or '').splitlines(keepends=True)
+    b = (dst or '').splitlines(keepends=True)
+    offsets = [0]
+    for line in a:
+        offsets.append(offsets[-1] + len(line))
+    return [
+        [offsets[i1], offsets[i2], ''.join(b[j1:j2])]
+        for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes()
+        if tag != 'equal'
+    ]
+
+def apply_patch(content, patch):
+    """
+    将补丁应用到基准内容
+    参数：content - 基准内容, patch - 补丁操作列表
+    返回：应用后的内容
+    异常：ValueError - 补丁格式错误或偏移越界
+    """
+    if not isinstance(patch, list) or len(patch) > MAX_PATCH_OPS:
+        raise ValueError('无效的patch')
+    content = content or ''
+    parts = []
+    pos = 0
+    for op in patch:
+        if not isinstance(op, list) or len(op) != 3:
+            raise ValueError('无效的patch操作')
+        start, end, text = op
+        if not (isinstance(start, int) and isinstance(end, int) and isinstance(text, str)):
+            raise ValueError('无效的patch操作')
+        if not pos <= start <= end <= len(content):
+            raise ValueError('patch偏移越界或操作重叠')
+        parts.append(content[pos:start])
+        parts.append(text)
+        pos = end
+    parts.append(content[pos:])
+    return ''.join(parts)
@@ -0,0 +1,57 @@
+"""
+文件名：diagnostics_service.py
+功能：管理员诊断用的数据查看（替代原先删除roadmap节点后打印整表的调试输出）
+主要内容：
+    - 白名单内的表按id游标分页查看，可按用户过滤
+    - 各表行数
+"""
+from backend.services.db_service import get_conn
+from backend.services.pagination_service import decode_cursor, fetch_page
+
+# 可查看的表 -> 返回的列（笔记内容可能很大，不返回）
+DIAGNOSTIC_TABLES = {
+    'roadmap_main_nodes': ('id', 'uid', 'target_id', 'title', 'status', 'remark', 'node_order', 'created_at', 'updated_at'),
+    'roadmap_branch_nodes': ('id', 'uid', 'main_id', 'target_id', 'title', 'status', 'remark', 'created_at', 'updated_at'),
+    'files': ('id', 'uid', 'name', 'parent_id', 'is_dir', 'tags', 'main_id', 'branch_id', 'content_size', 'updated_at'),
+}
+
+def dump_table(table, user_id=None, limit=None, cursor=None):
+    """
+    分页查看表数据（按id排序）
+    参数：table - 表名（须在DIAGNOSTIC_TABLES中）, user_id - 只看该用户（users.id），None表示全部,
+          limit - 每页条数, cursor - 上一页返回的next_cursor
+    返回：(行字典列表, next_cursor)，表名不在白名单中时返回None
+    异常：ValueError - 游标格式错误
+    """
+    columns = DIAGNOSTIC_TABLES.get(table)
+    if columns is None:
+        return None
+    after = decode_cursor(cursor, 1)
+    sql = f"SELECT {', '.join(columns)} FROM {table} WHERE 1 = 1"
+    params = []
+    if user_id is not None:
+        sql += " AND uid = ?"
+        params.append(user_id)
+    if after:
+        sql += " AND id > ?"
+        params += after
+    sql += " ORDER BY id"
+    conn = get_conn()
+    c = conn.cursor()
+    rows, next_cursor = fetch_page(c, sql, params, limit, lambda row: (row[0],))
+    conn.close()
+    return [dict(zip(columns, row)) for row in rows], next_cursor
+
+def table_counts():
+    """
+    诊断表的行数
+    返回：{表名: 行数}
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    counts = {}
+    for table in DIAGNOSTIC_TABLES:
+        c.execute(f"SELECT COUNT(*) FROM {table}")
+        counts[table] = c.fetchone()[0]
+    conn.close()
+    return counts
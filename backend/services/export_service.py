@@ -0,0 +1,225 @@
+"""
+文件名：export_service.py
+功能：按用户流式导出全部数据
+主要内容：
+    - 在同一个读事务（WAL快照）中逐行遍历学习目标、roadmap节点、笔记、待办，
+      游标边读边输出，不把整表读入内存
+    - NDJSON格式：每行一个JSON对象，type字段区分实体类型
+    - zip格式：笔记按目录结构存为md文件，roadmap与待办渲染为md，另附完整的data.ndjson
+    - 以生成器形式返回数据块，供Flask流式响应使用
+"""
+import json
+import re
+import zipfile
+from datetime import datetime
+from backend.services.db_service import get_conn
+from backend.services.compression_service import unpack
+
+EXPORT_FORMAT_VERSION = 1
+# 输出数据攒到该字节数再交给响应，减少小块写出的开销
+EXPORT_CHUNK_BYTES = 64 * 1024
+# 文件名中不允许出现的字符
+UNSAFE_NAME_RE = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+def _iter_records(c, user_id):
+    """
+    逐行产出用户的所有数据（调用方需已开启读事务）
+    参数：c - 游标, user_id - 用户ID（users.id）
+    返回：生成器，每项为记录字典（含type字段）
+    """
+    c.execute('SELECT id, title, progress, tags, update_time FROM targets WHERE uid = ? ORDER BY id', (user_id,))
+    for row in c:
+        yield {"type": "target", "id": row[0], "title": row[1], "progress": row[2], "tags": row[3],
+               "update_time": row[4]}
+    c.execute('''
+        SELECT id, target_id, title, status, remark, node_order, created_at, updated_at
+        FROM roadmap_main_nodes WHERE uid = ? ORDER BY target_id, node_order, id
+    ''', (user_id,))
+    for row in c:
+        yield {"type": "main_node", "id": row[0], "target_id": row[1], "title": row[2], "status": row[3],
+               "remark": row[4], "node_order": row[5], "created_at": row[6], "updated_at": row[7]}
+    c.execute('''
+        SELECT id, main_id, target_id, title, status, remark, created_at, updated_at
+        FROM roadmap_branch_nodes WHERE uid = ? ORDER BY main_id, id
+    ''', (user_id,))
+    for row in c:
+        yield {"type": "branch_node", "id": row[0], "main_id": row[1], "target_id": row[2], "title": row[3],
+               "status": row[4], "remark": row[5], "created_at": row[6], "updated_at": row[7]}
+    c.execute('''
+        SELECT id, name, parent_id, is_dir, tags, created_at, updated_at, content, content_z
+        FROM files WHERE uid = ? ORDER BY id
+    ''', (user_id,))
+    for row in c:
+        record = {"type": "folder" if row[3] else "note", "id": row[0], "name": row[1], "parent_id": row[2],
+                  "tags": row[4], "created_at": row[5], "updated_at": row[6]}
+        if not row[3]:
+            record["content"] = unpack(row[7], row[8]) or ''
+        yield record
+    c.execute('SELECT id, text, completed, created_at FROM todos WHERE uid = ? ORDER BY id', (user_id,))
+    for row in c:
+        yield {"type": "todo", "id": row[0], "text": row[1], "completed": bool(row[2]), "created_at": row[3]}
+
+def _header(username):
+    return {"type": "meta", "format": "levelup-export", "version": EXPORT_FORMAT_VERSION, "user": username,
+            "exported_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+
+def _snapshot():
+    """
+    打开一个读事务，之后的所有查询看到同一时刻的数据，期间其他请求的写入不受影响（WAL）
+    返回：(连接, 游标)
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute('BEGIN')
+    return conn, c
+
+def stream_ndjson(user_id, username):
+    """
+    以NDJSON格式流式导出用户数据
+    参数：user_id - 用户ID（users.id）, username - 用户名（写入头部记录）
+    返回：生成器，每项为bytes
+    """
+    conn, c = _snapshot()
+    try:
+        buffer = [json.dumps(_header(username), ensure_ascii=False) + '\n']
+        size = 0
+        for record in _iter_records(c, user_id):
+            line = json.dumps(record, ensure_ascii=False) + '\n'
+            buffer.append(line)
+            size += len(line)
+            if size >= EXPORT_CHUNK_BYTES:
+                yield ''.join(buffer).encode('utf-8')
+                buffer = []
+                size = 0
+        yield ''.join(buffer).encode('utf-8')
+    finally:
+        conn.rollback()
+        conn.close()
+
+class _ChunkWriter:
+    """
+    供zipfile写入的不可seek输出流，写入的数据暂存后由生成器取走
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+def _safe_name(name):
+    """
+    把文件/文件夹名转换为可用作zip路径的名称
+    """
+    name = UNSAFE_NAME_RE.sub('_', name or '').strip(' .')
+    return name or '未命名'
+
+def _folder_paths(c, user_id):
+    """
+    获取用户所有文件夹的路径（只读取文件夹行，数量远少于笔记）
+    返回：{文件夹ID: 路径}
+    """
+    c.execute('SELECT id, name, parent_id FROM files WHERE uid = ? AND is_dir = 1', (user_id,))
+    folders = {row[0]: (row[1], row[2]) for row in c.fetchall()}
+    paths = {}
+
+    def resolve(folder_id, depth=0):
+        if folder_id in paths:
+            return paths[folder_id]
+        name, parent_id = folders[folder_id]
+        # 数据异常出现循环引用时按根目录处理
+        parent = resolve(parent_id, depth + 1) if parent_id in folders and depth < 64 else ''
+        paths[folder_id] = f"{parent}{_safe_name(name)}/"
+        return paths[folder_id]
+
+    for folder_id in folders:
+        resolve(folder_id)
+    return paths
+
+def _roadmap_markdown(target, mains, branches):
+    """
+    把一个学习目标的roadmap渲染为markdown
+    """
+    lines = [f"# {target['title']}", '']
+    for main in mains:
+        lines.append(f"## {main['title']}")
+        if main['remark']:
+            lines.append(main['remark'])
+        for branch in branches.get(str(main['id']), []):
+            mark = 'x' if branch['status'] == 'done' else ' '
+            remark = f" —— {branch['remark']}" if branch['remark'] else ''
+            lines.append(f"- [{mark}] {branch['title']}{remark}")
+        lines.append('')
+    return '\n'.join(lines)
+
+def stream_zip(user_id, username):
+    """
+    以zip格式流式导出用户数据：notes/下为按目录结构存放的笔记，roadmap/下为各学习目标的路线图，
+    todos.md为待办清单，data.ndjson为完整数据
+    参数：user_id - 用户ID（users.id）, username - 用户名
+    返回：生成器，每项为bytes
+    """
+    conn, c = _snapshot()
+    out = _ChunkWriter()
+    try:
+        with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            folders = _folder_paths(c, user_id)
+            used = set()
+            with zf.open('data.ndjson', 'w', force_zip64=True) as data:
+                data.write((json.dumps(_header(username), ensure_ascii=False) + '\n').encode('utf-8'))
+                for record in _iter_records(c, user_id):
+                    data.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+                    if out.size >= EXPORT_CHUNK_BYTES:
+                        yield out.take()
+            # data.ndjson写完后再逐类读取，生成md文件
+            c.execute('''
+                SELECT id, name, parent_id, content, content_z FROM files
+                WHERE uid = ? AND is_dir = 0 ORDER BY id
+            ''', (user_id,))
+            for file_id, name, parent_id, content, content_z in c:
+                path = f"notes/{folders.get(parent_id, '')}{_safe_name(name)}"
+                if not path.endswith('.md'):
+                    path += '.md'
+                if path in used:
+                    path = f"{path[:-3]} ({file_id}).md"
+                used.add(path)
+                zf.writestr(path, unpack(content, content_z) or '')
+                if out.size >= EXPORT_CHUNK_BYTES:
+                    yield out.take()
+            c.execute('SELECT id, title FROM targets WHERE uid = ? ORDER BY id', (user_id,))
+            for target in [{"id": row[0], "title": row[1]} for row in c.fetchall()]:
+                c.execute('''
+                    SELECT id, title, remark FROM roadmap_main_nodes
+                    WHERE uid = ? AND target_id = ? ORDER BY node_order, id
+                ''', (user_id, str(target['id'])))
+                mains = [{"id": row[0], "title": row[1], "remark": row[2]} for row in c.fetchall()]
+                c.execute('''
+                    SELECT main_id, title, status, remark FROM roadmap_branch_nodes
+                    WHERE uid = ? AND target_id = ? ORDER BY id
+                ''', (user_id, str(target['id'])))
+                branches = {}
+                for main_id, title, status, remark in c.fetchall():
+                    branches.setdefault(str(main_id), []).append({"title": title, "status": status, "remark": remark})
+                zf.writestr(f"roadmap/{_safe_name(target['title'])} ({target['id']}).md",
+                            _roadmap_markdown(target, mains, branches))
+                if out.size >= EXPORT_CHUNK_BYTES:
+                    yield out.take()
+            c.execute('SELECT text, completed FROM todos WHERE uid = ? ORDER BY id', (user_id,))
+            todos = [f"- [{'x' if completed else ' '}] {text}" for text, completed in c]
+            zf.writestr('todos.md', '# 待办事项\n\n' + '\n'.join(todos) + '\n')
+        yield out.take()
+    finally:
+        conn.rollback()
+        conn.close()
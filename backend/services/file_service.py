@@ -2,63 +2,132 @@
 文件名：file_service.py
 功能：提供文件（md笔记）相关的数据库操作，包括增删改查等
 主要内容：
-    - 文件表的初始化
     - 文件的增删改查
+    - 文件列表与文件名搜索的游标分页
+    - 按roadmap节点查询关联笔记
+    - 最近编辑的笔记
     - 文件内容的获取
+    - 基于内容哈希的增量保存（补丁）
+    - 内容被覆盖时记录修订历史
+    - 大篇幅笔记的透明压缩存储
+    - 保存时同步笔记引用的附件
 """
-import sqlite3
 from datetime import datetime
 from dotenv import load_dotenv
 import os
+from backend.services.db_service import get_conn
+from backend.services.cache_service import cached, invalidate
+from backend.services.pagination_service import decode_cursor, fetch_page
+from backend.services.file_tree_service import check_parent, delete_subtree
+from backend.services.delta_service import content_hash, apply_patch
+from backend.services.revision_service import record_revision
+from backend.services.compression_service import pack, unpack
+from backend.services.attachment_service import sync_attachment_refs
+from backend.services.search_service import index_note_body
 
 load_dotenv()
 db_path = os.getenv("DATABASE_URL", "levelup.db")
 
-def get_conn():
+def get_files(user_id):
     """
-    获取数据库连接
-    返回：sqlite3.Connection 对象
+    获取指定用户的所有文件列表（不分页，兼容旧接口）
+    参数：user_id - 用户ID（users.id）
+    返回：文件字典列表
     """
-    return sqlite3.connect(db_path, timeout=10)
+    return get_files_page(user_id)[0]
 
-def init_file_db(db_path=None):
-    if db_path is None:
-        from dotenv import load_dotenv
-        import os
-        load_dotenv()
-        db_path = os.getenv("DATABASE_URL", "levelup.db")
-    conn = sqlite3.connect(db_path, timeout=10)
+@cached('files')
+def get_files_page(user_id, limit=None, cursor=None):
+    """
+    分页获取指定用户的文件列表，按 目录优先、文件名、id 排序（keyset分页）
+    参数：user_id - 用户ID（users.id）, limit - 每页条数（None表示不分页）, cursor - 上一页返回的next_cursor
+    返回：(文件字典列表, next_cursor)
+    """
+    after = decode_cursor(cursor, 3)
+    sql = "SELECT id, name, parent_id, is_dir, tags FROM files WHERE uid=?"
+    params = [user_id]
+    if after:
+        sql += " AND (is_dir < ? OR (is_dir = ? AND (name, id) > (?, ?)))"
+        params += [after[0], after[0], after[1], after[2]]
+    sql += " ORDER BY is_dir DESC, name, id"
+    conn = get_conn()
     c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS files
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 name TEXT NOT NULL,
-                 content TEXT,
-                 parent_id INTEGER,
-                 is_dir INTEGER DEFAULT 0,
-                 tags TEXT DEFAULT '',
-                 user_id TEXT DEFAULT '',
-                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    conn.commit()
+    rows, next_cursor = fetch_page(c, sql, params, limit, lambda row: (row[3], row[1], row[0]))
+    files = [{"id": row[0], "name": row[1], "parent_id": row[2], "is_dir": bool(row[3]), "tags": row[4]} for row in rows]
     conn.close()
+    return files, next_cursor
 
-def get_files(user_id):
+@cached('files')
+def search_file_names(user_id, keyword, limit=None, cursor=None):
+    """
+    按文件名模糊搜索指定用户的文件，按id排序（keyset分页）
+    参数：user_id - 用户ID（users.id）, keyword - 关键词, limit - 每页条数（None表示不分页）, cursor - 上一页返回的next_cursor
+    返回：(文件字典列表, next_cursor)
+    """
+    after = decode_cursor(cursor, 1)
+    sql = "SELECT id, name, tags FROM files WHERE uid=? AND name LIKE ?"
+    params = [user_id, f'%{keyword}%']
+    if after:
+        sql += " AND id > ?"
+        params += after
+    sql += " ORDER BY id"
+    conn = get_conn()
+    c = conn.cursor()
+    rows, next_cursor = fetch_page(c, sql, params, limit, lambda row: (row[0],))
+    files = [{"id": row[0], "name": row[1], "tags": row[2]} for row in rows]
+    conn.close()
+    return files, next_cursor
+
+@cached('files')
+def get_recent_files(user_id, limit=10):
+    """
+    获取指定用户最近编辑的笔记
+    参数：user_id - 用户ID（users.id）, limit - 返回条数
+    返回：文件字典列表（按更新时间倒序）
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute("SELECT id, name, parent_id, tags, updated_at FROM files WHERE uid=? AND is_dir=0 ORDER BY updated_at DESC LIMIT ?", (user_id, limit))
+    files = [{"id": row[0], "name": row[1], "parent_id": row[2], "tags": row[3], "updated_at": row[4]} for row in c.fetchall()]
+    conn.close()
+    return files
+
+@cached('files')
+def get_files_by_node(user_id, main_id, branch_id=None):
     """
-    获取指定用户的所有文件列表
-    参数：user_id - 用户ID
+    获取关联到指定roadmap节点的笔记（走files.main_id/branch_id索引）
+    参数：user_id - 用户ID（users.id）, main_id - 主节点ID, branch_id - 分支节点ID（为空时返回主节点下所有笔记）
     返回：文件字典列表
     """
     conn = get_conn()
     c = conn.cursor()
-    c.execute("SELECT id, name, parent_id, is_dir, tags FROM files WHERE user_id=? ORDER BY is_dir DESC, name", (user_id,))
+    if branch_id:
+        c.execute("SELECT id, name, parent_id, is_dir, tags FROM files WHERE branch_id=? AND uid=? ORDER BY name", (str(branch_id), user_id))
+    else:
+        c.execute("SELECT id, name, parent_id, is_dir, tags FROM files WHERE main_id=? AND uid=? ORDER BY name", (str(main_id), user_id))
     files = [{"id": row[0], "name": row[1], "parent_id": row[2], "is_dir": bool(row[3]), "tags": row[4]} for row in c.fetchall()]
     conn.close()
     return files
 
-def add_file(name, content, tags, user_id):
+def _fetch_file(c, file_id):
+    """
+    读取文件行并还原压缩存储的内容
+    返回：(id, name, content, parent_id, is_dir, tags, 用户名, created_at, updated_at)，不存在时返回None
+    """
+    c.execute('''
+        SELECT id, name, content, parent_id, is_dir, tags, (SELECT username FROM users WHERE users.id = files.uid),
+               created_at, updated_at, content_z
+        FROM files WHERE id = ?
+    ''', (file_id,))
+    row = c.fetchone()
+    if not row:
+        return None
+    return row[:2] + (unpack(row[2], row[9]),) + row[3:9]
+
+def add_file(name, content, tags, user_id, parent_id=None):
     """
     新增文件
-    参数：name-文件名, content-内容, tags-标签, user_id-用户ID
+    参数：name-文件名, content-内容, tags-标签, user_id-用户ID（users.id）, parent_id-所在文件夹ID（None表示根目录）
     返回：(文件数据, 错误信息)
     """
     if not name.endswith('.md'):
@@ -66,20 +135,27 @@ def add_file(name, content, tags, user_id):
     conn = get_conn()
     c = conn.cursor()
     current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    # 检查重名
-    c.execute("SELECT id FROM files WHERE name = ? AND user_id = ?", (name, user_id))
+    err = check_parent(c, user_id, parent_id)
+    if err:
+        conn.close()
+        return None, err
+    # 检查同一文件夹下重名
+    c.execute("SELECT id FROM files WHERE name = ? AND uid = ? AND parent_id IS ?", (name, user_id, parent_id))
     existing_file = c.fetchone()
     if existing_file:
         conn.close()
         return None, "文件已存在"
+    stored, content_z, content_size = pack(content)
     c.execute("""
-        INSERT INTO files (name, content, tags, user_id, created_at, updated_at)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (name, content, tags, user_id, current_time, current_time))
+        INSERT INTO files (name, content, content_z, content_size, parent_id, tags, user_id, uid, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, '', ?, ?, ?)
+    """, (name, stored, content_z, content_size, parent_id, tags, user_id, current_time, current_time))
     file_id = c.lastrowid
+    index_note_body(c, file_id, content, content_z)
+    sync_attachment_refs(c, file_id, content)
     conn.commit()
-    c.execute("SELECT * FROM files WHERE id = ?", (file_id,))
-    file_data = c.fetchone()
+    invalidate(user_id, 'files')
+    file_data = _fetch_file(c, file_id)
     conn.close()
     return file_data, None
 
@@ -92,64 +168,126 @@ def get_file_content(file_id):
     conn = get_conn()
     c = conn.cursor()
     c.execute("""
-        SELECT id, name, content, is_dir, parent_id, tags 
+        SELECT id, name, content, is_dir, parent_id, tags, content_z
         FROM files 
         WHERE id = ?
     """, (file_id,))
     result = c.fetchone()
     conn.close()
-    return result
+    if not result:
+        return None
+    return result[:2] + (unpack(result[2], result[6]),) + result[3:6]
 
 def update_file(file_id, name, content, tags, user_id):
     """
     更新文件内容
-    参数：file_id-文件ID, name-文件名, content-内容, tags-标签, user_id-用户ID
+    参数：file_id-文件ID, name-文件名, content-内容, tags-标签, user_id-用户ID（users.id）
     返回：(文件数据, 错误信息)
     """
     conn = get_conn()
     c = conn.cursor()
-    c.execute("SELECT id FROM files WHERE id = ? AND user_id = ?", (file_id, user_id))
-    if not c.fetchone():
+    if content:
+        # 先取得写锁再读旧内容，保证记录的修订与被覆盖的内容一致
+        c.execute('BEGIN IMMEDIATE')
+    c.execute("SELECT content, updated_at, content_z FROM files WHERE id = ? AND uid = ?", (file_id, user_id))
+    old = c.fetchone()
+    if not old:
+        conn.rollback()
         conn.close()
         return None, "文件不存在或无权限"
     current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     updates = []
     params = []
+    stored = None
     if name:
         if not name.endswith('.md'):
             name += '.md'
         updates.append("name = ?")
         params.append(name)
     if content:
-        updates.append("content = ?")
-        params.append(content)
+        updates.append("content = ?, content_z = ?, content_size = ?")
+        stored = pack(content)
+        params.extend(stored)
+        record_revision(c, file_id, unpack(old[0], old[2]), old[1], content)
+        sync_attachment_refs(c, file_id, content)
     if tags is not None:
         updates.append("tags = ?")
         params.append(tags)
     updates.append("updated_at = ?")
     params.append(current_time)
-    sql = f"UPDATE files SET {', '.join(updates)} WHERE id = ? AND user_id = ?"
+    sql = f"UPDATE files SET {', '.join(updates)} WHERE id = ? AND uid = ?"
     params.append(file_id)
     params.append(user_id)
     c.execute(sql, params)
+    if stored:
+        index_note_body(c, file_id, content, stored[1])
     conn.commit()
-    c.execute("SELECT * FROM files WHERE id = ?", (file_id,))
-    file_data = c.fetchone()
+    invalidate(user_id, 'files')
+    file_data = _fetch_file(c, file_id)
     conn.close()
     return file_data, None
 
+# 增量保存时基准哈希与当前内容不一致
+PATCH_CONFLICT = "文件已被修改，请基于最新内容重新保存"
+
+def patch_file(file_id, base_hash, patch, user_id):
+    """
+    增量更新文件内容：基准哈希与当前内容一致时应用补丁
+    参数：file_id-文件ID, base_hash-客户端内容的哈希, patch-补丁操作列表, user_id-用户ID（users.id）
+    返回：(结果字典, 错误信息)，冲突时错误信息为PATCH_CONFLICT，结果字典为当前内容的哈希
+    异常：ValueError - 补丁格式错误
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute("SELECT content, updated_at, content_z FROM files WHERE id = ? AND uid = ? AND is_dir = 0", (file_id, user_id))
+    row = c.fetchone()
+    if not row:
+        conn.close()
+        return None, "文件不存在或无权限"
+    base = unpack(row[0], row[2]) or ''
+    current_hash = content_hash(base)
+    if current_hash != base_hash:
+        conn.close()
+        return {"hash": current_hash}, PATCH_CONFLICT
+    try:
+        content = apply_patch(base, patch)
+    except ValueError:
+        conn.close()
+        raise
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    stored = pack(content)
+    # 以读到的内容为条件更新，期间有其他写入时不覆盖
+    c.execute('''
+        UPDATE files SET content = ?, content_z = ?, content_size = ?, updated_at = ?
+        WHERE id = ? AND uid = ? AND content IS ? AND content_z IS ?
+    ''', (*stored, current_time, file_id, user_id, row[0], row[2]))
+    if c.rowcount == 0:
+        conn.rollback()
+        c.execute("SELECT content, content_z FROM files WHERE id = ?", (file_id,))
+        row = c.fetchone()
+        conn.close()
+        return {"hash": content_hash(unpack(*row) if row else '')}, PATCH_CONFLICT
+    index_note_body(c, file_id, content, stored[1])
+    record_revision(c, file_id, base, row[1], content)
+    sync_attachment_refs(c, file_id, content)
+    conn.commit()
+    invalidate(user_id, 'files')
+    conn.close()
+    return {"id": file_id, "hash": content_hash(content), "updated_at": current_time}, None
+
 def delete_file(file_id, user_id):
     """
-    删除文件
-    参数：file_id-文件ID, user_id-用户ID
+    删除文件（文件夹连同其所有子项一起删除）
+    参数：file_id-文件ID, user_id-用户ID（users.id）
     返回：(文件名, 错误信息)
     """
     conn = get_conn()
     c = conn.cursor()
-    c.execute("SELECT name FROM files WHERE id = ? AND user_id = ?", (file_id, user_id))
+    c.execute("SELECT name FROM files WHERE id = ? AND uid = ?", (file_id, user_id))
     file_name = c.fetchone()
     file_name = file_name[0] if file_name else "未知文件"
-    c.execute("DELETE FROM files WHERE id = ? AND user_id = ?", (file_id, user_id))
+    delete_subtree(c, user_id, file_id)
     conn.commit()
+    invalidate(user_id, 'files')
     conn.close()
     return file_name, None
@@ -0,0 +1,235 @@
+"""
+文件名：file_tree_service.py
+功能：基于 files.parent_id 的目录树操作
+主要内容：
+    - 按层懒加载目录内容（含子项数量，游标分页）
+    - 新建文件夹
+    - 递归移动、复制、删除与子树大小统计（SQLite递归CTE）
+"""
+from datetime import datetime
+from backend.services.db_service import get_conn
+from backend.services.cache_service import cached, invalidate
+from backend.services.pagination_service import decode_cursor, fetch_page
+from backend.services.attachment_service import copy_attachment_refs
+from backend.services.search_service import copy_note_body
+
+# 以指定节点为根的子树（含根节点），depth为相对根节点的层级
+SUBTREE_CTE = '''
+    WITH RECURSIVE subtree(id, depth) AS (
+        SELECT id, 0 FROM files WHERE id = ? AND uid = ?
+        UNION ALL
+        SELECT f.id, s.depth + 1 FROM files f JOIN subtree s ON f.parent_id = s.id WHERE f.uid = ?
+    )
+'''
+
+def _subtree_params(node_id, user_id):
+    """
+    SUBTREE_CTE的参数
+    """
+    return (node_id, user_id, user_id)
+
+def _get_node(c, user_id, node_id):
+    """
+    获取用户的文件/文件夹
+    返回：(id, name, parent_id, is_dir)，不存在时返回None
+    """
+    c.execute("SELECT id, name, parent_id, is_dir FROM files WHERE id = ? AND uid = ?", (node_id, user_id))
+    return c.fetchone()
+
+def check_parent(c, user_id, parent_id):
+    """
+    校验目标文件夹（None表示根目录）
+    返回：错误信息，校验通过返回None
+    """
+    if parent_id is None:
+        return None
+    parent = _get_node(c, user_id, parent_id)
+    if not parent:
+        return "目标文件夹不存在"
+    if not parent[3]:
+        return "目标不是文件夹"
+    return None
+
+def _name_exists(c, user_id, parent_id, name, exclude_id=None):
+    """
+    同一文件夹下是否已有同名文件/文件夹
+    """
+    c.execute("SELECT id FROM files WHERE uid = ? AND parent_id IS ? AND name = ? AND id IS NOT ?",
+              (user_id, parent_id, name, exclude_id))
+    return c.fetchone() is not None
+
+@cached('files')
+def list_children(user_id, parent_id=None, limit=None, cursor=None):
+    """
+    获取一个文件夹下的直接子项（目录优先、名称、id 排序，keyset分页）
+    参数：user_id - 用户ID（users.id）, parent_id - 文件夹ID（None表示根目录）,
+          limit - 每页条数（None表示不分页）, cursor - 上一页返回的next_cursor
+    返回：(子项字典列表（文件夹含child_count）, next_cursor)
+    """
+    after = decode_cursor(cursor, 3)
+    sql = '''
+        SELECT f.id, f.name, f.parent_id, f.is_dir, f.tags, f.updated_at,
+               CASE WHEN f.is_dir THEN (SELECT COUNT(*) FROM files c WHERE c.uid = f.uid AND c.parent_id = f.id) END
+        FROM files f
+        WHERE f.uid = ? AND f.parent_id IS ?
+    '''
+    params = [user_id, parent_id]
+    if after:
+        sql += ' AND (f.is_dir < ? OR (f.is_dir = ? AND (f.name, f.id) > (?, ?)))'
+        params += [after[0], after[0], after[1], after[2]]
+    sql += ' ORDER BY f.is_dir DESC, f.name, f.id'
+    conn = get_conn()
+    c = conn.cursor()
+    rows, next_cursor = fetch_page(c, sql, params, limit, lambda row: (row[3], row[1], row[0]))
+    conn.close()
+    children = [
+        {"id": row[0], "name": row[1], "parent_id": row[2], "is_dir": bool(row[3]), "tags": row[4],
+         "updated_at": row[5], "child_count": row[6]}
+        for row in rows
+    ]
+    return children, next_cursor
+
+def create_folder(user_id, name, parent_id=None):
+    """
+    新建文件夹
+    参数：user_id - 用户ID（users.id）, name - 文件夹名, parent_id - 上级文件夹ID（None表示根目录）
+    返回：(文件夹ID, 错误信息)
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    err = check_parent(c, user_id, parent_id)
+    if not err and _name_exists(c, user_id, parent_id, name):
+        err = "同名文件或文件夹已存在"
+    if err:
+        conn.close()
+        return None, err
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    c.execute('''
+        INSERT INTO files (name, content, parent_id, is_dir, tags, user_id, uid, created_at, updated_at)
+        VALUES (?, '', ?, 1, '', '', ?, ?, ?)
+    ''', (name, parent_id, user_id, now, now))
+    folder_id = c.lastrowid
+    conn.commit()
+    invalidate(user_id, 'files')
+    conn.close()
+    return folder_id, None
+
+def move_node(user_id, node_id, parent_id=None):
+    """
+    移动文件/文件夹（文件夹连同其子树一起移动）
+    参数：user_id - 用户ID（users.id）, node_id - 文件/文件夹ID, parent_id - 目标文件夹ID（None表示根目录）
+    返回：(True/False, 错误信息)
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    node = _get_node(c, user_id, node_id)
+    err = None if node else "文件不存在或无权限"
+    if not err:
+        err = check_parent(c, user_id, parent_id)
+    if not err and parent_id is not None:
+        # 不能移动到自身或自己的子孙文件夹下
+        c.execute(SUBTREE_CTE + 'SELECT 1 FROM subtree WHERE id = ?', (*_subtree_params(node_id, user_id), parent_id))
+        if c.fetchone():
+            err = "不能移动到自身或其子文件夹下"
+    if not err and _name_exists(c, user_id, parent_id, node[1], exclude_id=node_id):
+        err = "目标文件夹下已有同名文件或文件夹"
+    if err:
+        conn.close()
+        return False, err
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    c.execute("UPDATE files SET parent_id = ?, updated_at = ? WHERE id = ? AND uid = ?", (parent_id, now, node_id, user_id))
+    conn.commit()
+    invalidate(user_id, 'files')
+    conn.close()
+    return True, None
+
+def _copy_name(c, user_id, parent_id, name):
+    """
+    为复制得到的文件生成目标文件夹内不重名的名称
+    """
+    stem, ext = (name[:-3], '.md') if name.endswith('.md') else (name, '')
+    candidate = name
+    n = 1
+    while _name_exists(c, user_id, parent_id, candidate):
+        candidate = f"{stem} (副本{'' if n == 1 else n}){ext}"
+        n += 1
+    return candidate
+
+def copy_node(user_id, node_id, parent_id=None):
+    """
+    复制文件/文件夹（文件夹递归复制整个子树）
+    参数：user_id - 用户ID（users.id）, node_id - 文件/文件夹ID, parent_id - 目标文件夹ID（None表示根目录）
+    返回：(新节点ID, 错误信息)
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    node = _get_node(c, user_id, node_id)
+    err = None if node else "文件不存在或无权限"
+    if not err:
+        err = check_parent(c, user_id, parent_id)
+    if not err and parent_id is not None:
+        c.execute(SUBTREE_CTE + 'SELECT 1 FROM subtree WHERE id = ?', (*_subtree_params(node_id, user_id), parent_id))
+        if c.fetchone():
+            err = "不能复制到自身或其子文件夹下"
+    if err:
+        conn.close()
+        return None, err
+    # 按层级顺序读出子树，保证复制子项时其上级已经复制完成
+    c.execute(SUBTREE_CTE + '''
+        SELECT f.id, f.name, f.content, f.content_z, f.content_size, f.parent_id, f.is_dir, f.tags
+        FROM subtree s JOIN files f ON f.id = s.id
+        ORDER BY s.depth, f.id
+    ''', _subtree_params(node_id, user_id))
+    rows = c.fetchall()
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    new_ids = {}
+    for old_id, name, content, content_z, content_size, old_parent, is_dir, tags in rows:
+        if old_id == node_id:
+            new_parent = parent_id
+            name = _copy_name(c, user_id, parent_id, name)
+        else:
+            new_parent = new_ids[old_parent]
+        # 压缩存储的内容原样复制，无需解压
+        c.execute('''
+            INSERT INTO files (name, content, content_z, content_size, parent_id, is_dir, tags, user_id, uid, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, '', ?, ?, ?)
+        ''', (name, content, content_z, content_size, new_parent, is_dir, tags, user_id, now, now))
+        new_ids[old_id] = c.lastrowid
+        if content_z is not None:
+            copy_note_body(c, old_id, new_ids[old_id])
+        copy_attachment_refs(c, old_id, new_ids[old_id])
+    conn.commit()
+    invalidate(user_id, 'files')
+    conn.close()
+    return new_ids[node_id], None
+
+def delete_subtree(c, user_id, node_id):
+    """
+    删除文件/文件夹及其整个子树（调用方负责提交事务）
+    参数：c - 游标, user_id - 用户ID（users.id）, node_id - 文件/文件夹ID
+    返回：删除的行数
+    """
+    c.execute(SUBTREE_CTE + 'DELETE FROM files WHERE id IN (SELECT id FROM subtree)', _subtree_params(node_id, user_id))
+    return c.rowcount
+
+@cached('files')
+def get_subtree_size(user_id, node_id):
+    """
+    统计文件/文件夹子树的大小
+    参数：user_id - 用户ID（users.id）, node_id - 文件/文件夹ID
+    返回：{files, folders, bytes}，节点不存在时返回None
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute(SUBTREE_CTE + '''
+        SELECT COUNT(*),
+               SUM(CASE WHEN f.is_dir THEN 0 ELSE 1 END),
+               SUM(CASE WHEN f.is_dir THEN 1 ELSE 0 END),
+               SUM(COALESCE(f.content_size, LENGTH(CAST(COALESCE(f.content, '') AS BLOB))))
+        FROM subtree s JOIN files f ON f.id = s.id
+    ''', _subtree_params(node_id, user_id))
+    total, files, folders, size = c.fetchone()
+    conn.close()
+    if not total:
+        return None
+    return {"files": files, "folders": folders, "bytes": size}
@@ -0,0 +1,284 @@
+"""
+文件名：import_service.py
+功能：批量导入markdown笔记库（Obsidian/Typora等的文件夹或zip包）
+主要内容：
+    - 遍历zip包或本地目录中的.md文件，保留目录结构（建为文件夹行，parent_id/is_dir）
+    - 按块（IMPORT_CHUNK_SIZE篇）先在事务外读取、解码、压缩，再在一个写事务中executemany批量插入，而不是每篇笔记单独查重、插入、提交
+    - 同一文件夹下重名时按策略跳过或自动重命名，逐文件记录冲突/错误
+    - 以生成器形式产出进度事件和最终报告，供接口流式返回和命令行显示
+"""
+import os
+from datetime import datetime
+from dotenv import load_dotenv
+from backend.services.db_service import get_conn
+from backend.services.cache_service import invalidate
+from backend.services.file_tree_service import check_parent
+from backend.services.compression_service import pack
+from backend.services.attachment_service import ATTACHMENT_REF_RE
+from backend.services.search_service import index_note_body
+
+load_dotenv()
+# 每个写事务插入的笔记数
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "500"))
+# 单篇笔记的大小上限，防止zip炸弹
+MAX_IMPORT_NOTE_BYTES = int(os.getenv("IMPORT_MAX_NOTE_BYTES", str(5 * 1024 * 1024)))
+# 重名处理策略：skip-跳过，rename-自动重命名
+CONFLICT_POLICIES = ('skip', 'rename')
+# 按顺序尝试的笔记编码（Windows下的Typora笔记常为GBK）
+NOTE_ENCODINGS = ('utf-8-sig', 'gbk')
+# zip包中未标记UTF-8的文件名按该编码还原（Windows压缩工具默认使用本地编码）
+ZIP_LEGACY_ENCODING = 'gbk'
+# 逐文件状态 -> 报告中的计数字段
+REPORT_COUNTERS = {"skipped": "skipped", "renamed": "renamed", "error": "errors"}
+
+def _split_path(path):
+    """
+    把相对路径拆分为各级名称，丢弃空段、.、..
+    返回：名称列表
+    """
+    return [part for part in path.replace('\\', '/').split('/') if part not in ('', '.', '..')]
+
+def _is_hidden(parts):
+    """
+    隐藏目录（.obsidian、.trash等）和macOS压缩产生的__MACOSX中的文件不导入
+    """
+    return any(part.startswith('.') or part == '__MACOSX' for part in parts)
+
+def _zip_name(info):
+    """
+    还原zip条目的文件名：未设置UTF-8标志时zipfile按cp437解码，中文文件名需重新按本地编码解码
+    """
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode('cp437').decode(ZIP_LEGACY_ENCODING)
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return info.filename
+
+def iter_zip_entries(zf):
+    """
+    列出zip包中的条目
+    参数：zf - 已打开的zipfile.ZipFile
+    返回：[(各级名称列表, 原文大小, 读取函数)]，读取函数在插入时才调用，不一次性解压全部内容
+    """
+    entries = []
+    for info in zf.infolist():
+        if info.is_dir():
+            continue
+        parts = _split_path(_zip_name(info))
+        if parts:
+            entries.append((parts, info.file_size, lambda info=info: zf.read(info)))
+    return entries
+
+def iter_dir_entries(root):
+    """
+    列出本地目录下的文件（按路径排序）
+    参数：root - 目录路径
+    返回：[(各级名称列表, 文件大小, 读取函数)]
+    """
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            full = os.path.join(dirpath, filename)
+
+            def read(full=full):
+                with open(full, 'rb') as f:
+                    return f.read()
+
+            entries.append((_split_path(os.path.relpath(full, root)), os.path.getsize(full), read))
+    return entries
+
+def _decode(raw):
+    """
+    按NOTE_ENCODINGS依次尝试解码笔记内容
+    返回：文本，均失败时返回None
+    """
+    for encoding in NOTE_ENCODINGS:
+        try:
+            return raw.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return None
+
+def _next_id(c):
+    """
+    下一个可用的文件ID（调用方需持有写锁）。显式指定ID后才能在同一批次里写入附件引用
+    """
+    c.execute("SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'files'), 0), "
+              "COALESCE((SELECT MAX(id) FROM files), 0))")
+    return c.fetchone()[0] + 1
+
+class _Importer:
+    """
+    一次导入过程的状态：已建文件夹的路径->ID映射、各文件夹已有的名称集合、逐文件报告
+    """
+
+    def __init__(self, conn, user_id, parent_id, on_conflict):
+        self.conn = conn
+        self.c = conn.cursor()
+        self.user_id = user_id
+        self.on_conflict = on_conflict
+        self.folders = {(): parent_id}
+        self.names = {}
+        self.report = {"created": 0, "folders": 0, "renamed": 0, "skipped": 0, "errors": 0, "files": []}
+        self.now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.next_id = None
+
+    def _names_in(self, folder_id):
+        """
+        文件夹下已有的名称 -> 是否为文件夹（首次访问时一次性读出）
+        """
+        if folder_id not in self.names:
+            self.c.execute('SELECT name, is_dir FROM files WHERE uid = ? AND parent_id IS ?', (self.user_id, folder_id))
+            self.names[folder_id] = {name: bool(is_dir) for name, is_dir in self.c.fetchall()}
+        return self.names[folder_id]
+
+    def _free_name(self, names, name):
+        """
+        为重名项生成不冲突的名称：笔记.md -> 笔记 (导入1).md
+        """
+        stem, ext = (name[:-3], '.md') if name.endswith('.md') else (name, '')
+        n = 1
+        while f"{stem} (导入{n}){ext}" in names:
+            n += 1
+        return f"{stem} (导入{n}){ext}"
+
+    def folder(self, parts):
+        """
+        获取路径对应的文件夹ID，不存在时逐级创建；已有同名文件夹时合并到其中
+        返回：文件夹ID
+        """
+        key = tuple(parts)
+        if key in self.folders:
+            return self.folders[key]
+        parent_id = self.folder(parts[:-1])
+        names = self._names_in(parent_id)
+        name = parts[-1]
+        if names.get(name):
+            self.c.execute('SELECT id FROM files WHERE uid = ? AND parent_id IS ? AND name = ? AND is_dir = 1',
+                           (self.user_id, parent_id, name))
+            self.folders[key] = self.c.fetchone()[0]
+            return self.folders[key]
+        if name in names:
+            # 与笔记重名的文件夹总是重命名，否则其下的笔记无处存放
+            name = self._free_name(names, name)
+        folder_id = self.next_id
+        self.next_id += 1
+        self.c.execute('''
+            INSERT INTO files (id, name, content, parent_id, is_dir, tags, user_id, uid, created_at, updated_at)
+            VALUES (?, ?, '', ?, 1, '', '', ?, ?, ?)
+        ''', (folder_id, name, parent_id, self.user_id, self.now, self.now))
+        names[name] = True
+        self.names[folder_id] = {}
+        self.folders[key] = folder_id
+        self.report["folders"] += 1
+        return folder_id
+
+    def _record(self, path, status, **extra):
+        self.report[REPORT_COUNTERS[status]] += 1
+        self.report["files"].append({"path": path, "status": status, **extra})
+
+    def _prepare(self, entries):
+        """
+        在写事务之外读取、解码并压缩一块条目，不符合条件的条目直接记入报告
+        参数：entries - [(各级名称列表, 大小, 读取函数)]
+        返回：[(各级名称列表, 原路径, 内容, pack结果)]
+        """
+        notes = []
+        for parts, size, read in entries:
+            path = '/'.join(parts)
+            if _is_hidden(parts):
+                self._record(path, "skipped", reason="隐藏文件或目录")
+                continue
+            if not parts[-1].lower().endswith('.md'):
+                self._record(path, "skipped", reason="不是markdown笔记")
+                continue
+            if size > MAX_IMPORT_NOTE_BYTES:
+                self._record(path, "error", reason=f"超过{MAX_IMPORT_NOTE_BYTES // (1024 * 1024)}MB")
+                continue
+            content = _decode(read())
+            if content is None:
+                self._record(path, "error", reason="无法识别的文件编码")
+                continue
+            notes.append((parts, path, content, pack(content)))
+        return notes
+
+    def insert_chunk(self, entries):
+        """
+        导入一块条目：读取、解码、压缩在事务外完成，写事务内只做建文件夹、查重和插入
+        参数：entries - [(各级名称列表, 大小, 读取函数)]
+        """
+        notes = self._prepare(entries)
+        self.c.execute('BEGIN IMMEDIATE')
+        try:
+            self.next_id = _next_id(self.c)
+            rows = []
+            refs = []
+            # 压缩存储的笔记需补写全文索引正文
+            compressed = []
+            for parts, path, content, stored in notes:
+                parent_id = self.folder(parts[:-1])
+                names = self._names_in(parent_id)
+                name = parts[-1] if parts[-1].endswith('.md') else parts[-1][:-3] + '.md'
+                if name in names:
+                    if self.on_conflict == 'skip':
+                        self._record(path, "skipped", reason="同名文件已存在")
+                        continue
+                    renamed = self._free_name(names, name)
+                    self._record(path, "renamed", name=renamed)
+                    name = renamed
+                else:
+                    self.report["created"] += 1
+                file_id = self.next_id
+                self.next_id += 1
+                names[name] = False
+                rows.append((file_id, name, *stored, parent_id, self.user_id, self.now, self.now))
+                if stored[1] is not None:
+                    compressed.append((file_id, content, stored[1]))
+                refs.extend((file_id, blob_hash) for blob_hash in set(ATTACHMENT_REF_RE.findall(content)))
+            self.c.executemany('''
+                INSERT INTO files (id, name, content, content_z, content_size, parent_id, is_dir, tags, user_id, uid,
+                                   created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, 0, '', '', ?, ?, ?)
+            ''', rows)
+            for file_id, content, content_z in compressed:
+                index_note_body(self.c, file_id, content, content_z)
+            if refs:
+                # 只记录已上传的附件
+                self.c.executemany('INSERT INTO file_attachments (file_id, hash) SELECT ?, hash FROM attachments WHERE hash = ?',
+                                   refs)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+def import_notes(user_id, entries, parent_id=None, on_conflict='skip'):
+    """
+    批量导入笔记：每IMPORT_CHUNK_SIZE个条目一个写事务，已提交的块在后续出错时保留
+    参数：user_id - 用户ID（users.id）, entries - iter_zip_entries/iter_dir_entries的结果,
+          parent_id - 导入到的文件夹ID（None表示根目录）, on_conflict - 重名处理策略（skip/rename）
+    返回：生成器，产出进度事件{type: "progress", done, total}，最后产出报告
+          {type: "report", created, folders, renamed, skipped, errors, files}，
+          files只列出被跳过、重命名、出错的条目；参数错误时只产出{type: "report", error}
+    """
+    if on_conflict not in CONFLICT_POLICIES:
+        yield {"type": "report", "error": "on_conflict只能是skip或rename"}
+        return
+    conn = get_conn()
+    c = conn.cursor()
+    err = check_parent(c, user_id, parent_id)
+    if err:
+        conn.close()
+        yield {"type": "report", "error": err}
+        return
+    importer = _Importer(conn, user_id, parent_id, on_conflict)
+    total = len(entries)
+    try:
+        for start in range(0, total, IMPORT_CHUNK_SIZE):
+            importer.insert_chunk(entries[start:start + IMPORT_CHUNK_SIZE])
+            invalidate(user_id, 'files')
+            yield {"type": "progress", "done": min(start + IMPORT_CHUNK_SIZE, total), "total": total}
+    finally:
+        conn.close()
+    yield {"type": "report", **importer.report}
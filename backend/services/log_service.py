@@ -0,0 +1,151 @@
+"""
+文件名：log_service.py
+功能：统一的分级日志，经队列异步输出，记录日志不阻塞请求线程
+主要内容：
+    - levelup.*日志器的初始化：LOG_LEVEL控制级别，LOG_FORMAT选择json（每条一行JSON）或text
+    - 记录时只把日志放入有界队列（QueueHandler），由后台线程（QueueListener）格式化并写出；
+      队列满时丢弃并计数，不等待
+    - 通过extra={"fields": {...}}附带结构化字段
+    - 多进程部署时fork后在子进程中换用新队列并重新启动输出线程
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+ROOT_LOGGER = 'levelup'
+
+class JsonFormatter(logging.Formatter):
+    """
+    每条日志输出为一行JSON：ts、level、logger、msg及extra中的fields
+    """
+
+    def format(self, record):
+        data = {
+            "ts": datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        data.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    """
+    便于开发时阅读的单行文本格式，结构化字段以key=value附在末尾
+    """
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        return line
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    队列满时直接丢弃日志并计数，不阻塞调用方
+    """
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+class _LogPipeline:
+    """
+    日志队列与后台输出线程
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue(LOG_QUEUE_SIZE)
+        self.handler = DroppingQueueHandler(self.queue)
+        self.listener = None
+
+    def start(self):
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else TextFormatter())
+        self.listener = logging.handlers.QueueListener(self.queue, output)
+        self.listener.start()
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def restart_in_child(self):
+        """
+        fork出的子进程中没有父进程的输出线程，且继承来的队列锁状态不可靠：换用新队列并重新启动
+        """
+        self.queue = queue.Queue(LOG_QUEUE_SIZE)
+        self.handler.queue = self.queue
+        self.start()
+
+_pipeline = None
+_setup_lock = threading.Lock()
+
+def setup_logging():
+    """
+    初始化levelup日志器（重复调用无副作用）
+    """
+    global _pipeline
+    with _setup_lock:
+        if _pipeline is not None:
+            return
+        pipeline = _LogPipeline()
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+        root.addHandler(pipeline.handler)
+        # 不再交给Python根日志器，避免重复输出
+        root.propagate = False
+        pipeline.start()
+        atexit.register(pipeline.stop)
+        _pipeline = pipeline
+
+def _restart_after_fork():
+    global _setup_lock
+    _setup_lock = threading.Lock()
+    if _pipeline is not None:
+        _pipeline.restart_in_child()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+def get_logger(name):
+    """
+    获取模块日志器
+    参数：name - 模块名（如 'sql'、'access'、'roadmap'）
+    返回：名为levelup.<name>的logging.Logger
+    """
+    setup_logging()
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
+
+def log_stats():
+    """
+    日志管道状态
+    返回：{level, format, queued, queue_size, dropped}
+    """
+    return {
+        "level": LOG_LEVEL,
+        "format": LOG_FORMAT,
+        "queued": _pipeline.queue.qsize() if _pipeline else 0,
+        "queue_size": LOG_QUEUE_SIZE,
+        "dropped": DroppingQueueHandler.dropped,
+    }
@@ -0,0 +1,123 @@
+"""
+文件名：metrics_service.py
+功能：进程内的请求指标汇总，按Prometheus文本格式输出
+主要内容：
+    - 按路由（URL规则，而非实际路径，避免标签数量无限增长）与方法统计请求数、状态码
+    - 延迟、响应大小、每请求SQL语句数的直方图，SQL总耗时
+    - Prometheus文本格式（text/plain; version=0.0.4）渲染
+    - 指标保存在进程内存中，多worker部署时每个worker各自统计
+"""
+import bisect
+import threading
+
+# 直方图的桶上界
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+METRIC_PREFIX = 'levelup'
+
+class Histogram:
+    """
+    固定桶的直方图，桶内计数在渲染时再累加为Prometheus要求的累计值
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    """
+    请求指标的注册表（线程安全）
+    """
+
+    # 直方图名 -> (桶上界, 说明)
+    HISTOGRAMS = {
+        'http_request_duration_seconds': (LATENCY_BUCKETS, '请求处理耗时（流式响应计到响应体发送完毕、连接关闭）'),
+        'http_response_size_bytes': (SIZE_BUCKETS, '响应体大小（流式响应按实际发送的字节数计入）'),
+        'sql_queries_per_request': (SQL_COUNT_BUCKETS, '每个请求执行的SQL语句数（含流式响应生成过程中执行的语句）'),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.sql_seconds = {}
+        self.histograms = {name: {} for name in self.HISTOGRAMS}
+
+    def _observe(self, name, labels, value):
+        histogram = self.histograms[name].get(labels)
+        if histogram is None:
+            histogram = self.histograms[name][labels] = Histogram(self.HISTOGRAMS[name][0])
+        histogram.observe(value)
+
+    def observe_request(self, method, route, status, seconds, size, sql_count, sql_seconds):
+        """
+        记录一个请求
+        参数：method - 请求方法, route - URL规则, status - 状态码, seconds - 耗时,
+              size - 响应字节数（未知时为None）, sql_count - SQL语句数, sql_seconds - SQL耗时
+        """
+        labels = (method, route)
+        with self._lock:
+            key = (method, route, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.sql_seconds[labels] = self.sql_seconds.get(labels, 0.0) + sql_seconds
+            self._observe('http_request_duration_seconds', labels, seconds)
+            self._observe('sql_queries_per_request', labels, sql_count)
+            if size is not None:
+                self._observe('http_response_size_bytes', labels, size)
+
+    def render(self):
+        """
+        按Prometheus文本格式输出全部指标
+        返回：字符串
+        """
+        lines = []
+        with self._lock:
+            name = f'{METRIC_PREFIX}_http_requests_total'
+            lines += [f'# HELP {name} 请求数', f'# TYPE {name} counter']
+            for (method, route, status), value in sorted(self.requests.items()):
+                lines.append(f'{name}{_labels(method=method, route=route, status=status)} {value}')
+            name = f'{METRIC_PREFIX}_sql_seconds_total'
+            lines += [f'# HELP {name} SQL执行总耗时', f'# TYPE {name} counter']
+            for (method, route), value in sorted(self.sql_seconds.items()):
+                lines.append(f'{name}{_labels(method=method, route=route)} {value:.6f}')
+            for short_name, series in self.histograms.items():
+                name = f'{METRIC_PREFIX}_{short_name}'
+                lines += [f'# HELP {name} {self.HISTOGRAMS[short_name][1]}', f'# TYPE {name} histogram']
+                for (method, route), histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_labels(method=method, route=route, le=bound)} {cumulative}')
+                    lines.append(f'{name}_sum{_labels(method=method, route=route)} {histogram.sum}')
+                    lines.append(f'{name}_count{_labels(method=method, route=route)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+def _labels(**labels):
+    """
+    渲染标签，按Prometheus规则转义反斜杠、双引号、换行
+    """
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
+
+_registry = MetricsRegistry()
+
+def observe_request(method, route, status, seconds, size, sql_count, sql_seconds):
+    """
+    记录一个请求的指标（参数见MetricsRegistry.observe_request）
+    """
+    _registry.observe_request(method, route, status, seconds, size, sql_count, sql_seconds)
+
+def render_metrics():
+    """
+    输出Prometheus文本格式的指标
+    返回：字符串
+    """
+    return _registry.render()
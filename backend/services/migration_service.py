@@ -0,0 +1,597 @@
+"""
+文件名：migration_service.py
+功能：版本化的数据库迁移，统一管理所有表结构与索引
+主要内容：
+    - 以 PRAGMA user_version 记录数据库结构版本
+    - 按编号顺序在同一事务中执行待执行的迁移
+    - 数据库已是最新版本时跳过所有DDL
+    - 业务表整数用户键（uid）的在线分批回填
+"""
+import threading
+import time
+from backend.services.db_service import get_conn
+from backend.services.compression_service import pack, COMPRESS_THRESHOLD
+from backend.services.log_service import get_logger
+from backend.services.roadmap_service import ORDER_GAP
+
+logger = get_logger('migration')
+
+def _column_names(c, table):
+    """
+    获取表的字段名列表
+    """
+    c.execute(f"PRAGMA table_info({table});")
+    return [row[1] for row in c.fetchall()]
+
+def _migration_1_base_tables(c):
+    """
+    迁移1：基础表结构（原 init_*_db 与 ensure_node_order_column）
+    """
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS targets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            progress REAL DEFAULT 0,
+            tags TEXT,
+            update_time TEXT,
+            user_id TEXT NOT NULL
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS roadmap_main_nodes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            target_id TEXT NOT NULL,
+            title TEXT NOT NULL,
+            status TEXT DEFAULT '',
+            remark TEXT DEFAULT '',
+            created_at TEXT,
+            updated_at TEXT
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS roadmap_branch_nodes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            main_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            target_id TEXT NOT NULL,
+            title TEXT NOT NULL,
+            status TEXT DEFAULT '',
+            remark TEXT DEFAULT '',
+            created_at TEXT,
+            updated_at TEXT
+        )
+    ''')
+    c.execute('''CREATE TABLE IF NOT EXISTS files
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 name TEXT NOT NULL,
+                 content TEXT,
+                 parent_id INTEGER,
+                 is_dir INTEGER DEFAULT 0,
+                 tags TEXT DEFAULT '',
+                 user_id TEXT DEFAULT '',
+                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS todos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            text TEXT NOT NULL,
+            completed INTEGER DEFAULT 0,
+            created_at TEXT
+        )
+    ''')
+    if 'node_order' not in _column_names(c, 'roadmap_main_nodes'):
+        c.execute('ALTER TABLE roadmap_main_nodes ADD COLUMN node_order INTEGER DEFAULT 0;')
+
+def _migration_2_lookup_indexes(c):
+    """
+    迁移2：为各service的高频查询条件建立复合索引
+    """
+    c.execute('CREATE INDEX IF NOT EXISTS idx_targets_user ON targets (user_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_main_user_target_order ON roadmap_main_nodes (user_id, target_id, node_order)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_main_target ON roadmap_main_nodes (target_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_branch_target_main ON roadmap_branch_nodes (target_id, main_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_branch_main ON roadmap_branch_nodes (main_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_branch_user_target_status ON roadmap_branch_nodes (user_id, target_id, status)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_files_user_name ON files (user_id, name)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_todos_user ON todos (user_id, id)')
+
+def _migration_3_file_link_columns(c):
+    """
+    迁移3：将files.tags（JSON）中的mainId/branchId/userId提升为带索引的生成列
+    生成列由SQLite根据tags自动计算，建索引即完成对已有数据的回填
+    """
+    columns = {
+        'main_id': '$.mainId',
+        'branch_id': '$.branchId',
+        'tag_user_id': '$.userId',
+    }
+    c.execute("PRAGMA table_xinfo(files);")
+    existing = [row[1] for row in c.fetchall()]
+    for column, json_path in columns.items():
+        if column not in existing:
+            c.execute(f'''
+                ALTER TABLE files ADD COLUMN {column} TEXT
+                GENERATED ALWAYS AS (
+                    CASE WHEN json_valid(tags) THEN CAST(json_extract(tags, '{json_path}') AS TEXT) END
+                ) VIRTUAL
+            ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_files_main ON files (main_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_files_branch ON files (branch_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_files_tag_user ON files (tag_user_id)')
+
+# 全文索引中各实体的类型编码：rowid = 实体id * 4 + 类型编码，便于触发器按rowid精确维护
+SEARCH_TYPE_CODES = {'file': 0, 'target': 1, 'main': 2, 'branch': 3}
+# (源表, 类型, 标题字段, 正文字段, ref表达式（{row}代表行）, 触发更新的字段)
+SEARCH_SOURCES = [
+    ('files', 'file', 'name', 'content', '{row}.tags', 'name, content, tags, user_id'),
+    ('targets', 'target', 'title', 'tags', "''", 'title, tags, user_id'),
+    ('roadmap_main_nodes', 'main', 'title', 'remark', '{row}.target_id', 'title, remark, user_id, target_id'),
+    ('roadmap_branch_nodes', 'branch', 'title', 'remark', '{row}.target_id', 'title, remark, user_id, target_id'),
+]
+
+def _migration_4_search_index(c):
+    """
+    迁移4：笔记、学习目标、roadmap节点的FTS5全文索引（trigram分词，支持中文子串检索）
+    索引由触发器与源表保持同步，并回填已有数据
+    """
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+            entity_type UNINDEXED,
+            entity_id UNINDEXED,
+            user_id UNINDEXED,
+            ref UNINDEXED,
+            title,
+            body,
+            tokenize = 'trigram'
+        )
+    ''')
+    for table, entity_type, title, body, ref, watched in SEARCH_SOURCES:
+        code = SEARCH_TYPE_CODES[entity_type]
+        insert = (f"INSERT INTO search_index (rowid, entity_type, entity_id, user_id, ref, title, body) "
+                  f"VALUES (new.id * 4 + {code}, '{entity_type}', new.id, new.user_id, {ref.format(row='new')}, "
+                  f"new.{title}, new.{body});")
+        delete = f"DELETE FROM search_index WHERE rowid = old.id * 4 + {code};"
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_search_ai AFTER INSERT ON {table} BEGIN {insert} END")
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_search_ad AFTER DELETE ON {table} BEGIN {delete} END")
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_search_au AFTER UPDATE OF {watched} ON {table} "
+                  f"BEGIN {delete} {insert} END")
+        c.execute(f'''
+            INSERT INTO search_index (rowid, entity_type, entity_id, user_id, ref, title, body)
+            SELECT id * 4 + {code}, '{entity_type}', id, user_id, {ref.format(row=table)}, {title}, {body} FROM {table}
+        ''')
+
+def _migration_5_target_progress(c):
+    """
+    迁移5：按目标物化的分支节点完成/总数计数，由分支节点表上的触发器维护
+    """
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS target_progress (
+            target_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            done_count INTEGER NOT NULL DEFAULT 0,
+            total_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (target_id, user_id)
+        )
+    ''')
+    increment = '''
+        INSERT INTO target_progress (target_id, user_id, done_count, total_count)
+        VALUES (new.target_id, new.user_id, new.status = 'done', 1)
+        ON CONFLICT (target_id, user_id) DO UPDATE SET
+            done_count = done_count + excluded.done_count,
+            total_count = total_count + 1;
+    '''
+    decrement = '''
+        UPDATE target_progress SET
+            done_count = done_count - (old.status = 'done'),
+            total_count = total_count - 1
+        WHERE target_id = old.target_id AND user_id = old.user_id;
+    '''
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_branch_progress_ai AFTER INSERT ON roadmap_branch_nodes BEGIN {increment} END")
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_branch_progress_ad AFTER DELETE ON roadmap_branch_nodes BEGIN {decrement} END")
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_branch_progress_au AFTER UPDATE OF status, target_id, user_id "
+              f"ON roadmap_branch_nodes BEGIN {decrement} {increment} END")
+    c.execute('DELETE FROM target_progress')
+    c.execute('''
+        INSERT INTO target_progress (target_id, user_id, done_count, total_count)
+        SELECT target_id, user_id, SUM(status = 'done'), COUNT(*)
+        FROM roadmap_branch_nodes GROUP BY target_id, user_id
+    ''')
+
+def _migration_6_recent_files_index(c):
+    """
+    迁移6：最近编辑笔记查询的索引
+    """
+    c.execute('CREATE INDEX IF NOT EXISTS idx_files_user_updated ON files (user_id, updated_at)')
+
+def _migration_7_sparse_main_order(c):
+    """
+    迁移7：主节点node_order改为间隔排列（每个目标内按原顺序重新编号为ORDER_GAP的倍数），消除并列值
+    """
+    c.execute('''
+        WITH ranked AS (
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id, target_id ORDER BY node_order, id) AS rn
+            FROM roadmap_main_nodes
+        )
+        UPDATE roadmap_main_nodes SET node_order = (SELECT rn FROM ranked WHERE ranked.id = roadmap_main_nodes.id) * ?
+    ''', (ORDER_GAP,))
+
+# 以用户名作为user_id的业务表，迁移8起改用整数uid（users.id）
+# user_id列只保留给迁移8之前的旧数据回填uid，新写入的行为空字符串；用户名一律按uid关联users查出
+USER_KEY_TABLES = ['targets', 'roadmap_main_nodes', 'roadmap_branch_nodes', 'files', 'todos']
+
+def _migration_8_user_keys(c):
+    """
+    迁移8：业务表增加不可变的整数uid（users.id）列及索引，改名只需更新users一行
+    已有数据的uid由backfill_user_keys分批在线回填；全文索引与进度计数的触发器改为按uid维护
+    """
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS schema_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+    for table in USER_KEY_TABLES:
+        if 'uid' not in _column_names(c, table):
+            c.execute(f'ALTER TABLE {table} ADD COLUMN uid INTEGER')
+        # 未携带uid写入的行（如仍在运行的旧版本进程），插入后按用户名补齐
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_uid_fill AFTER INSERT ON {table}
+            WHEN new.uid IS NULL
+            BEGIN
+                UPDATE {table} SET uid = (SELECT id FROM users WHERE username = new.user_id) WHERE id = new.id;
+            END
+        ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_targets_uid ON targets (uid)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_main_uid_target_order ON roadmap_main_nodes (uid, target_id, node_order)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_branch_uid_target_status ON roadmap_branch_nodes (uid, target_id, status)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_files_uid_name ON files (uid, name)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_files_uid_updated ON files (uid, updated_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_todos_uid ON todos (uid, id)')
+    # 全文索引：user_id列改存uid，回填uid时触发器会重建对应行
+    for table, entity_type, title, body, ref, watched in SEARCH_SOURCES:
+        code = SEARCH_TYPE_CODES[entity_type]
+        insert = (f"INSERT INTO search_index (rowid, entity_type, entity_id, user_id, ref, title, body) "
+                  f"VALUES (new.id * 4 + {code}, '{entity_type}', new.id, new.uid, {ref.format(row='new')}, "
+                  f"new.{title}, new.{body});")
+        delete = f"DELETE FROM search_index WHERE rowid = old.id * 4 + {code};"
+        c.execute(f"DROP TRIGGER IF EXISTS trg_{table}_search_ai")
+        c.execute(f"DROP TRIGGER IF EXISTS trg_{table}_search_au")
+        c.execute(f"CREATE TRIGGER trg_{table}_search_ai AFTER INSERT ON {table} BEGIN {insert} END")
+        c.execute(f"CREATE TRIGGER trg_{table}_search_au AFTER UPDATE OF {watched.replace('user_id', 'uid')} ON {table} "
+                  f"BEGIN {delete} {insert} END")
+    # 进度计数：改为按uid统计，uid为空（尚未回填）的行不计入，回填时由更新触发器计入
+    increment = '''
+        INSERT INTO target_progress (target_id, user_id, done_count, total_count)
+        SELECT new.target_id, new.uid, new.status = 'done', 1 WHERE new.uid IS NOT NULL
+        ON CONFLICT (target_id, user_id) DO UPDATE SET
+            done_count = done_count + excluded.done_count,
+            total_count = total_count + 1;
+    '''
+    decrement = '''
+        UPDATE target_progress SET
+            done_count = done_count - (old.status = 'done'),
+            total_count = total_count - 1
+        WHERE target_id = old.target_id AND user_id = old.uid;
+    '''
+    for suffix in ('ai', 'ad', 'au'):
+        c.execute(f"DROP TRIGGER IF EXISTS trg_branch_progress_{suffix}")
+    c.execute(f"CREATE TRIGGER trg_branch_progress_ai AFTER INSERT ON roadmap_branch_nodes BEGIN {increment} END")
+    c.execute(f"CREATE TRIGGER trg_branch_progress_ad AFTER DELETE ON roadmap_branch_nodes BEGIN {decrement} END")
+    c.execute(f"CREATE TRIGGER trg_branch_progress_au AFTER UPDATE OF status, target_id, uid "
+              f"ON roadmap_branch_nodes BEGIN {decrement} {increment} END")
+    c.execute('DELETE FROM target_progress')
+
+# 数据版本号：业务表 -> 实体名（同一实体的多张表共用一个版本号）
+ENTITY_VERSION_TABLES = [
+    ('targets', 'targets'),
+    ('roadmap_main_nodes', 'roadmap'),
+    ('roadmap_branch_nodes', 'roadmap'),
+    ('files', 'files'),
+    ('todos', 'todos'),
+]
+
+def _migration_9_entity_versions(c):
+    """
+    迁移9：按用户、实体维护数据版本号，业务表任意写入（含级联删除）由触发器递增，用于GET接口的ETag
+    """
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS entity_versions (
+            uid INTEGER NOT NULL,
+            entity TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (uid, entity)
+        ) WITHOUT ROWID
+    ''')
+    for table, entity in ENTITY_VERSION_TABLES:
+        for suffix, event, row in (('ai', 'INSERT', 'new'), ('au', 'UPDATE', 'new'), ('ad', 'DELETE', 'old')):
+            c.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{suffix} AFTER {event} ON {table}
+                WHEN {row}.uid IS NOT NULL
+                BEGIN
+                    INSERT INTO entity_versions (uid, entity, version) VALUES ({row}.uid, '{entity}', 1)
+                    ON CONFLICT (uid, entity) DO UPDATE SET version = version + 1;
+                END
+            """)
+        # uid被修改（回填）时，原用户的数据也发生了变化
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_version_au_old AFTER UPDATE OF uid ON {table}
+            WHEN old.uid IS NOT NULL AND old.uid IS NOT new.uid
+            BEGIN
+                UPDATE entity_versions SET version = version + 1 WHERE uid = old.uid AND entity = '{entity}';
+            END
+        """)
+
+def _migration_10_file_list_order_index(c):
+    """
+    迁移10：文件列表keyset分页的排序索引（目录优先、文件名、id）
+    """
+    c.execute('CREATE INDEX IF NOT EXISTS idx_files_uid_dir_name ON files (uid, is_dir DESC, name)')
+
+def _migration_11_file_tree_index(c):
+    """
+    迁移11：目录树按层加载、子项计数与递归遍历使用的索引
+    """
+    c.execute('CREATE INDEX IF NOT EXISTS idx_files_uid_parent ON files (uid, parent_id, is_dir DESC, name)')
+
+def _migration_12_file_revisions(c):
+    """
+    迁移12：笔记修订历史，每行保存一个历史版本（相对较新版本的反向增量，或定期的完整快照）
+    """
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS file_revisions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_id INTEGER NOT NULL,
+            rev INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            data TEXT NOT NULL,
+            hash TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at TEXT,
+            UNIQUE (file_id, rev)
+        )
+    ''')
+    # 删除文件（含递归删除文件夹）时一并删除修订历史
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_files_revisions_ad AFTER DELETE ON files
+        BEGIN
+            DELETE FROM file_revisions WHERE file_id = old.id;
+        END
+    ''')
+
+def _migration_13_compressed_content(c):
+    """
+    迁移13：大篇幅笔记压缩存储（content_z），并压缩已有的大笔记
+    files的全文索引触发器改为纯SQL，只索引未压缩的content；压缩存储的笔记由写入方补写正文
+    （见search_service.index_note_body），改名、改标签、移交用户时只更新对应字段，保留已有正文
+    """
+    columns = _column_names(c, 'files')
+    if 'content_z' not in columns:
+        c.execute('ALTER TABLE files ADD COLUMN content_z BLOB')
+    if 'content_size' not in columns:
+        c.execute('ALTER TABLE files ADD COLUMN content_size INTEGER')
+    rowid = f"new.id * 4 + {SEARCH_TYPE_CODES['file']}"
+    c.execute("DROP TRIGGER IF EXISTS trg_files_search_ai")
+    c.execute("DROP TRIGGER IF EXISTS trg_files_search_au")
+    c.execute(f'''
+        CREATE TRIGGER trg_files_search_ai AFTER INSERT ON files
+        BEGIN
+            INSERT INTO search_index (rowid, entity_type, entity_id, user_id, ref, title, body)
+            VALUES ({rowid}, 'file', new.id, new.uid, new.tags, new.name, new.content);
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER trg_files_search_au AFTER UPDATE OF name, tags, uid ON files
+        BEGIN
+            UPDATE search_index SET user_id = new.uid, ref = new.tags, title = new.name WHERE rowid = {rowid};
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER trg_files_search_content_au AFTER UPDATE OF content, content_z ON files
+        WHEN new.content_z IS NULL
+        BEGIN
+            UPDATE search_index SET body = new.content WHERE rowid = {rowid};
+        END
+    ''')
+    # 已有大笔记压缩后content置空，content_z非空不触发正文更新，索引中保留原文
+    c.execute('SELECT id, content FROM files WHERE is_dir = 0 AND LENGTH(CAST(content AS BLOB)) >= ?', (COMPRESS_THRESHOLD,))
+    for file_id, content in c.fetchall():
+        content, content_z, content_size = pack(content)
+        if content_z is not None:
+            c.execute('UPDATE files SET content = NULL, content_z = ?, content_size = ? WHERE id = ?',
+                      (content_z, content_size, file_id))
+
+def _migration_14_attachments(c):
+    """
+    迁移14：内容寻址的附件表与笔记-附件引用表，引用计数由引用表上的触发器维护
+    """
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS attachments (
+            hash TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mime TEXT NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT
+        ) WITHOUT ROWID
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS file_attachments (
+            file_id INTEGER NOT NULL,
+            hash TEXT NOT NULL,
+            PRIMARY KEY (file_id, hash)
+        ) WITHOUT ROWID
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_file_attachments_hash ON file_attachments (hash)')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_file_attachments_ai AFTER INSERT ON file_attachments
+        BEGIN
+            UPDATE attachments SET refcount = refcount + 1 WHERE hash = new.hash;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_file_attachments_ad AFTER DELETE ON file_attachments
+        BEGIN
+            UPDATE attachments SET refcount = refcount - 1 WHERE hash = old.hash;
+        END
+    ''')
+    # 删除笔记（含递归删除文件夹）时释放其引用
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_files_attachments_ad AFTER DELETE ON files
+        BEGIN
+            DELETE FROM file_attachments WHERE file_id = old.id;
+        END
+    ''')
+
+# (版本号, 说明, 迁移函数)，版本号必须连续递增，只能追加不能修改
+MIGRATIONS = [
+    (1, '基础表结构', _migration_1_base_tables),
+    (2, '高频查询索引', _migration_2_lookup_indexes),
+    (3, 'files关联roadmap节点的索引生成列', _migration_3_file_link_columns),
+    (4, '全文检索索引', _migration_4_search_index),
+    (5, '目标进度物化计数', _migration_5_target_progress),
+    (6, '最近编辑笔记索引', _migration_6_recent_files_index),
+    (7, '主节点间隔排序', _migration_7_sparse_main_order),
+    (8, '业务表整数用户键', _migration_8_user_keys),
+    (9, '按用户的数据版本号', _migration_9_entity_versions),
+    (10, '文件列表分页排序索引', _migration_10_file_list_order_index),
+    (11, '目录树索引', _migration_11_file_tree_index),
+    (12, '笔记修订历史', _migration_12_file_revisions),
+    (13, '大篇幅笔记压缩存储', _migration_13_compressed_content),
+    (14, '内容寻址附件', _migration_14_attachments),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(path=None):
+    """
+    获取数据库当前结构版本
+    参数：path - 数据库路径
+    返回：整数版本号
+    """
+    conn = get_conn(path)
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    conn.close()
+    return version
+
+def run_migrations(path=None):
+    """
+    执行所有待执行的迁移（同一事务内，全部成功才提交）
+    参数：path - 数据库路径，默认使用 DATABASE_URL
+    返回：执行的迁移版本号列表（已是最新则为空）
+    """
+    conn = get_conn(path)
+    c = conn.cursor()
+    c.execute('PRAGMA user_version')
+    if c.fetchone()[0] >= LATEST_VERSION:
+        conn.close()
+        return []
+    applied = []
+    try:
+        c.execute('BEGIN IMMEDIATE')
+        # 拿到写锁后重新读取版本，防止多个进程同时迁移
+        c.execute('PRAGMA user_version')
+        current = c.fetchone()[0]
+        for version, description, migrate in MIGRATIONS:
+            if version <= current:
+                continue
+            logger.info('apply migration', extra={"fields": {"version": version, "description": description}})
+            migrate(c)
+            applied.append(version)
+        if applied:
+            c.execute(f'PRAGMA user_version = {applied[-1]}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return applied
+
+USER_KEYS_BACKFILLED = 'user_keys_backfilled'
+_user_keys_ready = False
+
+def user_keys_ready(path=None):
+    """
+    业务表uid是否已全部回填（结果为真后在进程内缓存）
+    参数：path - 数据库路径
+    返回：True/False
+    """
+    global _user_keys_ready
+    if _user_keys_ready:
+        return True
+    conn = get_conn(path)
+    c = conn.cursor()
+    c.execute('SELECT value FROM schema_meta WHERE key=?', (USER_KEYS_BACKFILLED,))
+    row = c.fetchone()
+    conn.close()
+    _user_keys_ready = bool(row and row[0] == '1')
+    return _user_keys_ready
+
+def backfill_user_keys_for(username, user_key, path=None):
+    """
+    立即回填指定用户的uid（在线回填尚未完成时，由登录/请求入口调用，保证该用户的数据可见）
+    参数：username - 用户名, user_key - users.id, path - 数据库路径
+    """
+    conn = get_conn(path)
+    c = conn.cursor()
+    for table in USER_KEY_TABLES:
+        c.execute(f'UPDATE {table} SET uid=? WHERE user_id=? AND uid IS NULL', (user_key, username))
+    conn.commit()
+    conn.close()
+
+def backfill_user_keys(path=None, batch_size=500, pause=0.01):
+    """
+    在线分批回填各业务表的uid：每批一个短事务，批间让出写锁，不阻塞正常请求
+    用户名已不存在于users表的孤立数据保持uid为空
+    参数：path - 数据库路径, batch_size - 每批行数, pause - 批间暂停秒数
+    返回：回填的总行数
+    """
+    global _user_keys_ready
+    if user_keys_ready(path):
+        return 0
+    total = 0
+    conn = get_conn(path)
+    c = conn.cursor()
+    try:
+        for table in USER_KEY_TABLES:
+            last_id = 0
+            while True:
+                c.execute(f'SELECT MAX(id) FROM (SELECT id FROM {table} WHERE id > ? AND uid IS NULL ORDER BY id LIMIT ?)', (last_id, batch_size))
+                batch_end = c.fetchone()[0]
+                if batch_end is None:
+                    break
+                c.execute(f'''
+                    UPDATE {table} SET uid = (SELECT id FROM users WHERE username = {table}.user_id)
+                    WHERE id > ? AND id <= ? AND uid IS NULL
+                ''', (last_id, batch_end))
+                total += c.rowcount
+                conn.commit()
+                last_id = batch_end
+                time.sleep(pause)
+        c.execute('INSERT OR REPLACE INTO schema_meta (key, value) VALUES (?, ?)', (USER_KEYS_BACKFILLED, '1'))
+        conn.commit()
+        _user_keys_ready = True
+    finally:
+        conn.close()
+    logger.info('uid backfill finished', extra={"fields": {"rows": total}})
+    return total
+
+def start_background_backfill(path=None):
+    """
+    启动后台线程执行uid在线回填
+    参数：path - 数据库路径
+    返回：线程对象（已完成回填时返回None）
+    """
+    if user_keys_ready(path):
+        return None
+    thread = threading.Thread(target=backfill_user_keys, args=(path,), name='user-key-backfill', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,86 @@
+"""
+文件名：pagination_service.py
+功能：列表接口的游标（keyset）分页工具
+主要内容：
+    - 不透明游标的编码与解码（记录上一页最后一行的排序键）
+    - 每页条数的解析与上限
+    - 请求分页参数解析（all=1为不分页的兼容模式）
+    - 按"多取一条"判断是否还有下一页
+约定：列表接口未带limit时同样只返回第一页（DEFAULT_PAGE_SIZE条）；结果被截断时，包装响应的next_cursor字段
+      与所有列表接口的X-Next-Cursor响应头都会给出下一页游标，客户端应据此继续请求直到没有游标
+"""
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(key):
+    """
+    将排序键编码为不透明游标
+    参数：key - 排序键（列表/元组，元素为可JSON序列化的值）
+    返回：游标字符串
+    """
+    raw = json.dumps(list(key), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, size):
+    """
+    解码游标
+    参数：cursor - 游标字符串（为空表示第一页）, size - 排序键的元素个数
+    返回：排序键列表，第一页返回None
+    异常：ValueError - 游标格式错误
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        key = json.loads(raw.decode('utf-8'))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('无效的cursor')
+    if not isinstance(key, list) or len(key) != size:
+        raise ValueError('无效的cursor')
+    return key
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE):
+    """
+    解析每页条数
+    参数：value - 请求参数值, default - 默认条数
+    返回：1~MAX_PAGE_SIZE之间的整数
+    异常：ValueError - 不是整数
+    """
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('limit必须为整数')
+    return min(max(limit, 1), MAX_PAGE_SIZE)
+
+def parse_page_args(args, default=DEFAULT_PAGE_SIZE):
+    """
+    从请求参数中解析分页参数
+    参数：args - 请求参数（limit, cursor, all）, default - 默认每页条数
+    返回：(limit, cursor)，all=1时limit为None表示不分页（仅为兼容旧客户端保留）
+    异常：ValueError - limit不是整数
+    """
+    if args.get('all') in ('1', 'true'):
+        return None, None
+    return parse_limit(args.get('limit'), default), args.get('cursor') or None
+
+def fetch_page(c, sql, params, limit, key):
+    """
+    执行已按排序键排序的查询并取一页（多取一条判断是否还有下一页）
+    参数：c - 游标, sql - 不含LIMIT的查询, params - 参数列表,
+          limit - 每页条数（None表示不分页）, key - 由行计算排序键的函数
+    返回：(本页行列表, next_cursor或None)
+    """
+    if limit is None:
+        c.execute(sql, params)
+        return c.fetchall(), None
+    c.execute(sql + ' LIMIT ?', [*params, limit + 1])
+    rows = c.fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key(rows[-1]))
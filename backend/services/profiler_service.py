@@ -0,0 +1,224 @@
+"""
+文件名：profiler_service.py
+功能：可选开启的SQL性能分析（SQL_PROFILE=True或调用set_profiling开启）
+主要内容：
+    - 按归一化语句（字面量替换为?、IN列表折叠）统计调用次数、总耗时、p99耗时、返回/影响行数
+    - 每种语句首次出现时记录EXPLAIN QUERY PLAN，标记全表扫描
+    - 超过SLOW_QUERY_MS的语句连同执行计划写入慢查询日志
+    - 同一请求内同一语句重复执行达到阈值时标记为N+1查询
+    - 分析开启时由db_service为连接换用ProfilingCursor，关闭时没有额外开销
+"""
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from dotenv import load_dotenv
+import os
+from backend.services.log_service import get_logger
+
+load_dotenv()
+SQL_PROFILE = os.getenv("SQL_PROFILE", "False") == "True"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+# 同一请求内同一语句执行达到该次数视为N+1查询
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+# 每种语句保留的最近耗时样本数（用于计算p99）
+PROFILE_SAMPLES = 1024
+# 保留的最近N+1记录数
+N_PLUS_ONE_HISTORY = 100
+# 会读取表数据、需要查看执行计划的语句
+EXPLAIN_PREFIXES = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+_FULL_SCAN_RE = re.compile(r'^SCAN (\w+)$')
+
+logger = get_logger('sql')
+
+class StatementStats:
+    """
+    一种归一化语句的统计
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.rows = 0
+        self.samples = deque(maxlen=PROFILE_SAMPLES)
+        self.plan = None
+        self.full_scans = []
+        self.slow = 0
+        self.n_plus_one = 0
+
+    def p99(self):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+class Profiler:
+    """
+    SQL统计的注册表（线程安全），请求内的语句计数保存在线程局部变量中
+    """
+
+    def __init__(self, enabled=SQL_PROFILE):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._normalized = {}
+        self._tables = set()
+        self._n_plus_one = deque(maxlen=N_PLUS_ONE_HISTORY)
+        self._local = threading.local()
+
+    def normalize(self, sql):
+        """
+        归一化语句文本：字面量替换为?，IN列表折叠为(?...)，合并空白
+        """
+        normalized = self._normalized.get(sql)
+        if normalized is None:
+            normalized = _STRING_RE.sub('?', sql)
+            normalized = _NUMBER_RE.sub('?', normalized)
+            normalized = _SPACE_RE.sub(' ', normalized).strip()
+            normalized = _IN_LIST_RE.sub('(?...)', normalized)
+            # 语句文本基本都是代码中的常量，缓存数量有限；动态拼接过多时整体清空
+            if len(self._normalized) > 4096:
+                self._normalized.clear()
+            self._normalized[sql] = normalized
+        return normalized
+
+    def _explain(self, conn, sql, parameters):
+        """
+        获取执行计划（使用普通游标，不计入统计）
+        返回：(计划行列表, 全表扫描的表名列表)
+        """
+        c = conn.cursor(sqlite3.Cursor)
+        try:
+            c.execute('EXPLAIN QUERY PLAN ' + sql, parameters)
+            plan = [row[3] for row in c.fetchall()]
+            if not self._tables:
+                # sqlite_sequence等内部表很小，不关注
+                c.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite%'")
+                self._tables = {row[0] for row in c.fetchall()}
+        except sqlite3.Error:
+            return [], []
+        finally:
+            c.close()
+        scans = []
+        for detail in plan:
+            match = _FULL_SCAN_RE.match(detail)
+            # CTE、子查询的扫描不算全表扫描
+            if match and match.group(1) in self._tables:
+                scans.append(match.group(1))
+        return plan, scans
+
+    def record(self, conn, sql, parameters, seconds, many=False):
+        """
+        记录一次语句执行
+        参数：conn - 连接, sql - 语句, parameters - 参数, seconds - 耗时, many - 是否为executemany
+        返回：统计对象，供游标累计读取的行数
+        """
+        key = self.normalize(sql)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = StatementStats()
+            stats.calls += 1
+            stats.total += seconds
+            stats.samples.append(seconds)
+            explain = stats.plan is None and not many and key.upper().startswith(EXPLAIN_PREFIXES)
+            if stats.plan is None and not explain:
+                stats.plan = []
+        if explain:
+            stats.plan, stats.full_scans = self._explain(conn, sql, parameters)
+            for table in stats.full_scans:
+                logger.warning("full table scan", extra={"fields": {"table": table, "statement": key}})
+        if seconds * 1000 >= SLOW_QUERY_MS:
+            with self._lock:
+                stats.slow += 1
+            logger.warning("slow query", extra={"fields": {"ms": round(seconds * 1000, 2), "statement": key,
+                                                          "plan": stats.plan or []}})
+        counts = getattr(self._local, 'counts', None)
+        if counts is not None:
+            counts[key] = counts.get(key, 0) + 1
+        return stats
+
+    def add_rows(self, stats, n):
+        with self._lock:
+            stats.rows += n
+
+    def begin_request(self):
+        """
+        开始统计当前请求内的语句重复次数
+        """
+        self._local.counts = {} if self.enabled else None
+
+    def end_request(self, route):
+        """
+        结束当前请求，标记重复执行达到阈值的语句（N+1）
+        参数：route - 请求的路由
+        """
+        counts = getattr(self._local, 'counts', None)
+        self._local.counts = None
+        if not counts:
+            return
+        for key, count in counts.items():
+            if count < N_PLUS_ONE_THRESHOLD:
+                continue
+            with self._lock:
+                if key in self._stats:
+                    self._stats[key].n_plus_one += 1
+                self._n_plus_one.append({"route": route, "statement": key, "count": count,
+                                         "at": time.strftime('%Y-%m-%d %H:%M:%S')})
+            logger.warning("n+1 query", extra={"fields": {"route": route, "count": count, "statement": key}})
+
+    def report(self, limit=50):
+        """
+        统计报告
+        参数：limit - 按总耗时返回前多少种语句
+        返回：{enabled, slow_query_ms, statements, n_plus_one}
+        """
+        with self._lock:
+            items = sorted(self._stats.items(), key=lambda item: item[1].total, reverse=True)[:limit]
+            statements = [{
+                "statement": key,
+                "calls": stats.calls,
+                "total_ms": round(stats.total * 1000, 3),
+                "avg_ms": round(stats.total * 1000 / stats.calls, 3),
+                "p99_ms": round(stats.p99() * 1000, 3),
+                "rows": stats.rows,
+                "slow": stats.slow,
+                "full_scan": stats.full_scans,
+                "n_plus_one": stats.n_plus_one,
+                "plan": stats.plan,
+            } for key, stats in items]
+            n_plus_one = list(self._n_plus_one)
+        return {"enabled": self.enabled, "slow_query_ms": SLOW_QUERY_MS, "statements": statements,
+                "n_plus_one": n_plus_one}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._n_plus_one.clear()
+            self._tables = set()
+
+profiler = Profiler()
+
+def set_profiling(enabled):
+    """
+    开启/关闭SQL性能分析（对之后创建的游标生效）
+    参数：enabled - 是否开启
+    """
+    profiler.enabled = bool(enabled)
+
+def get_profile_report(limit=50):
+    """
+    获取SQL性能分析报告（见Profiler.report）
+    """
+    return profiler.report(limit)
+
+def reset_profile():
+    """
+    清空SQL性能分析统计
+    """
+    profiler.reset()
@@ -0,0 +1,228 @@
+"""
+文件名：revision_service.py
+功能：笔记修订历史
+主要内容：
+    - 保存文件内容时记录被覆盖的旧版本：默认存为相对较新版本的反向增量，
+      每隔固定版本数存一次完整快照，重建任一版本最多应用有限个增量
+    - 修订列表、任意历史版本的获取、两个版本的差异对比
+    - 保留策略：最近的若干版本全部保留，更早的每天只保留最后一个版本，超过保留天数的删除
+版本号：
+    file_revisions中第rev行保存第rev版的内容；当前版本（files.content）的版本号为最大rev+1
+"""
+import difflib
+import json
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+import os
+from backend.services.db_service import get_conn
+from backend.services.cache_service import cached
+from backend.services.delta_service import content_hash, make_patch, apply_patch, MAX_PATCH_OPS
+from backend.services.pagination_service import decode_cursor, fetch_page
+from backend.services.compression_service import unpack
+
+load_dotenv()
+# 连续增量的最大个数，达到后下一个历史版本存为完整快照
+SNAPSHOT_INTERVAL = int(os.getenv("REVISION_SNAPSHOT_INTERVAL", "20"))
+# 无条件保留的最近版本数
+KEEP_RECENT = int(os.getenv("REVISION_KEEP_RECENT", "50"))
+# 更早的版本每天保留一个，超过该天数的删除
+KEEP_DAYS = int(os.getenv("REVISION_KEEP_DAYS", "30"))
+# 版本数超过 KEEP_RECENT + COMPACT_SLACK 时才整理，避免每次保存都重写历史
+COMPACT_SLACK = 20
+
+def _encode(kind, newer, content):
+    """
+    把一个历史版本编码为存储行
+    参数：kind - 期望的类型（snapshot/delta）, newer - 较新一版的内容, content - 该版本内容
+    返回：(kind, data)，增量过大时改存快照
+    """
+    if kind == 'delta':
+        patch = make_patch(newer, content)
+        if len(patch) <= MAX_PATCH_OPS:
+            return 'delta', json.dumps(patch, ensure_ascii=False, separators=(',', ':'))
+    return 'snapshot', content
+
+def _decode(kind, data, newer):
+    """
+    由存储行和较新一版的内容还原该版本内容
+    """
+    if kind == 'snapshot':
+        return data
+    return apply_patch(newer, json.loads(data))
+
+def record_revision(c, file_id, old_content, old_updated_at, new_content):
+    """
+    文件内容被覆盖前记录旧版本（调用方负责提交事务）
+    参数：c - 游标, file_id - 文件ID, old_content - 旧内容, old_updated_at - 旧内容的保存时间, new_content - 新内容
+    返回：旧内容的版本号，内容未变化时返回None
+    """
+    old_content = old_content or ''
+    if old_content == (new_content or ''):
+        return None
+    c.execute('''
+        SELECT COALESCE(MAX(rev), 0), COALESCE(MAX(CASE WHEN kind = 'snapshot' THEN rev END), 0)
+        FROM file_revisions WHERE file_id = ?
+    ''', (file_id,))
+    last_rev, last_snapshot = c.fetchone()
+    # 最新快照之后的增量个数，即从当前内容重建最旧增量需要应用的次数
+    c.execute('SELECT COUNT(*) FROM file_revisions WHERE file_id = ? AND rev > ?', (file_id, last_snapshot))
+    chain = c.fetchone()[0]
+    kind, data = _encode('snapshot' if chain >= SNAPSHOT_INTERVAL - 1 else 'delta', new_content or '', old_content)
+    rev = last_rev + 1
+    c.execute('''
+        INSERT INTO file_revisions (file_id, rev, kind, data, hash, size, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (file_id, rev, kind, data, content_hash(old_content), len(old_content), old_updated_at))
+    # 每COMPACT_SLACK次保存最多整理一次
+    if rev % COMPACT_SLACK == 0:
+        c.execute('SELECT COUNT(*) FROM file_revisions WHERE file_id = ?', (file_id,))
+        if c.fetchone()[0] > KEEP_RECENT + COMPACT_SLACK:
+            compact_revisions(c, file_id, new_content or '')
+    return rev
+
+def compact_revisions(c, file_id, current):
+    """
+    按保留策略整理一个文件的修订历史（保留的版本号不变，增量按新的相邻关系重新生成）
+    参数：c - 游标, file_id - 文件ID, current - 当前内容
+    返回：删除的版本数
+    """
+    c.execute('SELECT rev, kind, data, hash, size, created_at FROM file_revisions WHERE file_id = ? ORDER BY rev DESC',
+              (file_id,))
+    rows = c.fetchall()
+    cutoff = (datetime.now() - timedelta(days=KEEP_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+    kept = []
+    days = set()
+    newer = current
+    for i, (rev, kind, data, rev_hash, size, created_at) in enumerate(rows):
+        newer = _decode(kind, data, newer)
+        day = (created_at or '')[:10]
+        if i < KEEP_RECENT:
+            kept.append((rev, newer, rev_hash, size, created_at))
+        elif (created_at or '') >= cutoff and day not in days:
+            days.add(day)
+            kept.append((rev, newer, rev_hash, size, created_at))
+    if len(kept) == len(rows):
+        return 0
+    c.execute('DELETE FROM file_revisions WHERE file_id = ?', (file_id,))
+    newer = current
+    chain = 0
+    for rev, content, rev_hash, size, created_at in kept:
+        kind, data = _encode('snapshot' if chain >= SNAPSHOT_INTERVAL - 1 else 'delta', newer, content)
+        chain = 0 if kind == 'snapshot' else chain + 1
+        c.execute('''
+            INSERT INTO file_revisions (file_id, rev, kind, data, hash, size, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (file_id, rev, kind, data, rev_hash, size, created_at))
+        newer = content
+    return len(rows) - len(kept)
+
+def _get_current(c, user_id, file_id):
+    """
+    获取文件当前内容与版本号
+    返回：(name, content, updated_at, 当前版本号)，文件不存在或无权限时返回None
+    """
+    c.execute("SELECT name, content, updated_at, content_z FROM files WHERE id = ? AND uid = ? AND is_dir = 0", (file_id, user_id))
+    row = c.fetchone()
+    if not row:
+        return None
+    c.execute('SELECT COALESCE(MAX(rev), 0) + 1 FROM file_revisions WHERE file_id = ?', (file_id,))
+    return row[0], unpack(row[1], row[3]) or '', row[2], c.fetchone()[0]
+
+def _rebuild(c, file_id, rev, current):
+    """
+    重建指定历史版本：从不早于它的最近快照（没有则从当前内容）开始依次应用反向增量
+    返回：(内容, 保存时间)，版本不存在时返回None
+    """
+    c.execute('''
+        SELECT rev, kind, data, created_at FROM file_revisions
+        WHERE file_id = ? AND rev >= ?
+          AND rev <= COALESCE((SELECT MIN(rev) FROM file_revisions WHERE file_id = ? AND kind = 'snapshot' AND rev >= ?), rev)
+        ORDER BY rev DESC
+    ''', (file_id, rev, file_id, rev))
+    rows = c.fetchall()
+    if not rows or rows[-1][0] != rev:
+        return None
+    content = current
+    for _, kind, data, _ in rows:
+        content = _decode(kind, data, content)
+    return content, rows[-1][3]
+
+def _load_version(c, user_id, file_id, rev):
+    """
+    获取文件任一版本（rev为None表示当前版本）
+    返回：{rev, hash, content, created_at, current}，不存在时返回None
+    """
+    current = _get_current(c, user_id, file_id)
+    if not current:
+        return None
+    name, content, updated_at, current_rev = current
+    if rev is None or rev == current_rev:
+        return {"rev": current_rev, "name": name, "content": content, "hash": content_hash(content),
+                "created_at": updated_at, "current": True}
+    version = _rebuild(c, file_id, rev, content)
+    if not version:
+        return None
+    return {"rev": rev, "name": name, "content": version[0], "hash": content_hash(version[0]),
+            "created_at": version[1], "current": False}
+
+@cached('files')
+def list_revisions(user_id, file_id, limit=None, cursor=None):
+    """
+    获取文件的修订列表（按版本号从新到旧，keyset分页）
+    参数：user_id - 用户ID（users.id）, file_id - 文件ID, limit - 每页条数（None表示不分页）, cursor - 游标
+    返回：(当前版本信息, 历史版本列表, next_cursor)，文件不存在或无权限时返回None
+    """
+    after = decode_cursor(cursor, 1)
+    conn = get_conn()
+    c = conn.cursor()
+    current = _get_current(c, user_id, file_id)
+    if not current:
+        conn.close()
+        return None
+    sql = 'SELECT rev, kind, hash, size, created_at FROM file_revisions WHERE file_id = ?'
+    params = [file_id]
+    if after:
+        sql += ' AND rev < ?'
+        params.append(after[0])
+    sql += ' ORDER BY rev DESC'
+    rows, next_cursor = fetch_page(c, sql, params, limit, lambda row: (row[0],))
+    conn.close()
+    _, content, updated_at, current_rev = current
+    head = {"rev": current_rev, "hash": content_hash(content), "size": len(content), "created_at": updated_at}
+    revisions = [
+        {"rev": row[0], "kind": row[1], "hash": row[2], "size": row[3], "created_at": row[4]}
+        for row in rows
+    ]
+    return head, revisions, next_cursor
+
+@cached('files')
+def get_revision(user_id, file_id, rev=None):
+    """
+    获取文件的任一版本内容
+    参数：user_id - 用户ID（users.id）, file_id - 文件ID, rev - 版本号（None表示当前版本）
+    返回：{rev, name, content, hash, created_at, current}，不存在时返回None
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    version = _load_version(c, user_id, file_id, rev)
+    conn.close()
+    return version
+
+def diff_revisions(user_id, file_id, from_rev, to_rev=None):
+    """
+    对比文件的两个版本
+    参数：user_id - 用户ID（users.id）, file_id - 文件ID, from_rev - 旧版本号, to_rev - 新版本号（None表示当前版本）
+    返回：{from, to, diff（unified diff文本）}，任一版本不存在时返回None
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    old = _load_version(c, user_id, file_id, from_rev)
+    new = _load_version(c, user_id, file_id, to_rev) if old else None
+    conn.close()
+    if not new:
+        return None
+    diff = difflib.unified_diff(
+        old['content'].splitlines(keepends=True), new['content'].splitlines(keepends=True),
+        fromfile=f"{old['name']}@{old['rev']}", tofile=f"{new['name']}@{new['rev']}"
+    )
+    return {"from": old['rev'], "to": new['rev'], "diff": ''.join(diff)}
@@ -2,322 +2,394 @@
 文件名：roadmap_service.py
 功能：提供学习路径（Roadmap）相关的数据库操作，包括主节点、分支节点的增删改查、进度统计、搜索等
 主要内容：
-    - Roadmap主节点/分支节点表的初始化
     - 主节点/分支节点的增删改查
+    - 主节点的间隔排序与移动
     - Roadmap进度统计
-    - Roadmap节点搜索
+    - Roadmap节点搜索（游标分页）
 """
-import sqlite3
 from datetime import datetime
 from dotenv import load_dotenv
 import os
+from backend.services.db_service import get_conn
+from backend.services.cache_service import cached, invalidate
+from backend.services.pagination_service import decode_cursor, fetch_page
+from backend.services.log_service import get_logger
 
 load_dotenv()
 db_path = os.getenv("DATABASE_URL", "levelup.db")
+logger = get_logger('roadmap')
 
-def get_conn():
-    """
-    获取数据库连接
-    返回：sqlite3.Connection 对象
-    """
-    return sqlite3.connect(db_path, timeout=10)
+# 主节点node_order的间隔，插入时取前后节点的中间值
+ORDER_GAP = 1024
 
-def init_roadmap_db():
+def _build_roadmap_tree(mains, branches):
     """
-    初始化Roadmap主节点和分支节点表
+    单次遍历将主节点和分支节点组装为嵌套结构
+    参数：mains - 主节点行列表（已排序）, branches - 分支节点行列表
+    返回：主节点及其分支节点的嵌套列表
     """
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS roadmap_main_nodes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            target_id TEXT NOT NULL,
-            title TEXT NOT NULL,
-            status TEXT DEFAULT '',
-            remark TEXT DEFAULT '',
-            created_at TEXT,
-            updated_at TEXT
-        )
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS roadmap_branch_nodes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            main_id TEXT NOT NULL,
-            user_id TEXT NOT NULL,
-            target_id TEXT NOT NULL,
-            title TEXT NOT NULL,
-            status TEXT DEFAULT '',
-            remark TEXT DEFAULT '',
-            created_at TEXT,
-            updated_at TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    result = []
+    children_by_main = {}
+    for main in mains:
+        children = []
+        children_by_main[str(main[0])] = children
+        result.append({
+            'id': main[0],
+            'title': main[3],
+            'status': main[4],
+            'remark': main[5],
+            'children': children
+        })
+    for b in branches:
+        children = children_by_main.get(str(b[1]))
+        if children is not None:
+            children.append({
+                'id': b[0],
+                'title': b[4],
+                'status': b[5],
+                'remark': b[6]
+            })
+    return result
 
-def get_roadmap(user_id, target_id):
+def _fetch_roadmap(c, user_id, target_id):
     """
-    获取指定用户、指定目标的Roadmap结构（主节点及其分支节点）
-    参数：user_id - 用户ID, target_id - 目标ID
+    用固定两次查询取出主节点和分支节点并组装（没有主节点时自动插入一个）
+    参数：c - 游标, user_id - 用户ID（users.id）, target_id - 目标ID
     返回：主节点及其分支节点的嵌套列表
     """
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute('SELECT * FROM roadmap_main_nodes WHERE user_id=? AND target_id=? ORDER BY node_order ASC', (user_id, target_id))
+    c.execute('SELECT * FROM roadmap_main_nodes WHERE uid=? AND target_id=? ORDER BY node_order ASC, id ASC', (user_id, target_id))
     mains = c.fetchall()
     # 如果没有主节点，自动插入一个
     if not mains:
         now = datetime.now().isoformat()
         c.execute('''
-            INSERT INTO roadmap_main_nodes (user_id, target_id, title, status, remark, created_at, updated_at)
-            VALUES (?, ?, ?, 'todo', '', ?, ?)
-        ''', (user_id, target_id, '第一个技能点', now, now))
-        conn.commit()
-        c.execute('SELECT * FROM roadmap_main_nodes WHERE user_id=? AND target_id=?', (user_id, target_id))
+            INSERT INTO roadmap_main_nodes (user_id, uid, target_id, title, status, remark, created_at, updated_at, node_order)
+            VALUES ('', ?, ?, ?, 'todo', '', ?, ?, ?)
+        ''', (user_id, target_id, '第一个技能点', now, now, ORDER_GAP))
+        c.connection.commit()
+        c.execute('SELECT * FROM roadmap_main_nodes WHERE uid=? AND target_id=?', (user_id, target_id))
         mains = c.fetchall()
-    result = []
-    for main in mains:
-        main_id = main[0]
-        c.execute('SELECT * FROM roadmap_branch_nodes WHERE main_id=? AND target_id=?', (main_id, target_id))
-        branches = c.fetchall()
-        result.append({
-            'id': main[0],
-            'title': main[3],
-            'status': main[4],
-            'remark': main[5],
-            'children': [
-                {
-                    'id': b[0],
-                    'title': b[4],
-                    'status': b[5],
-                    'remark': b[6]
-                } for b in branches
-            ]
-        })
+    # 一次取出该目标下的全部分支节点，避免每个主节点一次查询（N+1）
+    c.execute('SELECT * FROM roadmap_branch_nodes WHERE uid=? AND target_id=? ORDER BY id', (user_id, target_id))
+    branches = c.fetchall()
+    return _build_roadmap_tree(mains, branches)
+
+@cached('roadmap')
+def get_roadmap(user_id, target_id):
+    """
+    获取指定用户、指定目标的Roadmap结构（主节点及其分支节点）
+    参数：user_id - 用户ID（users.id）, target_id - 目标ID
+    返回：主节点及其分支节点的嵌套列表
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    result = _fetch_roadmap(c, user_id, target_id)
     conn.close()
     return result
 
+@cached('roadmap', 'targets')
+def get_roadmap_with_title(user_id, target_id):
+    """
+    获取Roadmap结构及目标名（同一连接，固定3次查询）
+    参数：user_id - 用户ID（users.id）, target_id - 目标ID
+    返回：(主节点及其分支节点的嵌套列表, 目标名)
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute('SELECT title FROM targets WHERE id=?', (target_id,))
+    row = c.fetchone()
+    target_title = row[0] if row else '未命名目标'
+    result = _fetch_roadmap(c, user_id, target_id)
+    conn.close()
+    return result, target_title
+
+def _progress_ratio(done, total):
+    """
+    计算完成率（0~1，保留4位小数）
+    """
+    if not total:
+        return 0
+    return round(done / total, 4)
+
 def get_roadmap_progress(user_id, target_id):
     """
     获取指定目标的Roadmap分支节点学习进度（已完成/总数）
-    参数：user_id - 用户ID, target_id - 目标ID
+    计数由roadmap_branch_nodes上的触发器维护在target_progress表中，这里只做一次主键读取
+    参数：user_id - 用户ID（users.id）, target_id - 目标ID
     返回：分支节点学习率（0~1浮点数）
     """
     conn = get_conn()
     c = conn.cursor()
-    c.execute('SELECT COUNT(*) FROM roadmap_branch_nodes WHERE user_id=? AND target_id=?', (user_id, target_id))
-    total = c.fetchone()[0]
-    c.execute("SELECT COUNT(*) FROM roadmap_branch_nodes WHERE user_id=? AND target_id=? AND status='done'", (user_id, target_id))
-    done = c.fetchone()[0]
+    c.execute('SELECT done_count, total_count FROM target_progress WHERE target_id=? AND user_id=?', (str(target_id), user_id))
+    row = c.fetchone()
     conn.close()
-    if total == 0:
+    if not row:
         return 0
-    return round(done / total, 4)
+    return _progress_ratio(row[0], row[1])
+
+@cached('targets', 'roadmap')
+def get_targets_progress(user_id):
+    """
+    批量获取用户所有学习目标的Roadmap进度（单次查询）
+    参数：user_id - 用户ID（users.id）
+    返回：{目标ID: 分支节点学习率}
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute('''
+        SELECT t.id, p.done_count, p.total_count
+        FROM targets t
+        LEFT JOIN target_progress p ON p.target_id = CAST(t.id AS TEXT) AND p.user_id = CAST(t.uid AS TEXT)
+        WHERE t.uid=?
+    ''', (user_id,))
+    result = {row[0]: _progress_ratio(row[1], row[2]) for row in c.fetchall()}
+    conn.close()
+    return result
+
+def _rebalance_main_orders(c, user_id, target_id):
+    """
+    将某目标下主节点的node_order重新按ORDER_GAP等距排列（仅在相邻节点间无空隙时触发）
+    参数：c - 游标, user_id - 用户ID（users.id）, target_id - 目标ID
+    """
+    c.execute('''
+        WITH ranked AS (
+            SELECT id, ROW_NUMBER() OVER (ORDER BY node_order, id) AS rn
+            FROM roadmap_main_nodes WHERE uid=? AND target_id=?
+        )
+        UPDATE roadmap_main_nodes SET node_order = (SELECT rn FROM ranked WHERE ranked.id = roadmap_main_nodes.id) * ?
+        WHERE uid=? AND target_id=?
+    ''', (user_id, target_id, ORDER_GAP, user_id, target_id))
+
+def _order_after(c, user_id, target_id, after_id, exclude_id=None):
+    """
+    计算插入到after_id之后的node_order：取前后两个节点的中间值，无空隙时先重排再计算
+    参数：c - 游标, user_id - 用户ID（users.id）, target_id - 目标ID,
+          after_id - 前一个主节点ID（为空或不存在时插到最前）, exclude_id - 计算时忽略的节点（移动自身时使用）
+    返回：新的node_order
+    """
+    for _ in range(2):
+        prev_order = None
+        if after_id not in (None, 'null', ''):
+            c.execute('SELECT node_order FROM roadmap_main_nodes WHERE id=? AND uid=? AND target_id=?', (after_id, user_id, target_id))
+            row = c.fetchone()
+            prev_order = row[0] if row else None
+        if prev_order is None:
+            c.execute('SELECT MIN(node_order) FROM roadmap_main_nodes WHERE uid=? AND target_id=? AND id IS NOT ?', (user_id, target_id, exclude_id))
+            next_order = c.fetchone()[0]
+            return ORDER_GAP if next_order is None else next_order - ORDER_GAP
+        c.execute('SELECT MIN(node_order) FROM roadmap_main_nodes WHERE uid=? AND target_id=? AND node_order > ? AND id IS NOT ?', (user_id, target_id, prev_order, exclude_id))
+        next_order = c.fetchone()[0]
+        if next_order is None:
+            return prev_order + ORDER_GAP
+        if next_order - prev_order >= 2:
+            return (prev_order + next_order) // 2
+        _rebalance_main_orders(c, user_id, target_id)
+    return prev_order + 1
 
 def add_main_node(user_id, target_id, title):
     """
     新增主节点（追加到末尾）
-    参数：user_id - 用户ID, target_id - 目标ID, title - 节点标题
+    参数：user_id - 用户ID（users.id）, target_id - 目标ID, title - 节点标题
     返回：True
     """
     conn = get_conn()
     c = conn.cursor()
     now = datetime.now().isoformat()
+    c.execute('SELECT MAX(node_order) FROM roadmap_main_nodes WHERE uid=? AND target_id=?', (user_id, target_id))
+    row = c.fetchone()
+    insert_order = (row[0] or 0) + ORDER_GAP
     c.execute('''
-        INSERT INTO roadmap_main_nodes (user_id, target_id, title, status, remark, created_at, updated_at)
-        VALUES (?, ?, ?, 'todo', '', ?, ?)
-    ''', (user_id, target_id, title, now, now))
+        INSERT INTO roadmap_main_nodes (user_id, uid, target_id, title, status, remark, created_at, updated_at, node_order)
+        VALUES ('', ?, ?, ?, 'todo', '', ?, ?, ?)
+    ''', (user_id, target_id, title, now, now, insert_order))
     conn.commit()
+    invalidate(user_id, 'roadmap')
     conn.close()
     return True
 
 def add_main_node_at(user_id, target_id, title, insert_after_id=None):
     """
     在指定主节点后插入新主节点（带顺序）
-    参数：user_id - 用户ID, target_id - 目标ID, title - 节点标题, insert_after_id - 插入位置的主节点ID
+    node_order之间保留间隔，插入只写新行，不再移动后续节点
+    参数：user_id - 用户ID（users.id）, target_id - 目标ID, title - 节点标题, insert_after_id - 插入位置的主节点ID
     返回：True
     """
+    # 兼容前端传递字符串 'null' 的情况
+    if insert_after_id in (None, 'null', ''):
+        logger.debug('append main node', extra={"fields": {"target_id": target_id, "title": title}})
+        return add_main_node(user_id, target_id, title)
     conn = get_conn()
     c = conn.cursor()
     now = datetime.now().isoformat()
-    # 兼容前端传递字符串 'null' 的情况
-    if insert_after_id in (None, 'null', ''):
-        c.execute('SELECT MAX(node_order) FROM roadmap_main_nodes WHERE user_id=? AND target_id=?', (user_id, target_id))
-        row = c.fetchone()
-        insert_order = (row[0] or 0) + 1
-        print(f"[DEBUG] 追加主节点: title={title}, insert_after_id={insert_after_id}, insert_order={insert_order}")
-    else:
-        c.execute('SELECT node_order FROM roadmap_main_nodes WHERE id=?', (insert_after_id,))
-        row = c.fetchone()
-        if row:
-            insert_order = row[0] + 1
-        else:
-            insert_order = 0
-        print(f"[DEBUG] 插入主节点: title={title}, insert_after_id={insert_after_id}, insert_order={insert_order}")
-    # 所有 >= insert_order 的 node_order +1
-    c.execute('UPDATE roadmap_main_nodes SET node_order = node_order + 1 WHERE user_id=? AND target_id=? AND node_order >= ?', (user_id, target_id, insert_order))
-    # 插入新节点
+    insert_order = _order_after(c, user_id, target_id, insert_after_id)
+    logger.debug('insert main node', extra={"fields": {"target_id": target_id, "title": title,
+                                                       "insert_after_id": insert_after_id, "node_order": insert_order}})
     c.execute('''
-        INSERT INTO roadmap_main_nodes (user_id, target_id, title, status, remark, created_at, updated_at, node_order)
-        VALUES (?, ?, ?, 'todo', '', ?, ?, ?)
+        INSERT INTO roadmap_main_nodes (user_id, uid, target_id, title, status, remark, created_at, updated_at, node_order)
+        VALUES ('', ?, ?, ?, 'todo', '', ?, ?, ?)
     ''', (user_id, target_id, title, now, now, insert_order))
     conn.commit()
+    invalidate(user_id, 'roadmap')
+    conn.close()
+    return True
+
+def move_main_node(node_id, user_id, target_id, after_id=None):
+    """
+    移动主节点到指定主节点之后（after_id为空时移到最前），只更新被移动的一行
+    参数：node_id - 主节点ID, user_id - 用户ID（users.id）, target_id - 目标ID, after_id - 前一个主节点ID
+    返回：True/False（节点不存在时为False）
+    异常：ValueError - after_id不是该目标下的其他主节点
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute('SELECT id FROM roadmap_main_nodes WHERE id=? AND uid=? AND target_id=?', (node_id, user_id, target_id))
+    if not c.fetchone():
+        conn.close()
+        return False
+    if after_id not in (None, 'null', ''):
+        c.execute('SELECT id FROM roadmap_main_nodes WHERE id=? AND uid=? AND target_id=?', (after_id, user_id, target_id))
+        if not c.fetchone() or str(after_id) == str(node_id):
+            conn.close()
+            raise ValueError('after_id不是该目标下的其他技能点')
+    new_order = _order_after(c, user_id, target_id, after_id, exclude_id=node_id)
+    now = datetime.now().isoformat()
+    c.execute('UPDATE roadmap_main_nodes SET node_order=?, updated_at=? WHERE id=?', (new_order, now, node_id))
+    conn.commit()
+    invalidate(user_id, 'roadmap')
     conn.close()
     return True
 
 def add_branch_node(main_id, target_id, title, user_id):
     """
     新增分支节点
-    参数：main_id - 主节点ID, target_id - 目标ID, title - 节点标题, user_id - 用户ID
+    参数：main_id - 主节点ID, target_id - 目标ID, title - 节点标题, user_id - 用户ID（users.id）
     返回：True
     """
-    print(f"[DEBUG] add_branch_node 插入: main_id={main_id}, user_id={user_id}, target_id={target_id}, title={title}")
+    logger.debug('add branch node', extra={"fields": {"main_id": main_id, "user_id": user_id, "target_id": target_id,
+                                                      "title": title}})
     conn = get_conn()
     c = conn.cursor()
     now = datetime.now().isoformat()
     c.execute('''
-        INSERT INTO roadmap_branch_nodes (main_id, user_id, target_id, title, status, remark, created_at, updated_at)
-        VALUES (?, ?, ?, ?, 'todo', '', ?, ?)
+        INSERT INTO roadmap_branch_nodes (main_id, user_id, uid, target_id, title, status, remark, created_at, updated_at)
+        VALUES (?, '', ?, ?, ?, 'todo', '', ?, ?)
     ''', (main_id, user_id, target_id, title, now, now))
     conn.commit()
+    invalidate(user_id, 'roadmap')
     conn.close()
     return True
 
-def update_main_node(node_id, title, status, remark, target_id):
+def update_main_node(node_id, title, status, remark, target_id, user_id):
     """
     更新主节点信息
-    参数：node_id - 主节点ID, title - 标题, status - 状态, remark - 备注, target_id - 目标ID
-    返回：True
+    参数：node_id - 主节点ID, title - 标题, status - 状态, remark - 备注, target_id - 目标ID, user_id - 用户ID（users.id）
+    返回：True/False（节点不存在或不属于该用户时为False）
     """
     conn = get_conn()
     c = conn.cursor()
     now = datetime.now().isoformat()
     c.execute('''
-        UPDATE roadmap_main_nodes SET title=?, status=?, remark=?, updated_at=? WHERE id=? AND target_id=?
-    ''', (title, status, remark, now, node_id, target_id))
+        UPDATE roadmap_main_nodes SET title=?, status=?, remark=?, updated_at=? WHERE id=? AND uid=? AND target_id=?
+    ''', (title, status, remark, now, node_id, user_id, target_id))
+    updated = c.rowcount > 0
     conn.commit()
+    invalidate(user_id, 'roadmap')
     conn.close()
-    return True
+    return updated
 
-def update_branch_node(node_id, title, status, remark, target_id):
+def update_branch_node(node_id, title, status, remark, target_id, user_id):
     """
     更新分支节点信息
-    参数：node_id - 分支节点ID, title - 标题, status - 状态, remark - 备注, target_id - 目标ID
-    返回：True
+    参数：node_id - 分支节点ID, title - 标题, status - 状态, remark - 备注, target_id - 目标ID, user_id - 用户ID（users.id）
+    返回：True/False（节点不存在或不属于该用户时为False）
     """
     conn = get_conn()
     c = conn.cursor()
     now = datetime.now().isoformat()
     c.execute('''
-        UPDATE roadmap_branch_nodes SET title=?, status=?, remark=?, updated_at=? WHERE id=? AND target_id=?
-    ''', (title, status, remark, now, node_id, target_id))
+        UPDATE roadmap_branch_nodes SET title=?, status=?, remark=?, updated_at=? WHERE id=? AND uid=? AND target_id=?
+    ''', (title, status, remark, now, node_id, user_id, target_id))
+    updated = c.rowcount > 0
     conn.commit()
+    invalidate(user_id, 'roadmap')
     conn.close()
-    return True
+    return updated
 
-def delete_main_node(node_id, target_id):
+def delete_main_node(node_id, target_id, user_id):
     """
-    删除主节点及其所有分支节点，并删除相关md文件
-    参数：node_id - 主节点ID, target_id - 目标ID
-    返回：True
+    删除主节点及其所有分支节点，并删除相关md文件（均限定为该用户的数据）
+    参数：node_id - 主节点ID, target_id - 目标ID, user_id - 用户ID（users.id）
+    返回：True/False（节点不存在或不属于该用户时为False）
     """
     conn = get_conn()
     c = conn.cursor()
-    # 查找所有分支节点id
-    c.execute('SELECT id FROM roadmap_branch_nodes WHERE main_id=? AND target_id=?', (node_id, target_id))
-    branch_ids = [row[0] for row in c.fetchall()]
+    c.execute('SELECT id FROM roadmap_main_nodes WHERE id=? AND uid=? AND target_id=?', (node_id, user_id, target_id))
+    if not c.fetchone():
+        conn.close()
+        return False
+    # 删除关联到该主节点或其分支节点的md文件（files.main_id/branch_id为带索引的生成列）
+    c.execute('DELETE FROM files WHERE uid=? AND main_id=?', (user_id, str(node_id)))
+    c.execute('''
+        DELETE FROM files WHERE uid=? AND branch_id IN (
+            SELECT CAST(id AS TEXT) FROM roadmap_branch_nodes WHERE uid=? AND main_id=? AND target_id=?
+        )
+    ''', (user_id, user_id, node_id, target_id))
     # 删除分支节点
-    c.execute('DELETE FROM roadmap_branch_nodes WHERE main_id=? AND target_id=?', (node_id, target_id))
+    c.execute('DELETE FROM roadmap_branch_nodes WHERE uid=? AND main_id=? AND target_id=?', (user_id, node_id, target_id))
     # 删除主节点
-    c.execute('DELETE FROM roadmap_main_nodes WHERE id=? AND target_id=?', (node_id, target_id))
-    # 删除 files 表中 mainId=该主节点id 的文件
-    import json
-    c.execute('SELECT id, tags FROM files')
-    files = c.fetchall()
-    files_to_delete = []
-    for file_id, tags in files:
-        try:
-            t = json.loads(tags) if tags else {}
-            if str(t.get('mainId')) == str(node_id):
-                files_to_delete.append(file_id)
-            elif 'branchId' in t and str(t['branchId']) in [str(bid) for bid in branch_ids]:
-                files_to_delete.append(file_id)
-        except Exception:
-            continue
-    for file_id in files_to_delete:
-        c.execute('DELETE FROM files WHERE id=?', (file_id,))
+    c.execute('DELETE FROM roadmap_main_nodes WHERE id=? AND uid=?', (node_id, user_id))
     conn.commit()
-    # 打印表内容（调试用）
-    print("==== roadmap_main_nodes ====")
-    for row in c.execute('SELECT * FROM roadmap_main_nodes'):
-        print(row)
-    print("==== roadmap_branch_nodes ====")
-    for row in c.execute('SELECT * FROM roadmap_branch_nodes'):
-        print(row)
-    print("==== files ====")
-    for row in c.execute('SELECT id, name, tags FROM files'):
-        print(row)
+    invalidate(user_id, 'roadmap', 'files')
     conn.close()
     return True
 
-def delete_branch_node(node_id, target_id):
+def delete_branch_node(node_id, target_id, user_id):
     """
-    删除分支节点，并删除相关md文件
-    参数：node_id - 分支节点ID, target_id - 目标ID
-    返回：True
+    删除分支节点，并删除相关md文件（均限定为该用户的数据）
+    参数：node_id - 分支节点ID, target_id - 目标ID, user_id - 用户ID（users.id）
+    返回：True/False（节点不存在或不属于该用户时为False）
     """
     conn = get_conn()
     c = conn.cursor()
     # 删除分支节点
-    c.execute('DELETE FROM roadmap_branch_nodes WHERE id=? AND target_id=?', (node_id, target_id))
+    c.execute('DELETE FROM roadmap_branch_nodes WHERE id=? AND uid=? AND target_id=?', (node_id, user_id, target_id))
+    if c.rowcount == 0:
+        conn.rollback()
+        conn.close()
+        return False
     # 删除 files 表中 branchId=该分支节点id 的文件
-    import json
-    c.execute('SELECT id, tags FROM files')
-    files = c.fetchall()
-    files_to_delete = []
-    for file_id, tags in files:
-        try:
-            t = json.loads(tags) if tags else {}
-            if str(t.get('branchId')) == str(node_id):
-                files_to_delete.append(file_id)
-        except Exception:
-            continue
-    for file_id in files_to_delete:
-        c.execute('DELETE FROM files WHERE id=?', (file_id,))
+    c.execute('DELETE FROM files WHERE uid=? AND branch_id=?', (user_id, str(node_id)))
     conn.commit()
-    # 打印表内容（调试用）
-    print("==== roadmap_main_nodes ====")
-    for row in c.execute('SELECT * FROM roadmap_main_nodes'):
-        print(row)
-    print("==== roadmap_branch_nodes ====")
-    for row in c.execute('SELECT * FROM roadmap_branch_nodes'):
-        print(row)
-    print("==== files ====")
-    for row in c.execute('SELECT id, name, tags FROM files'):
-        print(row)
+    invalidate(user_id, 'roadmap', 'files')
     conn.close()
     return True
 
-def search_roadmap_nodes(keyword, user_id):
+def search_roadmap_nodes(keyword, user_id, limit=None, cursor=None):
     """
-    搜索Roadmap主节点和分支节点（标题模糊匹配）
-    参数：keyword - 关键词, user_id - 用户ID
-    返回：节点字典列表（含主/分类型）
+    搜索Roadmap主节点和分支节点（标题模糊匹配），主节点在前、各自按id排序（keyset分页）
+    参数：keyword - 关键词, user_id - 用户ID（users.id）, limit - 每页条数（None表示不分页）, cursor - 上一页返回的next_cursor
+    返回：(节点字典列表（含主/分类型）, next_cursor)
     """
+    after = decode_cursor(cursor, 2)
+    pattern = f'%{keyword}%'
+    sql = '''
+        SELECT kind, id, title, target_id FROM (
+            SELECT 0 AS kind, id, title, target_id FROM roadmap_main_nodes WHERE uid=? AND title LIKE ?
+            UNION ALL
+            SELECT 1 AS kind, id, title, target_id FROM roadmap_branch_nodes WHERE uid=? AND title LIKE ?
+        )
+    '''
+    params = [user_id, pattern, user_id, pattern]
+    if after:
+        sql += ' WHERE (kind, id) > (?, ?)'
+        params += after
+    sql += ' ORDER BY kind, id'
     conn = get_conn()
     c = conn.cursor()
-    # 搜索主节点
-    c.execute("SELECT id, title, target_id FROM roadmap_main_nodes WHERE user_id=? AND title LIKE ?", (user_id, f'%{keyword}%'))
-    main_nodes = [
-        {"id": row[0], "title": row[1], "target_id": row[2], "node_type": "main"}
-        for row in c.fetchall()
-    ]
-    # 搜索分支节点
-    c.execute("SELECT id, title, target_id FROM roadmap_branch_nodes WHERE user_id=? AND title LIKE ?", (user_id, f'%{keyword}%'))
-    branch_nodes = [
-        {"id": row[0], "title": row[1], "target_id": row[2], "node_type": "branch"}
-        for row in c.fetchall()
-    ]
+    rows, next_cursor = fetch_page(c, sql, params, limit, lambda row: (row[0], row[1]))
     conn.close()
-    return main_nodes + branch_nodes
+    nodes = [
+        {"id": row[1], "title": row[2], "target_id": row[3], "node_type": "branch" if row[0] else "main"}
+        for row in rows
+    ]
+    return nodes, next_cursor
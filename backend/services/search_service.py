@@ -0,0 +1,182 @@
+"""
+文件名：search_service.py
+功能：基于SQLite FTS5的统一全文检索，覆盖笔记、学习目标和roadmap节点
+主要内容：
+    - 查询语句转义与构造
+    - bm25排序、高亮标题与正文摘要
+    - 短关键词（不足3个字符，trigram无法匹配）：与长词组合时作为MATCH结果上的子串过滤，仅全部为短词时回退为子串检索
+    - 按实体类型分组返回，按相关度游标分页
+    - 压缩存储笔记的索引正文维护（触发器只能索引未压缩的原文）
+"""
+import html
+import re
+from backend.services.db_service import get_conn
+from backend.services.pagination_service import decode_cursor, fetch_page
+from backend.services.migration_service import SEARCH_TYPE_CODES
+
+SEARCH_TYPES = ('file', 'target', 'main', 'branch')
+HIGHLIGHT_OPEN = '<mark>'
+HIGHLIGHT_CLOSE = '</mark>'
+# 高亮先用私有区字符占位，转义HTML后再替换为标签，避免笔记内容中的HTML原样返回给前端
+MARK_OPEN = '\ue000'
+MARK_CLOSE = '\ue001'
+SNIPPET_CHARS = 32
+# trigram分词器要求每个检索词至少3个字符
+MIN_TERM_CHARS = 3
+
+def _split_terms(query):
+    """
+    将用户输入按空白拆分为检索词
+    """
+    return [t for t in re.split(r'\s+', query.strip()) if t]
+
+def _fts_query(terms):
+    """
+    构造FTS5 MATCH表达式：每个词作为短语加双引号，多个词之间为AND
+    """
+    return ' '.join('"' + t.replace('"', '""') + '"' for t in terms)
+
+def _render(marked):
+    """
+    转义HTML，并将占位标记替换为高亮标签
+    """
+    if not marked:
+        return ''
+    return html.escape(marked).replace(MARK_OPEN, HIGHLIGHT_OPEN).replace(MARK_CLOSE, HIGHLIGHT_CLOSE)
+
+def _highlight(text, terms):
+    """
+    在Python中为回退检索结果加高亮标记（返回已转义的HTML）
+    """
+    if not text:
+        return ''
+    text = text.replace(MARK_OPEN, '').replace(MARK_CLOSE, '')
+    pattern = re.compile('|'.join(re.escape(t) for t in terms), re.IGNORECASE)
+    return _render(pattern.sub(lambda m: MARK_OPEN + m.group(0) + MARK_CLOSE, text))
+
+def _snippet(text, terms):
+    """
+    截取第一个命中词附近的正文片段并高亮（返回已转义的HTML）
+    """
+    if not text:
+        return ''
+    lower = text.lower()
+    hits = [lower.find(t.lower()) for t in terms]
+    hits = [h for h in hits if h >= 0]
+    start = max(min(hits) - SNIPPET_CHARS // 2, 0) if hits else 0
+    end = start + SNIPPET_CHARS * 2
+    piece = text[start:end]
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if end < len(text) else ''
+    return prefix + _highlight(piece, terms) + suffix
+
+def _type_filter(types):
+    """
+    构造实体类型过滤条件
+    """
+    types = [t for t in (types or SEARCH_TYPES) if t in SEARCH_TYPES]
+    if not types:
+        types = list(SEARCH_TYPES)
+    return f"entity_type IN ({', '.join('?' for _ in types)})", types
+
+def _row_to_hit(row):
+    """
+    检索结果行转换为字典
+    """
+    entity_type, entity_id, ref, title, snippet, score = row
+    hit = {'id': entity_id, 'title': title, 'snippet': snippet, 'score': score}
+    if entity_type == 'file':
+        hit['tags'] = ref
+    elif entity_type in ('main', 'branch'):
+        hit['target_id'] = ref
+    return hit
+
+def search_all(user_id, query, types=None, limit=50, cursor=None):
+    """
+    统一全文检索
+    参数：user_id - 用户ID, query - 关键词（空格分隔多个词，需全部命中）,
+          types - 实体类型列表（file/target/main/branch，默认全部）, limit - 每页最多条数,
+          cursor - 上一页返回的next_cursor
+    返回：({实体类型: [命中字典]}（每类按相关度排序，title与snippet为已转义的HTML，命中词以<mark>标记）, next_cursor)
+    """
+    grouped = {t: [] for t in SEARCH_TYPES}
+    terms = _split_terms(query)
+    if not terms:
+        return grouped, None
+    type_sql, type_params = _type_filter(types)
+    conn = get_conn()
+    c = conn.cursor()
+    long_terms = [t for t in terms if len(t) >= MIN_TERM_CHARS]
+    short_terms = [t for t in terms if len(t) < MIN_TERM_CHARS]
+    like_sql = ' AND '.join('(title LIKE ? OR body LIKE ?)' for _ in short_terms)
+    like_params = [p for t in short_terms for p in (f'%{t}%', f'%{t}%')]
+    if long_terms:
+        # 长词走trigram索引并按bm25排序，短词只在命中行上追加子串过滤；按 (相关度, rowid) 做keyset分页
+        after = decode_cursor(cursor, 2)
+        if short_terms:
+            # FTS5只能高亮MATCH中的词，含短词时取原文在Python中统一高亮
+            text_sql = 'title, body'
+            text_params = []
+        else:
+            text_sql = "highlight(search_index, 4, ?, ?) AS title, snippet(search_index, 5, ?, ?, '…', 16) AS body"
+            text_params = [MARK_OPEN, MARK_CLOSE, MARK_OPEN, MARK_CLOSE]
+        sql = f'''
+            SELECT entity_type, entity_id, ref, title, body, score, rid FROM (
+                SELECT entity_type, entity_id, ref, {text_sql},
+                       bm25(search_index, 0, 0, 0, 0, 10.0, 1.0) AS score,
+                       rowid AS rid
+                FROM search_index
+                WHERE search_index MATCH ? AND user_id = ? AND {type_sql}{' AND ' + like_sql if like_sql else ''}
+            )
+        '''
+        params = [*text_params, _fts_query(long_terms), user_id, *type_params, *like_params]
+        if after:
+            sql += ' WHERE (score, rid) > (?, ?)'
+            params += after
+        sql += ' ORDER BY score, rid'
+        rows, next_cursor = fetch_page(c, sql, params, limit, lambda row: (row[5], row[6]))
+        if short_terms:
+            rows = [(*row[:3], _highlight(row[3], terms), _snippet(row[4], terms), row[5]) for row in rows]
+        else:
+            rows = [(*row[:3], _render(row[3]), _render(row[4]), row[5]) for row in rows]
+    else:
+        # 全部为短词时无法使用trigram索引，退化为子串匹配（仍只扫描索引表，不触及源表），按rowid倒序分页
+        after = decode_cursor(cursor, 1)
+        sql = f'''
+            SELECT entity_type, entity_id, ref, title, body, rowid
+            FROM search_index
+            WHERE user_id = ? AND {type_sql} AND {like_sql}
+        '''
+        params = [user_id, *type_params, *like_params]
+        if after:
+            sql += ' AND rowid < ?'
+            params += after
+        sql += ' ORDER BY rowid DESC'
+        rows, next_cursor = fetch_page(c, sql, params, limit, lambda row: (row[5],))
+        rows = [
+            (entity_type, entity_id, ref, _highlight(title, terms), _snippet(body, terms), None)
+            for entity_type, entity_id, ref, title, body, _ in rows
+        ]
+    conn.close()
+    for row in rows:
+        grouped[row[0]].append(_row_to_hit(row))
+    return grouped, next_cursor
+
+def index_note_body(c, file_id, content, content_z):
+    """
+    写入压缩存储笔记的全文索引正文（files上的触发器只用纯SQL，压缩的笔记只索引了标题等字段）
+    参数：c - 游标, file_id - 文件ID, content - 笔记原文, content_z - 压缩后的内容（为空时触发器已索引原文，不做处理）
+    """
+    if content_z is not None:
+        c.execute('UPDATE search_index SET body = ? WHERE rowid = ?', (content, file_id * 4 + SEARCH_TYPE_CODES['file']))
+
+def copy_note_body(c, source_id, file_id):
+    """
+    复制笔记时沿用原笔记的索引正文（压缩内容原样复制，无需解压）
+    参数：c - 游标, source_id - 原笔记ID, file_id - 新笔记ID
+    """
+    code = SEARCH_TYPE_CODES['file']
+    c.execute('''
+        UPDATE search_index SET body = (SELECT body FROM search_index WHERE rowid = ?)
+        WHERE rowid = ?
+    ''', (source_id * 4 + code, file_id * 4 + code))
@@ -2,40 +2,27 @@
 文件名：sign_in_service.py
 功能：提供用户注册、登录相关的数据库操作
 主要内容：
-    - 用户表的初始化
     - 用户注册
     - 用户登录验证
+    - 用户名到整数用户键的解析
+    - 修改用户名、密码
 """
-import sqlite3
 from dotenv import load_dotenv
 import os
+from backend.services.db_service import get_conn
+from backend.services.migration_service import user_keys_ready, backfill_user_keys_for
+from backend.services.cache_service import invalidate
 
 load_dotenv()
 db_path = os.getenv("DATABASE_URL", "levelup.db")
 
-def init_user_db():
-    """
-    初始化用户表
-    """
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
 def add_user(username, password):
     """
     新增用户（注册）
     参数：username - 用户名, password - 密码
     返回：(True/False, 信息)
     """
-    conn = sqlite3.connect(db_path)
+    conn = get_conn()
     c = conn.cursor()
     c.execute("SELECT id FROM users WHERE username=?", (username,))
     if c.fetchone():
@@ -52,7 +39,7 @@ def verify_user(username, password):
     参数：username - 用户名, password - 密码
     返回：(True/False, 信息)
     """
-    conn = sqlite3.connect(db_path)
+    conn = get_conn()
     c = conn.cursor()
     c.execute("SELECT id FROM users WHERE username=? AND password=?", (username, password))
     if c.fetchone():
@@ -62,60 +49,65 @@ def verify_user(username, password):
         conn.close()
         return False, "用户名或密码错误"
 
-def update_username(old_username, new_username):
+def get_user_key(username):
+    """
+    根据用户名获取不可变的整数用户键（users.id），业务表均以该键关联用户
+    uid在线回填尚未完成时，先同步回填该用户的数据
+    参数：username - 用户名
+    返回：users.id，用户不存在时为None
     """
-    修改用户名，并同步更新所有相关表的 user_id 字段
-    参数：old_username - 原用户名, new_username - 新用户名
+    if not username:
+        return None
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute("SELECT id FROM users WHERE username=?", (username,))
+    row = c.fetchone()
+    conn.close()
+    if not row:
+        return None
+    if not user_keys_ready():
+        backfill_user_keys_for(username, row[0])
+    return row[0]
+
+def update_username(user_id, new_username):
+    """
+    修改用户名：业务表以不可变的uid（users.id）关联用户，返回的用户名按uid关联users查出，只需更新users一行
+    同时递增该用户的数据版本号，使带用户名的响应的ETag失效
+    参数：user_id - 用户ID（users.id）, new_username - 新用户名
     返回：(True/False, 信息)
     """
-    conn = sqlite3.connect(db_path)
+    conn = get_conn()
     c = conn.cursor()
     # 检查新用户名是否已存在
     c.execute("SELECT id FROM users WHERE username=?", (new_username,))
     if c.fetchone():
         conn.close()
         return False, "新用户名已存在"
-    # 更新 users 表
-    c.execute("UPDATE users SET username=? WHERE username=?", (new_username, old_username))
-    # 同步更新所有业务表的 user_id 字段
-    c.execute("UPDATE targets SET user_id=? WHERE user_id=?", (new_username, old_username))
-    c.execute("UPDATE roadmap_main_nodes SET user_id=? WHERE user_id=?", (new_username, old_username))
-    c.execute("UPDATE roadmap_branch_nodes SET user_id=? WHERE user_id=?", (new_username, old_username))
-    c.execute("UPDATE files SET user_id=? WHERE user_id=?", (new_username, old_username))
-    c.execute("UPDATE todos SET user_id=? WHERE user_id=?", (new_username, old_username))
-    # 新增：同步更新files表tags字段内的userId
-    import json
-    c.execute("SELECT id, tags FROM files WHERE user_id=?", (new_username,))
-    files = c.fetchall()
-    for file_id, tags in files:
-        if not tags:
-            continue
-        try:
-            t = json.loads(tags)
-            if t.get('userId') == old_username:
-                t['userId'] = new_username
-                c.execute("UPDATE files SET tags=? WHERE id=?", (json.dumps(t, ensure_ascii=False), file_id))
-        except Exception:
-            continue
+    c.execute("UPDATE users SET username=? WHERE id=?", (new_username, user_id))
+    if c.rowcount == 0:
+        conn.close()
+        return False, "用户不存在"
+    c.execute("UPDATE entity_versions SET version = version + 1 WHERE uid=?", (user_id,))
     conn.commit()
+    invalidate(user_id)
     conn.close()
     return True, "用户名修改成功"
 
-def update_password(username, old_password, new_password):
+def update_password(user_id, old_password, new_password):
     """
     修改密码
-    参数：username - 用户名, old_password - 旧密码, new_password - 新密码
+    参数：user_id - 用户ID（users.id）, old_password - 旧密码, new_password - 新密码
     返回：(True/False, 信息)
     """
-    conn = sqlite3.connect(db_path)
+    conn = get_conn()
     c = conn.cursor()
     # 校验旧密码
-    c.execute("SELECT id FROM users WHERE username=? AND password=?", (username, old_password))
+    c.execute("SELECT id FROM users WHERE id=? AND password=?", (user_id, old_password))
     if not c.fetchone():
         conn.close()
         return False, "原密码错误"
     # 更新密码
-    c.execute("UPDATE users SET password=? WHERE username=?", (new_password, username))
+    c.execute("UPDATE users SET password=? WHERE id=?", (new_password, user_id))
     conn.commit()
     conn.close()
-    return True, "密码修改成功"
\ No newline at end of file
+    return True, "密码修改成功"
@@ -2,116 +2,152 @@
 文件名：target_service.py
 功能：提供学习目标相关的数据库操作，包括目标的增删改查、搜索等
 主要内容：
-    - 学习目标表的初始化
     - 学习目标的增删改查
+    - 带roadmap进度的目标列表
     - 学习目标的搜索
+    - 目标列表与搜索结果的游标分页
 """
-import sqlite3
 import os
 from datetime import datetime
 from dotenv import load_dotenv
+from backend.services.db_service import get_conn
+from backend.services.cache_service import cached, invalidate
+from backend.services.pagination_service import decode_cursor, fetch_page
+from backend.services.roadmap_service import ORDER_GAP
+from backend.services.log_service import get_logger
 
 load_dotenv()
 db_path = os.getenv("DATABASE_URL", "levelup.db")
-
-def init_target_db():
-    """
-    初始化学习目标数据库表
-    """
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    # 创建学习目标表
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS targets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            progress REAL DEFAULT 0,
-            tags TEXT,
-            update_time TEXT,
-            user_id TEXT NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
+logger = get_logger('target')
 
 def add_target(title, progress, tags, user_id):
     """
     添加新的学习目标，并自动创建初始roadmap主节点
-    参数：title-目标名, progress-进度, tags-标签列表, user_id-用户ID
+    参数：title-目标名, progress-进度, tags-标签列表, user_id-用户ID（users.id）
     返回：(True/False, 信息)
     """
     try:
-        conn = sqlite3.connect(db_path)
+        conn = get_conn()
         c = conn.cursor()
         tags_str = ','.join(tags)
         update_time = datetime.now().strftime('%Y-%m-%d')
         c.execute('''
-            INSERT INTO targets (title, progress, tags, update_time, user_id)
-            VALUES (?, ?, ?, ?, ?)
+            INSERT INTO targets (title, progress, tags, update_time, user_id, uid)
+            VALUES (?, ?, ?, ?, '', ?)
         ''', (title, progress, tags_str, update_time, user_id))
         target_id = c.lastrowid
         # 自动为新目标创建roadmap主节点
         now = datetime.now().isoformat()
         c.execute('''
-            INSERT INTO roadmap_main_nodes (user_id, target_id, title, status, remark, created_at, updated_at)
-            VALUES (?, ?, ?, 'todo', '', ?, ?)
-        ''', (user_id, target_id, '第一个技能点', now, now))
+            INSERT INTO roadmap_main_nodes (user_id, uid, target_id, title, status, remark, created_at, updated_at, node_order)
+            VALUES ('', ?, ?, ?, 'todo', '', ?, ?, ?)
+        ''', (user_id, target_id, '第一个技能点', now, now, ORDER_GAP))
         conn.commit()
+        invalidate(user_id, 'targets', 'roadmap')
         conn.close()
         return True, "添加成功"
     except Exception as e:
         return False, f"添加失败: {str(e)}"
 
+def _target_to_dict(target):
+    """
+    将targets表查询结果行转换为字典
+    """
+    return {
+        'id': target[0],
+        'title': target[1],
+        'progress': target[2],
+        'tags': target[3].split(',') if target[3] else [],
+        'update': target[4],
+        'user_id': target[5]
+    }
+
 def get_targets(user_id):
     """
-    获取指定用户的所有学习目标
-    参数：user_id-用户ID
+    获取指定用户的所有学习目标（不分页，兼容旧接口）
+    参数：user_id-用户ID（users.id）
     返回：目标字典列表
     """
+    return get_targets_page(user_id)[0]
+
+@cached('targets')
+def get_targets_page(user_id, limit=None, cursor=None):
+    """
+    分页获取指定用户的学习目标，按id排序（keyset分页）
+    参数：user_id-用户ID（users.id）, limit-每页条数（None表示不分页）, cursor-上一页返回的next_cursor
+    返回：(目标字典列表, next_cursor)
+    异常：数据库错误直接抛出（不能把空结果写入缓存）
+    """
+    after = decode_cursor(cursor, 1)
+    conn = get_conn()
+    c = conn.cursor()
+    sql = 'SELECT id, title, progress, tags, update_time, (SELECT username FROM users WHERE users.id = targets.uid) FROM targets WHERE uid = ?'
+    params = [user_id]
+    if after:
+        sql += ' AND id > ?'
+        params += after
+    sql += ' ORDER BY id'
     try:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        c.execute('SELECT * FROM targets WHERE user_id = ?', (user_id,))
-        targets = c.fetchall()
-        # 将数据库结果转换为字典列表
-        result = []
-        for target in targets:
-            result.append({
-                'id': target[0],
-                'title': target[1],
-                'progress': target[2],
-                'tags': target[3].split(',') if target[3] else [],
-                'update': target[4],
-                'user_id': target[5]
-            })
+        targets, next_cursor = fetch_page(c, sql, params, limit, lambda row: (row[0],))
+    finally:
         conn.close()
-        return result
-    except Exception as e:
-        print(f"获取学习目标失败: {str(e)}")
-        return []
+    # 将数据库结果转换为字典列表
+    return [_target_to_dict(target) for target in targets], next_cursor
+
+@cached('targets', 'roadmap')
+def get_targets_with_progress(user_id):
+    """
+    获取指定用户的所有学习目标，progress为由roadmap分支节点计算出的进度（单次查询）
+    参数：user_id-用户ID（users.id）
+    返回：目标字典列表
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute('''
+        SELECT t.id, t.title, p.done_count, p.total_count, t.tags, t.update_time, u.username
+        FROM targets t
+        JOIN users u ON u.id = t.uid
+        LEFT JOIN target_progress p ON p.target_id = CAST(t.id AS TEXT) AND p.user_id = CAST(t.uid AS TEXT)
+        WHERE t.uid = ?
+    ''', (user_id,))
+    result = []
+    for target in c.fetchall():
+        done, total = target[2] or 0, target[3] or 0
+        result.append({
+            'id': target[0],
+            'title': target[1],
+            'progress': round(done / total, 4) if total else 0,
+            'tags': target[4].split(',') if target[4] else [],
+            'update': target[5],
+            'user_id': target[6]
+        })
+    conn.close()
+    return result
 
 def update_target(target_id, title, progress, tags, user_id):
     """
     更新学习目标
-    参数：target_id-目标ID, title-目标名, progress-进度, tags-标签列表, user_id-用户ID
+    参数：target_id-目标ID, title-目标名, progress-进度, tags-标签列表, user_id-用户ID（users.id）
     返回：(True/False, 信息)
     """
     try:
-        conn = sqlite3.connect(db_path)
+        conn = get_conn()
         c = conn.cursor()
         # 确保只能更新自己的学习目标
-        c.execute('SELECT user_id FROM targets WHERE id = ?', (target_id,))
+        c.execute('SELECT uid FROM targets WHERE id = ?', (target_id,))
         result = c.fetchone()
         if not result or result[0] != user_id:
+            conn.close()
             return False, "无权更新此学习目标"
         tags_str = ','.join(tags)
         update_time = datetime.now().strftime('%Y-%m-%d')
         c.execute('''
             UPDATE targets 
             SET title = ?, progress = ?, tags = ?, update_time = ?
-            WHERE id = ? AND user_id = ?
+            WHERE id = ? AND uid = ?
         ''', (title, progress, tags_str, update_time, target_id, user_id))
         conn.commit()
+        invalidate(user_id, 'targets')
         conn.close()
         return True, "更新成功"
     except Exception as e:
@@ -120,19 +156,21 @@ def update_target(target_id, title, progress, tags, user_id):
 def delete_target(target_id, user_id):
     """
     删除学习目标
-    参数：target_id-目标ID, user_id-用户ID
+    参数：target_id-目标ID, user_id-用户ID（users.id）
     返回：(True/False, 信息)
     """
     try:
-        conn = sqlite3.connect(db_path)
+        conn = get_conn()
         c = conn.cursor()
         # 确保只能删除自己的学习目标
-        c.execute('SELECT user_id FROM targets WHERE id = ?', (target_id,))
+        c.execute('SELECT uid FROM targets WHERE id = ?', (target_id,))
         result = c.fetchone()
         if not result or result[0] != user_id:
+            conn.close()
             return False, "无权删除此学习目标"
-        c.execute('DELETE FROM targets WHERE id = ? AND user_id = ?', (target_id, user_id))
+        c.execute('DELETE FROM targets WHERE id = ? AND uid = ?', (target_id, user_id))
         conn.commit()
+        invalidate(user_id, 'targets')
         conn.close()
         return True, "删除成功"
     except Exception as e:
@@ -140,33 +178,37 @@ def delete_target(target_id, user_id):
 
 def search_targets(query, user_id):
     """
-    搜索学习目标（标题或标签模糊匹配）
-    参数：query-搜索关键词, user_id-用户ID
+    搜索学习目标（标题或标签模糊匹配，不分页，兼容旧接口）
+    参数：query-搜索关键词, user_id-用户ID（users.id）
     返回：目标字典列表
     """
+    return search_targets_page(query, user_id)[0]
+
+def search_targets_page(query, user_id, limit=None, cursor=None):
+    """
+    分页搜索学习目标（标题或标签模糊匹配），按id排序（keyset分页）
+    参数：query-搜索关键词, user_id-用户ID（users.id）, limit-每页条数（None表示不分页）, cursor-上一页返回的next_cursor
+    返回：(目标字典列表, next_cursor)
+    """
+    after = decode_cursor(cursor, 1)
     try:
-        conn = sqlite3.connect(db_path)
+        conn = get_conn()
         c = conn.cursor()
         # 在标题和标签中搜索
         search_pattern = f'%{query}%'
-        c.execute('''
-            SELECT * FROM targets 
-            WHERE user_id = ? AND (title LIKE ? OR tags LIKE ?)
-        ''', (user_id, search_pattern, search_pattern))
-        targets = c.fetchall()
-        # 将数据库结果转换为字典列表
-        result = []
-        for target in targets:
-            result.append({
-                'id': target[0],
-                'title': target[1],
-                'progress': target[2],
-                'tags': target[3].split(',') if target[3] else [],
-                'update': target[4],
-                'user_id': target[5]
-            })
+        sql = '''
+            SELECT id, title, progress, tags, update_time, (SELECT username FROM users WHERE users.id = targets.uid) FROM targets
+            WHERE uid = ? AND (title LIKE ? OR tags LIKE ?)
+        '''
+        params = [user_id, search_pattern, search_pattern]
+        if after:
+            sql += ' AND id > ?'
+            params += after
+        sql += ' ORDER BY id'
+        targets, next_cursor = fetch_page(c, sql, params, limit, lambda row: (row[0],))
         conn.close()
-        return result
-    except Exception as e:
-        print(f"搜索学习目标失败: {str(e)}")
-        return [] 
\ No newline at end of file
+        # 将数据库结果转换为字典列表
+        return [_target_to_dict(target) for target in targets], next_cursor
+    except Exception:
+        logger.exception('搜索学习目标失败')
+        return [], None
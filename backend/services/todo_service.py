@@ -2,96 +2,92 @@
 文件名：todo_service.py
 功能：提供待办事项（Todo）相关的数据库操作，包括增删改查等
 主要内容：
-    - 待办事项表的初始化
     - 待办事项的增删改查
+    - 待办事项列表的游标分页
 """
-import sqlite3
 from datetime import datetime
 from dotenv import load_dotenv
 import os
+from backend.services.db_service import get_conn
+from backend.services.cache_service import cached, invalidate
+from backend.services.pagination_service import decode_cursor, fetch_page
 
 load_dotenv()
 db_path = os.getenv("DATABASE_URL", "levelup.db")
 
-def get_conn():
+def get_todos(user_id, include_completed=True):
     """
-    获取数据库连接
-    返回：sqlite3.Connection 对象
+    获取指定用户的所有待办事项（不分页，兼容旧接口）
+    参数：user_id - 用户ID（users.id）, include_completed - 是否包含已完成事项
+    返回：待办事项字典列表
     """
-    return sqlite3.connect(db_path, timeout=10)
-
-def init_todo_db(db_path=None):
-    if db_path is None:
-        from dotenv import load_dotenv
-        import os
-        load_dotenv()
-        db_path = os.getenv("DATABASE_URL", "levelup.db")
-    conn = sqlite3.connect(db_path, timeout=10)
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS todos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id TEXT NOT NULL,
-            text TEXT NOT NULL,
-            completed INTEGER DEFAULT 0,
-            created_at TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    return get_todos_page(user_id, include_completed)[0]
 
-def get_todos(user_id):
+@cached('todos')
+def get_todos_page(user_id, include_completed=True, limit=None, cursor=None):
     """
-    获取指定用户的所有待办事项
-    参数：user_id - 用户ID
-    返回：待办事项字典列表
+    分页获取指定用户的待办事项，按id倒序（keyset分页）
+    参数：user_id - 用户ID（users.id）, include_completed - 是否包含已完成事项,
+          limit - 每页条数（None表示不分页）, cursor - 上一页返回的next_cursor
+    返回：(待办事项字典列表, next_cursor)
     """
+    after = decode_cursor(cursor, 1)
+    sql = 'SELECT id, text, completed, created_at FROM todos WHERE uid=?'
+    params = [user_id]
+    if not include_completed:
+        sql += ' AND completed=0'
+    if after:
+        sql += ' AND id < ?'
+        params += after
+    sql += ' ORDER BY id DESC'
     conn = get_conn()
     c = conn.cursor()
-    c.execute('SELECT id, text, completed, created_at FROM todos WHERE user_id=? ORDER BY id DESC', (user_id,))
-    rows = c.fetchall()
+    rows, next_cursor = fetch_page(c, sql, params, limit, lambda row: (row[0],))
     conn.close()
     return [
         {'id': row[0], 'text': row[1], 'completed': bool(row[2]), 'created_at': row[3]}
         for row in rows
-    ]
+    ], next_cursor
 
 def add_todo(user_id, text):
     """
     新增待办事项
-    参数：user_id - 用户ID, text - 事项内容
+    参数：user_id - 用户ID（users.id）, text - 事项内容
     返回：True
     """
     conn = get_conn()
     c = conn.cursor()
     now = datetime.now().isoformat()
-    c.execute('INSERT INTO todos (user_id, text, completed, created_at) VALUES (?, ?, 0, ?)', (user_id, text, now))
+    c.execute("INSERT INTO todos (user_id, uid, text, completed, created_at) VALUES ('', ?, ?, 0, ?)", (user_id, text, now))
     conn.commit()
+    invalidate(user_id, 'todos')
     conn.close()
     return True
 
 def update_todo(todo_id, completed, user_id):
     """
     更新待办事项的完成状态
-    参数：todo_id - 待办ID, completed - 是否完成, user_id - 用户ID
+    参数：todo_id - 待办ID, completed - 是否完成, user_id - 用户ID（users.id）
     返回：True
     """
     conn = get_conn()
     c = conn.cursor()
-    c.execute('UPDATE todos SET completed=? WHERE id=? AND user_id=?', (int(completed), todo_id, user_id))
+    c.execute('UPDATE todos SET completed=? WHERE id=? AND uid=?', (int(completed), todo_id, user_id))
     conn.commit()
+    invalidate(user_id, 'todos')
     conn.close()
     return True
 
 def delete_todo(todo_id, user_id):
     """
     删除待办事项
-    参数：todo_id - 待办ID, user_id - 用户ID
+    参数：todo_id - 待办ID, user_id - 用户ID（users.id）
     返回：True
     """
     conn = get_conn()
     c = conn.cursor()
-    c.execute('DELETE FROM todos WHERE id=? AND user_id=?', (todo_id, user_id))
+    c.execute('DELETE FROM todos WHERE id=? AND uid=?', (todo_id, user_id))
     conn.commit()
+    invalidate(user_id, 'todos')
     conn.close()
     return True 
\ No newline at end of file
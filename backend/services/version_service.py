@@ -0,0 +1,36 @@
+"""
+文件名：version_service.py
+功能：按用户、实体的数据版本号，用于GET接口的条件请求（ETag / 304）
+主要内容：
+    - 版本号由业务表上的触发器在每次写入时递增（见迁移9）
+    - 根据一个或多个实体的版本号生成ETag
+"""
+from backend.services.db_service import get_conn
+
+ENTITIES = ('targets', 'roadmap', 'files', 'todos')
+
+def get_versions(user_id, entities=ENTITIES):
+    """
+    获取用户各实体的当前版本号
+    参数：user_id - 用户ID（users.id）, entities - 实体名列表
+    返回：{实体名: 版本号}，从未写入过的实体为0
+    """
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute(f'''
+        SELECT entity, version FROM entity_versions
+        WHERE uid = ? AND entity IN ({', '.join('?' for _ in entities)})
+    ''', (user_id, *entities))
+    versions = dict.fromkeys(entities, 0)
+    versions.update(c.fetchall())
+    conn.close()
+    return versions
+
+def get_etag(user_id, *entities):
+    """
+    根据实体版本号生成ETag（任一实体有写入时改变）
+    参数：user_id - 用户ID（users.id）, entities - 响应内容依赖的实体名
+    返回：ETag字符串（不含引号）
+    """
+    versions = get_versions(user_id, entities)
+    return f"{user_id}-" + '.'.join(f"{entity[0]}{versions[entity]}" for entity in entities)
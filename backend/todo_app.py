@@ -5,8 +5,12 @@
     - 待办事项RESTful接口
 """
 from flask import Blueprint, request, jsonify, session
-from backend.services.todo_service import get_todos, add_todo, update_todo, delete_todo
+from backend.services.todo_service import get_todos_page, add_todo, update_todo, delete_todo
 from backend.services.sign_in_service import update_username, update_password
+from backend.auth import login_required
+from backend.services.version_service import get_etag
+from backend.http_cache import not_modified, with_etag, request_etag, with_next_cursor
+from backend.services.pagination_service import parse_page_args
 from dotenv import load_dotenv
 import os
 
@@ -17,27 +21,25 @@ load_dotenv()
 db_path = os.getenv("DATABASE_URL", "levelup.db")
 # init_todo_db(db_path)  # 已在main_app.py统一初始化，无需重复
 
-def login_required(f):
-    """
-    登录校验装饰器，未登录则返回401
-    """
-    def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            return jsonify({'success': False, 'error': '请先登录'}), 401
-        return f(*args, **kwargs)
-    decorated_function.__name__ = f.__name__
-    return decorated_function
-
 @todo_app.route('/todos', methods=['GET'])
 @login_required
 def api_get_todos():
     """
-    获取当前用户的所有待办事项
-    返回：待办事项列表
+    分页获取当前用户的待办事项（支持If-None-Match条件请求）
+    参数：limit（可选）, cursor（可选）, all（可选，为1时返回全部）
+    返回：待办事项列表, next_cursor
     """
     user_id = session['user_id']
-    todos = get_todos(user_id)
-    return jsonify({'success': True, 'data': todos})
+    etag = request_etag(get_etag(user_id, 'todos'))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    try:
+        limit, cursor = parse_page_args(request.args)
+        todos, next_cursor = get_todos_page(user_id, True, limit, cursor)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return with_etag(with_next_cursor(jsonify({'success': True, 'data': todos, 'next_cursor': next_cursor}), next_cursor), etag)
 
 @todo_app.route('/todos', methods=['POST'])
 @login_required
@@ -88,15 +90,15 @@ def api_update_username():
     参数：new_username
     返回：操作结果
     """
-    old_username = session['user_id']
+    user_id = session['user_id']
     data = request.get_json()
     new_username = data.get('new_username')
     if not new_username:
         return jsonify({'success': False, 'error': '新用户名不能为空'})
-    success, msg = update_username(old_username, new_username)
+    success, msg = update_username(user_id, new_username)
     if success:
         # 更新session
-        session['user_id'] = new_username
+        session['username'] = new_username
         return jsonify({'success': True, 'message': msg, 'new_username': new_username})
     else:
         return jsonify({'success': False, 'error': msg})
@@ -109,13 +111,13 @@ def api_update_password():
     参数：old_password, new_password
     返回：操作结果
     """
-    username = session['user_id']
+    user_id = session['user_id']
     data = request.get_json()
     old_password = data.get('old_password')
     new_password = data.get('new_password')
     if not old_password or not new_password:
         return jsonify({'success': False, 'error': '密码不能为空'})
-    success, msg = update_password(username, old_password, new_password)
+    success, msg = update_password(user_id, old_password, new_password)
     if success:
         return jsonify({'success': True, 'message': msg})
     else:
@@ -0,0 +1,80 @@
+"""
+文件名：wsgi.py
+功能：生产环境入口，使用多worker的WSGI服务器运行LevelUP后端（替代Flask开发服务器）
+主要内容：
+    - 预加载应用：导入、数据库迁移只在主进程执行一次，worker由主进程fork得到
+    - gunicorn（Linux/macOS，多进程+多线程）
+    - waitress（Windows或未安装gunicorn时，单进程多线程）
+    - worker数、线程数、监听地址通过环境变量配置
+"""
+import os
+import sys
+from dotenv import load_dotenv
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+load_dotenv()
+HOST = os.getenv("LEVELUP_HOST", "127.0.0.1")
+PORT = int(os.getenv("LEVELUP_PORT", "5000"))
+WORKERS = int(os.getenv("LEVELUP_WORKERS", "2"))
+THREADS = int(os.getenv("LEVELUP_THREADS", "4"))
+# 可选：gunicorn / waitress，默认按平台自动选择
+WSGI_SERVER = os.getenv("LEVELUP_WSGI_SERVER", "")
+
+# 预加载：在主进程中完成导入和迁移
+from backend.main_app import app  # noqa: E402
+from backend.services.log_service import get_logger  # noqa: E402
+
+logger = get_logger('server')
+
+def _has_gunicorn():
+    """
+    当前平台是否可使用gunicorn（依赖fork，不支持Windows）
+    """
+    if os.name == 'nt':
+        return False
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def serve_gunicorn():
+    """
+    使用gunicorn启动：WORKERS个进程，每个进程THREADS个线程
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class LevelUPApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'{HOST}:{PORT}')
+            self.cfg.set('workers', WORKERS)
+            self.cfg.set('threads', THREADS)
+            self.cfg.set('worker_class', 'gthread' if THREADS > 1 else 'sync')
+            # 应用已在主进程加载，worker共享同一份代码和SECRET_KEY
+            self.cfg.set('preload_app', True)
+
+        def load(self):
+            return app
+
+    LevelUPApplication().run()
+
+def serve_waitress():
+    """
+    使用waitress启动：单进程，WORKERS*THREADS个线程
+    """
+    from waitress import serve
+    serve(app, host=HOST, port=PORT, threads=WORKERS * THREADS)
+
+def main():
+    server = WSGI_SERVER or ('gunicorn' if _has_gunicorn() else 'waitress')
+    logger.info('server starting', extra={"fields": {"server": server, "url": f"http://{HOST}:{PORT}",
+                                                     "workers": WORKERS, "threads": THREADS}})
+    if server == 'gunicorn':
+        serve_gunicorn()
+    else:
+        serve_waitress()
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,203 @@
+"""
+文件名：start_frontend_server.py
+功能：前端静态文件服务器（多线程，带缓存与压缩）
+主要内容：
+    - 多线程处理请求，慢客户端不阻塞其他页面加载
+    - 启动时预读并预压缩静态文件（gzip，安装brotli时同时生成br），文件修改后自动重新加载
+    - ETag / If-None-Match 协商缓存，命中返回304
+    - 带指纹的文件名（如 app.3f2a9c1b.js）设置长期强缓存，其余文件每次协商
+    - 按文件统计请求数与发送字节数（GET /__stats）
+"""
 import http.server
-import socketserver
+import hashlib
+import gzip
+import json
+import mimetypes
 import os
+import re
+import threading
+from email.utils import formatdate
 
-PORT = 8080
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PORT = int(os.getenv("LEVELUP_FRONTEND_PORT", "8080"))
 WEB_DIR = os.path.dirname(os.path.abspath(__file__))
 os.chdir(WEB_DIR)
 
-Handler = http.server.SimpleHTTPRequestHandler
+STATS_PATH = '/__stats'
+# 小于该字节数的文件不压缩
+MIN_COMPRESS_SIZE = 256
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+# 文件名中带8位以上十六进制指纹的资源内容不会变化，可长期缓存
+FINGERPRINT_RE = re.compile(r'\.[0-9a-f]{8,}\.\w+$')
+CACHE_IMMUTABLE = 'public, max-age=31536000, immutable'
+CACHE_REVALIDATE = 'no-cache'
+
+class Asset:
+    """
+    内存中的静态文件：原始内容及预压缩版本
+    """
+
+    def __init__(self, path):
+        stat = os.stat(path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.mtime = stat.st_mtime
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/'):
+            self.content_type += '; charset=utf-8'
+        digest = hashlib.sha1(data).hexdigest()[:16]
+        # 各编码版本使用不同的ETag
+        self.variants = {None: (data, f'"{digest}"')}
+        if len(data) >= MIN_COMPRESS_SIZE and self.content_type.startswith(COMPRESSIBLE_TYPES):
+            gz = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(gz) < len(data):
+                self.variants['gzip'] = (gz, f'"{digest}-gzip"')
+            if brotli is not None:
+                br = brotli.compress(data, quality=11)
+                if len(br) < len(data):
+                    self.variants['br'] = (br, f'"{digest}-br"')
+
+    def choose(self, accept_encoding):
+        """
+        根据Accept-Encoding选择编码版本（优先br，其次gzip）
+        返回：(编码名或None, 内容, ETag)
+        """
+        accepted = {e.split(';')[0].strip() for e in accept_encoding.split(',')}
+        for encoding in ('br', 'gzip'):
+            if encoding in accepted and encoding in self.variants:
+                return (encoding,) + self.variants[encoding]
+        return (None,) + self.variants[None]
+
+class AssetCache:
+    """
+    静态文件缓存与统计
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.assets = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def preload(self):
+        """
+        启动时预读并预压缩目录下的所有文件
+        """
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(('.', '__'))]
+            for name in filenames:
+                self.get(os.path.join(dirpath, name))
+        return len(self.assets)
+
+    def get(self, path):
+        """
+        获取文件对应的Asset，文件被修改后重新加载
+        返回：Asset对象，文件不存在时返回None
+        """
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        asset = self.assets.get(path)
+        if asset is None or asset.mtime != mtime:
+            asset = Asset(path)
+            with self.lock:
+                self.assets[path] = asset
+        return asset
+
+    def record(self, name, status, sent):
+        """
+        记录一次请求
+        参数：name - 请求路径, status - 状态码, sent - 发送的正文字节数
+        """
+        with self.lock:
+            item = self.stats.setdefault(name, {'requests': 0, 'not_modified': 0, 'bytes': 0})
+            item['requests'] += 1
+            item['bytes'] += sent
+            if status == 304:
+                item['not_modified'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {name: dict(item) for name, item in self.stats.items()}
+
+cache = AssetCache(WEB_DIR)
+
+class CachingHandler(http.server.SimpleHTTPRequestHandler):
+    """
+    优先从内存缓存返回静态文件；目录等其他情况交给SimpleHTTPRequestHandler处理
+    """
+
+    def do_GET(self):
+        self.serve(head=False)
+
+    def do_HEAD(self):
+        self.serve(head=True)
+
+    def serve(self, head):
+        url_path = self.path.split('?', 1)[0].split('#', 1)[0]
+        if url_path == STATS_PATH:
+            self.send_stats()
+            return
+        fs_path = self.translate_path(self.path)
+        asset = cache.get(fs_path) if os.path.isfile(fs_path) else None
+        if asset is None:
+            if head:
+                super().do_HEAD()
+            else:
+                super().do_GET()
+            return
+        encoding, body, etag = asset.choose(self.headers.get('Accept-Encoding', ''))
+        cache_control = CACHE_IMMUTABLE if FINGERPRINT_RE.search(url_path) else CACHE_REVALIDATE
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match and (if_none_match.strip() == '*' or etag in [t.strip() for t in if_none_match.split(',')]):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', cache_control)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            cache.record(url_path, 304, 0)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', asset.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Last-Modified', asset.last_modified)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', cache_control)
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+        cache.record(url_path, 200, 0 if head else len(body))
+
+    def send_stats(self):
+        body = json.dumps(cache.snapshot(), ensure_ascii=False, indent=2).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+class ThreadingServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
 
-print(f"Serving frontend at http://localhost:{PORT}")
-with socketserver.TCPServer(("", PORT), Handler) as httpd:
-    try:
-        httpd.serve_forever()
-    except KeyboardInterrupt:
-        print("\nServer stopped.") 
\ No newline at end of file
+if __name__ == '__main__':
+    count = cache.preload()
+    print(f"Preloaded {count} files (brotli {'on' if brotli else 'off'})")
+    print(f"Serving frontend at http://localhost:{PORT}")
+    with ThreadingServer(("", PORT), CachingHandler) as httpd:
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            print("\nServer stopped.")
+            for name, item in sorted(cache.snapshot().items()):
+                print(f"  {name}: {item['requests']} requests, {item['not_modified']} not modified, {item['bytes']} bytes")
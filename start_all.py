@@ -2,20 +2,62 @@
 文件名：start_all.py
 功能：一键启动LevelUP系统的后端Flask服务和前端静态服务器，并自动打开浏览器
 主要内容：
-    - 启动后端服务
+    - 启动后端服务（默认开发服务器；--prod 或 LEVELUP_ENV=production 时使用多worker的WSGI服务器）
     - 启动前端服务
-    - 自动打开前端页面
+    - 就绪检查通过后自动打开前端页面
     - 支持Ctrl+C关闭所有服务
 """
 import subprocess
 import webbrowser
+import urllib.request
+import socket
 import time
 import sys
 import os
 
-# 启动后端 Flask 服务
+BACKEND_PORT = int(os.getenv("LEVELUP_PORT", "5000"))
+FRONTEND_PORT = int(os.getenv("LEVELUP_FRONTEND_PORT", "8080"))
+READY_TIMEOUT = float(os.getenv("LEVELUP_READY_TIMEOUT", "30"))
+production = '--prod' in sys.argv or os.getenv("LEVELUP_ENV") == "production"
+
+def backend_ready():
+    """
+    后端就绪检查：健康检查接口返回200
+    """
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{BACKEND_PORT}/api/health', timeout=1) as res:
+            return res.status == 200
+    except OSError:
+        return False
+
+def frontend_ready():
+    """
+    前端就绪检查：端口已监听
+    """
+    try:
+        with socket.create_connection(('127.0.0.1', FRONTEND_PORT), timeout=1):
+            return True
+    except OSError:
+        return False
+
+def wait_until_ready(procs, timeout=READY_TIMEOUT):
+    """
+    轮询等待前后端服务就绪
+    参数：procs - 子进程列表（任一进程提前退出则停止等待）, timeout - 最长等待秒数
+    返回：True/False
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if any(p.poll() is not None for p in procs):
+            return False
+        if backend_ready() and frontend_ready():
+            return True
+        time.sleep(0.2)
+    return False
+
+# 启动后端服务
 backend_dir = os.path.join(os.path.dirname(__file__), 'backend')
-backend_cmd = [sys.executable, 'main_app.py']
+backend_cmd = [sys.executable, 'wsgi.py' if production else 'main_app.py']
 backend_proc = subprocess.Popen(backend_cmd, cwd=backend_dir)
 
 # 启动前端静态服务器
@@ -23,16 +65,16 @@ frontend_dir = os.path.join(os.path.dirname(__file__), 'frontend')
 frontend_cmd = [sys.executable, 'start_frontend_server.py']
 frontend_proc = subprocess.Popen(frontend_cmd, cwd=frontend_dir)
 
-# 等待服务器启动，确保端口已监听
-time.sleep(2)
-
-# 自动打开前端登录页面
-webbrowser.open('http://localhost:8080/signin_page.html')
-
-print("所有服务已启动，浏览器已打开。")
-print("按 Ctrl+C 可关闭所有服务。")
-
 try:
+    # 等待服务就绪后再打开浏览器
+    if wait_until_ready([backend_proc, frontend_proc]):
+        # 自动打开前端登录页面
+        webbrowser.open(f'http://localhost:{FRONTEND_PORT}/signin_page.html')
+        print("所有服务已启动，浏览器已打开。")
+    else:
+        print("服务未能在规定时间内就绪，请检查上方日志。")
+    print("按 Ctrl+C 可关闭所有服务。")
+
     # 等待子进程结束（一般不会自动结束）
     backend_proc.wait()
     frontend_proc.wait()
@@ -40,4 +82,4 @@ except KeyboardInterrupt:
     print("\n正在关闭服务...")
     backend_proc.terminate()
     frontend_proc.terminate()
-    print("已全部关闭。") 
\ No newline at end of file
+    print("已全部关闭。")
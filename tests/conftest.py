@@ -0,0 +1,62 @@
+"""
+文件名：conftest.py
+功能：pytest公共夹具
+主要内容：
+    - 导入应用前把数据库、附件目录、管理员令牌指向临时位置
+    - 每个测试使用独立的临时数据库（执行全部迁移）并清空service缓存
+    - 真实Flask应用的测试客户端与已登录用户
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+_session_dir = tempfile.mkdtemp(prefix='levelup-test-')
+os.environ['DATABASE_URL'] = os.path.join(_session_dir, 'levelup.db')
+os.environ['ATTACHMENT_DIR'] = os.path.join(_session_dir, 'attachments')
+os.environ['ADMIN_TOKEN'] = 'test-admin-token'
+os.environ['SECRET_KEY'] = 'test-secret'
+os.environ['REQUEST_LOG'] = 'False'
+os.environ['LOG_LEVEL'] = 'WARNING'
+
+import pytest  # noqa: E402
+from backend.main_app import app as flask_app  # noqa: E402
+from backend.services import db_service, attachment_service  # noqa: E402
+from backend.services.migration_service import run_migrations  # noqa: E402
+from backend.services.sign_in_service import get_user_key  # noqa: E402
+from backend.services.cache_service import invalidate  # noqa: E402
+
+ADMIN_HEADERS = {'X-Admin-Token': 'test-admin-token'}
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """
+    独立的临时数据库（已执行全部迁移），返回数据库路径
+    """
+    path = str(tmp_path / 'levelup.db')
+    monkeypatch.setattr(db_service, 'db_path', path)
+    monkeypatch.setattr(attachment_service, 'ATTACHMENT_DIR', str(tmp_path / 'attachments'))
+    run_migrations(path)
+    invalidate()
+    yield path
+    db_service.release_thread_conns()
+    db_service.get_pool(path).close_all()
+    invalidate()
+
+@pytest.fixture
+def client(db):
+    """
+    真实Flask应用的测试客户端
+    """
+    return flask_app.test_client()
+
+@pytest.fixture
+def user(client):
+    """
+    注册并登录用户alice
+    返回：(用户名, 用户ID)
+    """
+    client.post('/register', json={'username': 'alice', 'password': 'pw'})
+    client.post('/login', json={'username': 'alice', 'password': 'pw'})
+    return 'alice', get_user_key('alice')
@@ -0,0 +1,100 @@
+"""
+文件名：test_attachment_service.py
+功能：内容寻址附件的去重、引用计数触发器与无引用附件清理
+"""
+import io
+import os
+import pytest
+from backend.services import db_service
+from backend.services.attachment_service import blob_path, collect_garbage, store_attachment
+from backend.services.db_service import get_conn
+from backend.services.file_service import add_file, delete_file, update_file
+from backend.services.file_tree_service import copy_node, create_folder
+from tests.conftest import ADMIN_HEADERS
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+
+def _scalar(sql, params=()):
+    conn = get_conn()
+    row = conn.execute(sql, params).fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def _refcount(blob_hash):
+    return _scalar('SELECT refcount FROM attachments WHERE hash = ?', (blob_hash,))
+
+def _upload(data=PNG):
+    attachment, err = store_attachment(io.BytesIO(data))
+    assert err is None
+    return attachment['hash']
+
+def _age(blob_hash):
+    """
+    把附件的上传时间改到保留期之前
+    """
+    conn = get_conn()
+    conn.execute("UPDATE attachments SET created_at = '2000-01-01 00:00:00' WHERE hash = ?", (blob_hash,))
+    conn.commit()
+    conn.close()
+
+def test_same_content_is_stored_once(db):
+    first = _upload()
+    assert _upload() == first
+    assert _scalar('SELECT COUNT(*) FROM attachments') == 1
+    assert os.path.exists(blob_path(first))
+    assert not [name for name in os.listdir(os.path.dirname(os.path.dirname(blob_path(first))))
+                if name.startswith('.upload-')]
+    assert store_attachment(io.BytesIO(b'not an image'))[0] is None
+
+def test_refcount_follows_note_references(user):
+    _, uid = user
+    blob_hash = _upload()
+    ref = f'![图](/api/attachments/{blob_hash})'
+    folder_id, _ = create_folder(uid, '文件夹')
+    note, _ = add_file('笔记', ref + '\n' + ref, '', uid, folder_id)
+    assert _refcount(blob_hash) == 1
+    copy_id, _ = copy_node(uid, folder_id)
+    assert _refcount(blob_hash) == 2
+    update_file(note[0], None, '不再引用', None, uid)
+    assert _refcount(blob_hash) == 1
+    update_file(note[0], None, ref, None, uid)
+    assert _refcount(blob_hash) == 2
+    # 递归删除文件夹时由files上的触发器释放引用
+    delete_file(copy_id, uid)
+    delete_file(folder_id, uid)
+    assert _refcount(blob_hash) == 0
+    assert _scalar('SELECT COUNT(*) FROM file_attachments') == 0
+
+def test_gc_removes_only_old_orphans(client, user):
+    _, uid = user
+    kept = _upload()
+    orphan = _upload(PNG + b'orphan')
+    fresh = _upload(PNG + b'fresh')
+    add_file('笔记', f'![图](/api/attachments/{kept})', '', uid)
+    _age(kept)
+    _age(orphan)
+    assert client.post('/api/attachments/gc').status_code == 403
+    res = client.post('/api/attachments/gc', headers=ADMIN_HEADERS).get_json()
+    assert res['data'] == {'deleted': 1, 'freed_bytes': len(PNG) + len(b'orphan')}
+    assert not os.path.exists(blob_path(orphan)) and not os.path.exists(blob_path(orphan) + '.deleted')
+    assert os.path.exists(blob_path(kept)) and os.path.exists(blob_path(fresh))
+    assert client.get(f'/api/attachments/{orphan}').status_code == 404
+    # 清理后重新上传相同内容会重新写入文件
+    assert _upload(PNG + b'orphan') == orphan
+    res = client.get(f'/api/attachments/{orphan}')
+    assert res.status_code == 200 and res.data == PNG + b'orphan'
+    res.close()
+
+def test_gc_restores_files_when_commit_fails(db, monkeypatch):
+    orphan = _upload()
+    _age(orphan)
+
+    def fail(self):
+        raise RuntimeError('commit failed')
+
+    with monkeypatch.context() as m:
+        m.setattr(db_service.PooledConnection, 'commit', fail)
+        with pytest.raises(RuntimeError):
+            collect_garbage()
+    assert os.path.exists(blob_path(orphan)) and not os.path.exists(blob_path(orphan) + '.deleted')
+    assert _refcount(orphan) == 0
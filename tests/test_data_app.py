@@ -0,0 +1,141 @@
+"""
+文件名：test_data_app.py
+功能：NDJSON/zip流式导出的一致性快照，以及显式ID分块导入
+"""
+import io
+import json
+import threading
+import zipfile
+from backend.services import export_service, import_service
+from backend.services.compression_service import COMPRESS_THRESHOLD
+from backend.services.db_service import get_conn, release_thread_conns
+from backend.services.file_service import add_file, delete_file
+from backend.services.file_tree_service import create_folder
+from backend.services.target_service import add_target
+from backend.services.todo_service import add_todo
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+
+def _records(body):
+    return [json.loads(line) for line in body.decode('utf-8').splitlines()]
+
+def _zip(files):
+    """
+    构造导入用的zip包
+    参数：files - {zip内路径: 内容}
+    """
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as zf:
+        for path, content in files.items():
+            zf.writestr(path, content)
+    buf.seek(0)
+    return buf
+
+def _import(client, files, **form):
+    res = client.post('/api/import', data={'file': (_zip(files), 'notes.zip'), **form},
+                      content_type='multipart/form-data')
+    events = _records(res.get_data())
+    res.close()
+    return events
+
+def test_ndjson_export_contains_all_records(client, user):
+    _, uid = user
+    add_target('目标', 0, ['标签'], uid)
+    folder_id, _ = create_folder(uid, '文件夹')
+    big = '大笔记内容\n' * (COMPRESS_THRESHOLD // 8)
+    add_file('大笔记', big, '', uid, folder_id)
+    add_todo(uid, '待办')
+    res = client.get('/api/export?format=ndjson')
+    records = _records(res.get_data())
+    res.close()
+    assert records[0]['type'] == 'meta' and records[0]['user'] == 'alice'
+    by_type = {}
+    for record in records[1:]:
+        by_type.setdefault(record['type'], []).append(record)
+    assert set(by_type) == {'target', 'main_node', 'folder', 'note', 'todo'}
+    note = by_type['note'][0]
+    assert note['content'] == big and note['parent_id'] == by_type['folder'][0]['id']
+
+def test_export_reads_one_snapshot(client, user, monkeypatch):
+    _, uid = user
+    monkeypatch.setattr(export_service, 'EXPORT_CHUNK_BYTES', 1)
+    # 第一块在读取学习目标时产出，此时笔记尚未开始查询
+    add_target('目标', 0, [], uid)
+    add_file('已有笔记', '内容', '', uid)
+    stream = export_service.stream_ndjson(uid, 'alice')
+    first = next(stream)
+
+    def write():
+        add_file('导出开始后新建', '内容', '', uid)
+        release_thread_conns()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    writer.join()
+    names = [r.get('name') for r in _records(first + b''.join(stream))]
+    assert '已有笔记.md' in names and '导出开始后新建.md' not in names
+
+def test_zip_export_layout(client, user):
+    _, uid = user
+    add_target('学习/目标', 0, [], uid)
+    folder_id, _ = create_folder(uid, '课程')
+    add_file('笔记', '# 正文', '', uid, folder_id)
+    add_file('笔记', '# 根目录', '', uid)
+    add_todo(uid, '复习')
+    res = client.get('/api/export?format=zip')
+    zf = zipfile.ZipFile(io.BytesIO(res.get_data()))
+    res.close()
+    names = set(zf.namelist())
+    assert {'data.ndjson', 'todos.md', 'notes/课程/笔记.md', 'notes/笔记.md'} <= names
+    assert zf.read('notes/课程/笔记.md').decode('utf-8') == '# 正文'
+    assert any(name.startswith('roadmap/学习_目标 (') for name in names)
+    assert '- [ ] 复习' in zf.read('todos.md').decode('utf-8')
+
+def test_chunked_import_assigns_explicit_ids(client, user, monkeypatch):
+    _, uid = user
+    monkeypatch.setattr(import_service, 'IMPORT_CHUNK_SIZE', 2)
+    # 删除最大ID的文件后，导入的ID不能复用它（与AUTOINCREMENT一致）
+    deleted, _ = add_file('临时', '', '', uid)
+    delete_file(deleted[0], uid)
+    add_file('已存在', '旧内容', '', uid)
+    upload = client.post('/api/attachments', data={'user_id': 'alice', 'file': (io.BytesIO(PNG), 'a.png')},
+                         content_type='multipart/form-data').get_json()['data']
+    events = _import(client, {
+        '已存在.md': '新内容',
+        '课程/第一章.md': f"![图]({upload['url']})",
+        '课程/第二章.md': '第二章',
+        '课程/习题/答案.md': '答案',
+        '.obsidian/config.md': '隐藏',
+        'readme.txt': '不是笔记',
+    }, on_conflict='rename')
+    progress = [e for e in events if e['type'] == 'progress']
+    report = events[-1]
+    assert [e['done'] for e in progress] == [2, 4, 6]
+    assert report['created'] == 3 and report['renamed'] == 1 and report['skipped'] == 2
+    assert report['folders'] == 2
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute('SELECT id, name, parent_id, is_dir FROM files WHERE uid = ? ORDER BY id', (uid,))
+    rows = c.fetchall()
+    c.execute('SELECT file_id FROM file_attachments WHERE hash = ?', (upload['hash'],))
+    attached = [row[0] for row in c.fetchall()]
+    c.execute('SELECT refcount FROM attachments WHERE hash = ?', (upload['hash'],))
+    refcount = c.fetchone()[0]
+    conn.close()
+    assert min(row[0] for row in rows) > deleted[0]
+    by_name = {row[1]: row for row in rows}
+    assert '已存在 (导入1).md' in by_name
+    assert by_name['第一章.md'][2] == by_name['课程'][0] == by_name['第二章.md'][2]
+    assert by_name['答案.md'][2] == by_name['习题'][0] and by_name['习题'][2] == by_name['课程'][0]
+    assert attached == [by_name['第一章.md'][0]] and refcount == 1
+
+def test_import_skips_conflicts_and_merges_folders(client, user):
+    _, uid = user
+    _import(client, {'课程/第一章.md': '一'})
+    events = _import(client, {'课程/第一章.md': '一（新）', '课程/第二章.md': '二'})
+    report = events[-1]
+    assert report['created'] == 1 and report['skipped'] == 1 and report['folders'] == 0
+    conn = get_conn()
+    count = conn.execute("SELECT COUNT(*) FROM files WHERE uid = ? AND name = '课程'", (uid,)).fetchone()[0]
+    conn.close()
+    assert count == 1
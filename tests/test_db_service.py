@@ -0,0 +1,72 @@
+"""
+文件名：test_db_service.py
+功能：连接池同一线程嵌套获取连接时的事务隔离
+"""
+import sqlite3
+from backend.services import migration_service
+from backend.services.db_service import get_conn
+from backend.services.sign_in_service import add_user, get_user_key
+
+def _count(path, sql, params=()):
+    """
+    用独立连接读取已提交的数据
+    """
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql, params).fetchone()[0]
+    finally:
+        conn.close()
+
+def test_inner_commit_does_not_commit_outer_work(db):
+    outer = get_conn()
+    outer.execute("INSERT INTO users (username, password) VALUES ('outer', 'p')")
+    inner = get_conn()
+    assert inner is outer
+    inner.execute("INSERT INTO users (username, password) VALUES ('inner', 'p')")
+    inner.commit()
+    inner.close()
+    assert _count(db, 'SELECT COUNT(*) FROM users') == 0
+    outer.rollback()
+    outer.close()
+    assert _count(db, 'SELECT COUNT(*) FROM users') == 0
+
+def test_inner_rollback_keeps_outer_work(db):
+    outer = get_conn()
+    outer.execute("INSERT INTO users (username, password) VALUES ('outer', 'p')")
+    inner = get_conn()
+    inner.execute("INSERT INTO users (username, password) VALUES ('inner', 'p')")
+    inner.rollback()
+    inner.close()
+    outer.commit()
+    outer.close()
+    assert _count(db, "SELECT COUNT(*) FROM users WHERE username = 'outer'") == 1
+    assert _count(db, "SELECT COUNT(*) FROM users WHERE username = 'inner'") == 0
+
+def test_nested_close_discards_uncommitted_inner_work(db):
+    outer = get_conn()
+    outer.execute("INSERT INTO users (username, password) VALUES ('outer', 'p')")
+    inner = get_conn()
+    inner.execute("INSERT INTO users (username, password) VALUES ('inner', 'p')")
+    inner.close()
+    outer.commit()
+    outer.close()
+    assert _count(db, "SELECT GROUP_CONCAT(username) FROM users") == 'outer'
+
+def test_nested_call_without_outer_transaction_commits(db):
+    outer = get_conn()
+    outer.execute('SELECT 1')
+    add_user('bob', 'pw')
+    assert _count(db, "SELECT COUNT(*) FROM users WHERE username = 'bob'") == 1
+    outer.close()
+
+def test_user_key_backfill_inside_transaction_keeps_caller_uncommitted(db, monkeypatch):
+    add_user('bob', 'pw')
+    monkeypatch.setattr(migration_service, '_user_keys_ready', False)
+    conn = get_conn()
+    conn.execute("INSERT INTO todos (user_id, text, completed, created_at) VALUES ('bob', 'legacy', 0, '')")
+    # uid在线回填尚未完成时，get_user_key会同步回填并提交
+    user_id = get_user_key('bob')
+    assert _count(db, 'SELECT COUNT(*) FROM todos') == 0
+    conn.commit()
+    conn.close()
+    assert _count(db, 'SELECT uid FROM todos') == user_id
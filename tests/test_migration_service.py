@@ -0,0 +1,115 @@
+"""
+文件名：test_migration_service.py
+功能：在已有数据的旧版本（迁移7）数据库上执行迁移8之后的全部迁移
+"""
+import pytest
+from backend.services import db_service, migration_service
+from backend.services.cache_service import invalidate
+from backend.services.compression_service import COMPRESS_THRESHOLD
+from backend.services.db_service import get_conn
+from backend.services.file_service import get_file_content, update_file
+from backend.services.migration_service import backfill_user_keys, get_schema_version, run_migrations
+from backend.services.revision_service import get_revision
+from backend.services.roadmap_service import get_roadmap, get_roadmap_progress
+from backend.services.search_service import search_all
+from backend.services.sign_in_service import get_user_key, update_username
+
+BASELINE_VERSION = 7
+BIG_NOTE = '旧版本的大篇幅笔记，包含检索词长笔记正文\n' * (COMPRESS_THRESHOLD // 16)
+
+def _seed_legacy(c):
+    """
+    以迁移7时的表结构写入旧数据：业务表只有以用户名为值的user_id列
+    """
+    c.executemany('INSERT INTO users (username, password) VALUES (?, ?)', [('bob', 'pw'), ('alice', 'pw')])
+    c.executemany('INSERT INTO targets (id, title, progress, tags, update_time, user_id) VALUES (?, ?, 0, ?, ?, ?)',
+                  [(1, '算法学习', '算法', '2024-01-01', 'alice'), (2, '别人的目标', '', '2024-01-01', 'bob')])
+    c.executemany('''
+        INSERT INTO roadmap_main_nodes (id, user_id, target_id, title, status, remark, node_order)
+        VALUES (?, 'alice', '1', ?, 'todo', '', ?)
+    ''', [(1, '排序', 2048), (2, '查找', 1024)])
+    c.executemany('''
+        INSERT INTO roadmap_branch_nodes (id, main_id, user_id, target_id, title, status, remark)
+        VALUES (?, '1', 'alice', '1', ?, ?, '')
+    ''', [(1, '快速排序', 'done'), (2, '归并排序', 'todo')])
+    c.executemany('INSERT INTO files (id, name, content, parent_id, is_dir, tags, user_id) VALUES (?, ?, ?, ?, ?, ?, ?)', [
+        (1, '课程', '', None, 1, '', 'alice'),
+        (2, '大笔记.md', BIG_NOTE, 1, 0, '{"mainId": 1}', 'alice'),
+        (3, '小笔记.md', '短内容', 1, 0, '', 'alice'),
+        (4, '别人的笔记.md', '长笔记正文', None, 0, '', 'bob'),
+        (5, '孤立笔记.md', '用户已不存在', None, 0, '', 'ghost'),
+    ])
+    c.execute("INSERT INTO todos (user_id, text, completed) VALUES ('alice', '复习', 0)")
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    """
+    迁移到BASELINE_VERSION并写入旧数据的数据库，返回数据库路径
+    """
+    path = str(tmp_path / 'legacy.db')
+    monkeypatch.setattr(db_service, 'db_path', path)
+    monkeypatch.setattr(migration_service, '_user_keys_ready', False)
+    with monkeypatch.context() as m:
+        m.setattr(migration_service, 'MIGRATIONS', migration_service.MIGRATIONS[:BASELINE_VERSION])
+        m.setattr(migration_service, 'LATEST_VERSION', BASELINE_VERSION)
+        run_migrations(path)
+    conn = get_conn(path)
+    _seed_legacy(conn.cursor())
+    conn.commit()
+    conn.close()
+    invalidate()
+    yield path
+    db_service.release_thread_conns()
+    db_service.get_pool(path).close_all()
+    invalidate()
+
+def _uids(c, table):
+    c.execute(f'SELECT user_id, uid FROM {table}')
+    return set(c.fetchall())
+
+def test_upgrade_populated_baseline(legacy_db):
+    assert get_schema_version(legacy_db) == BASELINE_VERSION
+    assert run_migrations(legacy_db) == list(range(BASELINE_VERSION + 1, migration_service.LATEST_VERSION + 1))
+    assert run_migrations(legacy_db) == []
+    # 按批扫描全部旧数据行（孤立数据的uid仍为空）
+    assert backfill_user_keys(legacy_db, batch_size=2, pause=0) == 12
+    alice, bob = get_user_key('alice'), get_user_key('bob')
+    conn = get_conn()
+    c = conn.cursor()
+    assert _uids(c, 'files') == {('alice', alice), ('bob', bob), ('ghost', None)}
+    assert _uids(c, 'roadmap_branch_nodes') == {('alice', alice)}
+    # 大笔记压缩存储，content置空
+    c.execute('SELECT content IS NULL, content_z IS NOT NULL, content_size FROM files WHERE id = 2')
+    assert c.fetchone() == (1, 1, len(BIG_NOTE.encode('utf-8')))
+    c.execute('SELECT COUNT(*) FROM file_attachments')
+    assert c.fetchone()[0] == 0
+    conn.close()
+    assert get_file_content(2)[2] == BIG_NOTE
+    assert [n['title'] for n in get_roadmap(alice, 1)] == ['查找', '排序']
+    assert get_roadmap_progress(alice, 1) == 0.5
+    # 回填uid后全文索引按uid隔离，压缩前写入的正文仍在索引中
+    hits = search_all(alice, '长笔记正文')[0]['file']
+    assert [h['id'] for h in hits] == [2]
+    assert [h['id'] for h in search_all(bob, '长笔记正文')[0]['file']] == [4]
+
+def test_migrated_data_supports_new_features(legacy_db):
+    run_migrations(legacy_db)
+    backfill_user_keys(legacy_db, pause=0)
+    alice = get_user_key('alice')
+    file_data, err = update_file(2, None, '改写后的内容', None, alice)
+    assert err is None and file_data[6] == 'alice'
+    assert get_revision(alice, 2, 1)['content'] == BIG_NOTE
+    assert update_username(alice, 'alice2')[0]
+    assert update_file(3, None, '再次修改', None, alice)[0][6] == 'alice2'
+    assert [h['id'] for h in search_all(alice, '改写后')[0]['file']] == [2]
+
+def test_login_backfills_user_before_background_job(legacy_db):
+    run_migrations(legacy_db)
+    alice = get_user_key('alice')
+    conn = get_conn()
+    c = conn.cursor()
+    c.execute('SELECT COUNT(*) FROM files WHERE uid = ?', (alice,))
+    assert c.fetchone()[0] == 3
+    c.execute('SELECT COUNT(*) FROM files WHERE uid IS NULL')
+    assert c.fetchone()[0] == 2
+    conn.close()
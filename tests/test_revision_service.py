@@ -0,0 +1,82 @@
+"""
+文件名：test_revision_service.py
+功能：反向增量修订历史的记录、重建与按保留策略整理
+"""
+from datetime import datetime, timedelta
+from backend.services import revision_service
+from backend.services.db_service import get_conn
+from backend.services.file_service import add_file, update_file
+from backend.services.revision_service import compact_revisions, get_revision, list_revisions, diff_revisions
+from backend.services.sign_in_service import add_user, get_user_key
+
+def _version(i):
+    """
+    第i版笔记内容：多行文本，每版只改一行，使旧版本能存为增量
+    """
+    lines = [f'第{n}行' for n in range(30)]
+    lines[i % 30] = f'第{i % 30}行 修改于第{i}版'
+    return '\n'.join(lines) + '\n'
+
+def _save_versions(uid, count):
+    """
+    新建笔记并依次保存count个版本
+    返回：(文件ID, 各版本内容列表，下标0为第1版)
+    """
+    versions = [_version(i) for i in range(count)]
+    file_data, _ = add_file('修订', versions[0], '', uid)
+    for content in versions[1:]:
+        update_file(file_data[0], None, content, None, uid)
+    return file_data[0], versions
+
+def test_every_revision_rebuilds_from_reverse_deltas(user, monkeypatch):
+    _, uid = user
+    monkeypatch.setattr(revision_service, 'SNAPSHOT_INTERVAL', 4)
+    file_id, versions = _save_versions(uid, 12)
+    head, revisions, _ = list_revisions(uid, file_id)
+    assert head['rev'] == 12
+    assert [r['rev'] for r in revisions] == list(range(11, 0, -1))
+    kinds = [r['kind'] for r in sorted(revisions, key=lambda r: r['rev'], reverse=True)]
+    # 从当前版本往前，每3个增量后存一个快照
+    assert kinds[:8] == ['delta', 'delta', 'delta', 'snapshot'] * 2
+    for rev, content in enumerate(versions, start=1):
+        version = get_revision(uid, file_id, rev)
+        assert version['content'] == content
+        assert version['current'] == (rev == 12)
+    diff = diff_revisions(uid, file_id, 1)['diff']
+    assert '-第0行 修改于第0版' in diff and '+第11行 修改于第11版' in diff
+
+def test_unchanged_save_records_no_revision(user):
+    _, uid = user
+    file_id, versions = _save_versions(uid, 2)
+    update_file(file_id, None, versions[-1], None, uid)
+    assert len(list_revisions(uid, file_id)[1]) == 1
+
+def test_compaction_keeps_recent_and_daily_versions(user, monkeypatch):
+    _, uid = user
+    monkeypatch.setattr(revision_service, 'SNAPSHOT_INTERVAL', 3)
+    monkeypatch.setattr(revision_service, 'KEEP_RECENT', 3)
+    file_id, versions = _save_versions(uid, 10)
+    now = datetime.now()
+    yesterday = (now - timedelta(days=1)).strftime('%Y-%m-%d')
+    created = {rev: '2000-01-01 00:00:00' for rev in (1, 2, 3)}
+    created.update({rev: f'{yesterday} 0{rev}:00:00' for rev in (4, 5, 6)})
+    conn = get_conn()
+    c = conn.cursor()
+    c.executemany('UPDATE file_revisions SET created_at = ? WHERE file_id = ? AND rev = ?',
+                  [(value, file_id, rev) for rev, value in created.items()])
+    assert compact_revisions(c, file_id, versions[-1]) == 5
+    conn.commit()
+    conn.close()
+    revs = [r['rev'] for r in list_revisions(uid, file_id)[1]]
+    # 最近3个全部保留，昨天的只保留当天最后一个，超过保留天数的删除
+    assert revs == [9, 8, 7, 6]
+    for rev in revs:
+        assert get_revision(uid, file_id, rev)['content'] == versions[rev - 1]
+    assert get_revision(uid, file_id, 5) is None
+
+def test_revisions_are_scoped_to_owner(user):
+    _, uid = user
+    file_id, _ = _save_versions(uid, 2)
+    add_user('bob', 'pw')
+    assert list_revisions(get_user_key('bob'), file_id) is None
+    assert get_revision(get_user_key('bob'), file_id, 1) is None
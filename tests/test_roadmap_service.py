@@ -0,0 +1,106 @@
+"""
+文件名：test_roadmap_service.py
+功能：Roadmap节点接口按用户隔离
+"""
+import json
+from backend.services import roadmap_service
+from backend.services.db_service import get_conn
+from backend.services.file_service import add_file
+from backend.services.roadmap_service import (
+    ORDER_GAP, add_branch_node, add_main_node, add_main_node_at, get_roadmap, move_main_node
+)
+from backend.services.sign_in_service import add_user
+from backend.services.target_service import add_target
+
+def _scalar(sql, params=()):
+    conn = get_conn()
+    value = conn.execute(sql, params).fetchone()[0]
+    conn.close()
+    return value
+
+def _seed_roadmap(uid, title):
+    """
+    为用户创建目标、一个主节点（目标自带）、一个分支节点和分别挂在两个节点上的笔记
+    返回：(target_id, main_id, branch_id)
+    """
+    add_target(title, 0, [], uid)
+    target_id = _scalar('SELECT id FROM targets WHERE uid=? AND title=?', (uid, title))
+    main_id = get_roadmap(uid, target_id)[0]['id']
+    add_branch_node(main_id, target_id, '分支', uid)
+    branch_id = _scalar('SELECT id FROM roadmap_branch_nodes WHERE uid=? AND main_id=?', (uid, main_id))
+    add_file('主节点笔记', '', json.dumps({'mainId': main_id}), uid)
+    add_file('分支笔记', '', json.dumps({'branchId': branch_id}), uid)
+    return target_id, main_id, branch_id
+
+def test_node_lists_are_scoped_to_user(client, user):
+    _, alice = user
+    add_user('bob', 'pw')
+    target_id, main_id, _ = _seed_roadmap(alice, '目标')
+    res = client.get(f'/roadmap/get_main_nodes?target_id={target_id}&user_id=alice').get_json()
+    assert [n['id'] for n in res['data']] == [main_id]
+    assert client.get(f'/roadmap/get_main_nodes?target_id={target_id}&user_id=bob').get_json()['data'] == []
+    assert client.get(f'/roadmap/get_main_nodes?target_id={target_id}').status_code == 400
+    assert len(client.get(f'/roadmap/get_branch_nodes?main_id={main_id}&user_id=alice').get_json()['data']) == 1
+    assert client.get(f'/roadmap/get_branch_nodes?main_id={main_id}&user_id=bob').get_json()['data'] == []
+
+def test_delete_and_update_ignore_other_users_nodes(client, user):
+    _, alice = user
+    add_user('bob', 'pw')
+    target_id, main_id, branch_id = _seed_roadmap(alice, '目标')
+    res = client.delete(f'/roadmap/main/{main_id}?target_id={target_id}&user_id=bob')
+    assert res.status_code == 404
+    res = client.delete(f'/roadmap/branch/{branch_id}?target_id={target_id}&user_id=bob')
+    assert res.status_code == 404
+    res = client.put(f'/roadmap/main/{main_id}', json={'user_id': 'bob', 'title': 'x', 'status': 'done',
+                                                       'target_id': target_id})
+    assert res.status_code == 404
+    assert _scalar('SELECT COUNT(*) FROM files WHERE uid=?', (alice,)) == 2
+    assert _scalar('SELECT title FROM roadmap_main_nodes WHERE id=?', (main_id,)) == '第一个技能点'
+    res = client.delete(f'/roadmap/main/{main_id}?target_id={target_id}&user_id=alice')
+    assert res.get_json()['success']
+    assert _scalar('SELECT COUNT(*) FROM files WHERE uid=?', (alice,)) == 0
+    assert _scalar('SELECT COUNT(*) FROM roadmap_branch_nodes WHERE main_id=?', (main_id,)) == 0
+
+def _orders(target_id):
+    conn = get_conn()
+    rows = conn.execute('SELECT id, node_order FROM roadmap_main_nodes WHERE target_id=?', (target_id,)).fetchall()
+    conn.close()
+    return dict(rows)
+
+def test_move_main_node_updates_only_moved_row(client, user):
+    _, alice = user
+    add_user('bob', 'pw')
+    target_id, first, _ = _seed_roadmap(alice, '目标')
+    for title in ('二', '三', '四'):
+        add_main_node(alice, target_id, title)
+    ids = [n['id'] for n in get_roadmap(alice, target_id)]
+    before = _orders(target_id)
+    assert sorted(before.values()) == [ORDER_GAP * i for i in range(1, 5)]
+    assert move_main_node(ids[0], alice, target_id, ids[2])
+    after = _orders(target_id)
+    assert [n['id'] for n in get_roadmap(alice, target_id)] == [ids[1], ids[2], ids[0], ids[3]]
+    assert {k: v for k, v in after.items() if v != before[k]}.keys() == {ids[0]}
+    assert move_main_node(ids[3], alice, target_id, None)
+    assert [n['id'] for n in get_roadmap(alice, target_id)] == [ids[3], ids[1], ids[2], ids[0]]
+    res = client.put(f'/roadmap/main/{ids[1]}/move', json={'user_id': 'alice', 'target_id': target_id, 'after_id': ids[1]})
+    assert res.status_code == 400
+    res = client.put(f'/roadmap/main/{ids[1]}/move', json={'user_id': 'bob', 'target_id': target_id, 'after_id': None})
+    assert res.status_code == 404
+
+def test_insert_rebalances_when_gap_is_exhausted(user, monkeypatch):
+    _, alice = user
+    rebalances = []
+    rebalance = roadmap_service._rebalance_main_orders
+    monkeypatch.setattr(roadmap_service, '_rebalance_main_orders', lambda *args: rebalances.append(rebalance(*args)))
+    target_id, first, _ = _seed_roadmap(alice, '目标')
+    add_main_node(alice, target_id, '末尾')
+    # 每次插到第一个节点之后，中间值每次减半，约log2(ORDER_GAP)次后无空隙触发重排
+    titles = [f'插入{i}' for i in range(15)]
+    for title in titles:
+        add_main_node_at(alice, target_id, title, first)
+    roadmap = get_roadmap(alice, target_id)
+    assert [n['title'] for n in roadmap] == ['第一个技能点', *reversed(titles), '末尾']
+    assert len(rebalances) == 1
+    orders = _orders(target_id)
+    assert len(set(orders.values())) == len(orders)
+    assert [orders[n['id']] for n in roadmap] == sorted(orders.values())
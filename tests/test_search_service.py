@@ -0,0 +1,44 @@
+"""
+文件名：test_search_service.py
+功能：统一全文检索的长短词组合、bm25排序与分页
+"""
+from backend.services.file_service import add_file
+from backend.services.search_service import search_all
+
+def _seed(uid):
+    add_file('学习计划', '数据库索引的学习笔记，重点是索引结构', '', uid)
+    add_file('索引调优', '数据库索引调优：数据库索引与查询计划', '', uid)
+    add_file('周末安排', '数据库索引之外的其他内容', '', uid)
+    add_file('读书笔记', '与关键词无关的正文', '', uid)
+
+def test_short_term_filters_ranked_trigram_match(user):
+    _, uid = user
+    _seed(uid)
+    grouped, _ = search_all(uid, '数据库索引 学习')
+    hits = grouped['file']
+    assert [h['title'] for h in hits] == ['<mark>学习</mark>计划.md']
+    assert hits[0]['score'] is not None
+    assert '<mark>数据库索引</mark>' in hits[0]['snippet']
+
+def test_mixed_query_keeps_bm25_order_and_pages(user):
+    _, uid = user
+    _seed(uid)
+    grouped, _ = search_all(uid, '数据库索引 调优')
+    assert [h['title'] for h in grouped['file']] == ['索引<mark>调优</mark>.md']
+    grouped, _ = search_all(uid, '数据库索引 索引')
+    full = grouped['file']
+    scores = [h['score'] for h in full]
+    assert len(full) == 3 and scores == sorted(scores)
+    first, cursor = search_all(uid, '数据库索引 索引', limit=2)
+    second, end = search_all(uid, '数据库索引 索引', limit=2, cursor=cursor)
+    assert [h['id'] for h in first['file'] + second['file']] == [h['id'] for h in full]
+    assert end is None
+
+def test_only_short_terms_fall_back_to_substring(user):
+    _, uid = user
+    _seed(uid)
+    grouped, _ = search_all(uid, '笔记')
+    assert sorted(h['id'] for h in grouped['file']) == sorted(
+        h['id'] for h in search_all(uid, '笔记 笔记')[0]['file'])
+    assert {h['score'] for h in grouped['file']} == {None}
+    assert len(grouped['file']) == 2
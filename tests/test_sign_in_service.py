@@ -0,0 +1,51 @@
+"""
+文件名：test_sign_in_service.py
+功能：按uid关联用户后的改名：只更新users一行，业务数据与返回的用户名随之变化
+"""
+from backend.services.db_service import get_conn
+from backend.services.file_service import add_file
+from backend.services.migration_service import USER_KEY_TABLES
+from backend.services.roadmap_service import add_branch_node, get_roadmap
+from backend.services.sign_in_service import add_user, get_user_key, update_username
+from backend.services.target_service import add_target
+from backend.services.todo_service import add_todo
+
+def _seed(client, uid):
+    add_target('目标', 0, [], uid)
+    target_id = client.get('/targets').get_json()[0]['id']
+    main_id = get_roadmap(uid, target_id)[0]['id']
+    add_branch_node(main_id, target_id, '分支', uid)
+    add_file('笔记', '内容', '', uid)
+    add_todo(uid, '待办')
+    return target_id
+
+def test_rename_updates_only_users_row(client, user):
+    _, uid = user
+    target_id = _seed(client, uid)
+    etag = client.get('/targets').headers['ETag']
+    res = client.put('/api/user/username', json={'new_username': 'alice2'}).get_json()
+    assert res['success']
+    conn = get_conn()
+    c = conn.cursor()
+    for table in USER_KEY_TABLES:
+        # 业务表不保存用户名副本
+        c.execute(f"SELECT COUNT(*) FROM {table} WHERE user_id <> '' OR uid <> ?", (uid,))
+        assert c.fetchone()[0] == 0, table
+    c.execute("SELECT COUNT(*) FROM search_index WHERE user_id <> ?", (uid,))
+    assert c.fetchone()[0] == 0
+    conn.close()
+    assert get_user_key('alice') is None and get_user_key('alice2') == uid
+    targets = client.get('/targets', headers={'If-None-Match': etag})
+    assert targets.status_code == 200
+    assert [t['user_id'] for t in targets.get_json()] == ['alice2']
+    assert client.get('/api/files?user_id=alice2').get_json()['data'][0]['name'] == '笔记.md'
+    roadmap = client.get(f'/roadmap?user_id=alice2&target_id={target_id}').get_json()
+    assert roadmap['roadmap'][0]['children'][0]['title'] == '分支'
+    assert client.get('/api/search?user_id=alice2&q=笔记').get_json()['data']['file']
+
+def test_rename_rejects_taken_name(user):
+    _, uid = user
+    add_user('bob', 'pw')
+    assert update_username(uid, 'bob') == (False, '新用户名已存在')
+    assert update_username(9999, 'carol') == (False, '用户不存在')
+    assert get_user_key('alice') == uid